@@ -1,547 +1,807 @@
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, scrolledtext
-import json
-import os
-import copy  # Important for batch processing (Tab 2)
-
-# --- Core Definitions and Functions (Logic Modified) ---
-
-# Keys whose values will be directly replaced if found in both source and target.
-KEYS_TO_REPLACE_VALUES = [
-    "m_FileID",
-    "m_PathID",
-    "m_Name",
-    "m_SourceFontFileGUID",
-    "m_FamilyName",
-    "m_StyleName",
-    "sourceFontFileGUID"
-]
-
-# Keys containing an "Array" that should have its entire content replaced.
-# This handles nested structures.
-KEYS_WITH_ARRAY_TO_REPLACE = {
-    "m_FallbackFontAssetTable": "Array",
-    "m_FontFeatureTable": {
-        "m_GlyphPairAdjustmentRecords": "Array"
-    }
-}
-
-# <<<--- NEW ADDITION ---<<<
-# Keys to add to the target if they exist in the source but are missing in the target.
-# This is useful for newer versions of the format that add fields.
-# To solve your specific case, add "m_ClassDefinitionType" to this list.
-KEYS_TO_ADD_IF_MISSING = [
-    "m_UnitsPerEM",
-    "m_ClassDefinitionType" # Added based on your request
-]
-
-
-def update_json_recursively(target_node, source_node, log_area):
-    """
-    Recursively updates the target_node based on the source_node.
-    It follows the rules defined in the global KEY constants and adds missing keys.
-    """
-    if not isinstance(target_node, type(source_node)):
-        return
-
-    if isinstance(target_node, dict):
-        # --- 1. Update existing keys ---
-        for key in list(target_node.keys()): # Use list to avoid issues with dict size changing
-            if key in source_node:
-                source_value = source_node[key]
-                target_value = target_node[key]
-
-                if key in KEYS_TO_REPLACE_VALUES:
-                    if target_node[key] != source_value:
-                        log_area.insert(tk.END, f"Updating '{key}': from '{target_node[key]}' to '{source_value}'\n")
-                        target_node[key] = source_value
-                    else:
-                        log_area.insert(tk.END, f"Key '{key}': Value already matches ('{source_value}'). No change.\n")
-
-                elif key in KEYS_WITH_ARRAY_TO_REPLACE:
-                    path_to_array = KEYS_WITH_ARRAY_TO_REPLACE[key]
-                    current_target_level = target_value
-                    current_source_level = source_value
-                    valid_path = True
-
-                    if isinstance(path_to_array, str): # Simple case: {"key": "Array"}
-                        if isinstance(current_target_level, dict) and path_to_array in current_target_level and \
-                           isinstance(current_source_level, dict) and path_to_array in current_source_level:
-                            if current_target_level[path_to_array] != current_source_level[path_to_array]:
-                                log_area.insert(tk.END, f"Updating nested Array in '{key}.{path_to_array}'\n")
-                                current_target_level[path_to_array] = current_source_level[path_to_array]
-                            else:
-                                log_area.insert(tk.END, f"Nested Array in '{key}.{path_to_array}' already matches. No change.\n")
-                        else:
-                            valid_path = False
-
-                    elif isinstance(path_to_array, dict): # Nested case: {"key": {"nested_key": "Array"}}
-                        nested_key = list(path_to_array.keys())[0]
-                        array_key_in_nested = path_to_array[nested_key]
-
-                        if isinstance(current_target_level, dict) and nested_key in current_target_level and \
-                           isinstance(current_target_level[nested_key], dict) and array_key_in_nested in current_target_level[nested_key] and \
-                           isinstance(current_source_level, dict) and nested_key in current_source_level and \
-                           isinstance(current_source_level[nested_key], dict) and array_key_in_nested in current_source_level[nested_key]:
-                            if current_target_level[nested_key][array_key_in_nested] != current_source_level[nested_key][array_key_in_nested]:
-                                log_area.insert(tk.END, f"Updating nested Array in '{key}.{nested_key}.{array_key_in_nested}'\n")
-                                current_target_level[nested_key][array_key_in_nested] = current_source_level[nested_key][array_key_in_nested]
-                            else:
-                                log_area.insert(tk.END, f"Nested Array in '{key}.{nested_key}.{array_key_in_nested}' already matches. No change.\n")
-                        else:
-                            valid_path = False
-
-                    if not valid_path:
-                        log_area.insert(tk.END, f"Skipping '{key}': Structure for Array replacement not found or mismatched.\n")
-
-                elif isinstance(target_value, (dict, list)):
-                    # Continue recursion for other nested structures.
-                    update_json_recursively(target_value, source_value, log_area)
-
-        # <<<--- NEW LOGIC ---<<<
-        # --- 2. Add missing keys from source (as defined in KEYS_TO_ADD_IF_MISSING) ---
-        for key, source_value in source_node.items():
-            if key in KEYS_TO_ADD_IF_MISSING and key not in target_node:
-                log_area.insert(tk.END, f"Adding missing key '{key}' with value '{source_value}'\n")
-                target_node[key] = source_value # Add the key-value pair to the target dictionary
-
-    elif isinstance(target_node, list):
-        # Recursively process items in a list.
-        # This part remains the same, assuming list items are matched by index.
-        for i in range(min(len(target_node), len(source_node))):
-            if isinstance(target_node[i], (dict, list)) and isinstance(source_node[i], (dict, list)):
-                update_json_recursively(target_node[i], source_node[i], log_area)
-
-# --- Main Application Class (GUI code remains the same) ---
-# ... (The rest of the GUI code is unchanged) ...
-
-# ADDITION: Constants for help text
-HELP_TEXT_SINGLE = """# Single File #
-
-How to use:
-1 - In 'Source File (Original)', select an SDF JSON file.
-    (e.g., Alegreya-Regular SDF-resources.assets.json)
-
-2 - In 'Target File (To Patch)', select the SDF JSON file you want to modify.
-    (e.g., NotoSansArabic-Regular SDF-resources.assets.json)
-
-3 - Click 'Process and Patch Single File' and choose where to save the new file.
-    The saved file will be named based on the source file.
-    (e.g., Alegreya-Regular SDF-resources.assets_modified.json)
-"""
-
-HELP_TEXT_BATCH_TEMPLATE = """# Batch (One-style) #
-
-How to use:
-1 - In 'Source Folder', select a folder containing multiple source SDF JSON files.
-    Example folder contents:
-    - Alegreya-Regular SDF-resources.assets.json
-    - Alegreya-Medium SDF-resources.assets.json
-    - Alegreya-Italic SDF-resources.assets.json
-
-2 - In 'Target Single File', select one SDF JSON file to use as a same style for patching.
-    (e.g., NotoSansArabic-Regular SDF-resources.assets.json)
-
-3 - Click the process button and select an output folder.
-    Each source file will be patched using the template and saved in the output folder with its original name.
-"""
-
-HELP_TEXT_BATCH_MAP = """# Batch (Multi-style) #
-
-How to use:
-1 - In 'Source Folder', select a folder with your source SDF JSON files.
-    Example folder contents:
-    - Alegreya-Regular SDF-resources.assets.json
-    - Alegreya-Medium SDF-resources.assets.json
-    - Alegreya-Italic SDF-resources.assets.json
-
-2 - In 'Target Folder', select a folder with the corresponding target SDF JSON files to be patched.
-    Example folder contents:
-    - NotoSansArabic-Regular SDF-resources.assets.json
-    - NotoSansArabic-Medium SDF-resources.assets.json
-    - NotoSansArabic-Italic SDF-resources.assets.json
-
-    IMPORTANT: Both folders must have the same number of .json files, and they must be sorted alphabetically to match correctly.
-
-3 - Click the process button and select an output folder.
-    Each patched file will be saved with the name of its corresponding source file.
-"""
-
-
-class SdfFontPatcherApp:
-    """
-    A GUI application for patching JSON-based SDF Font Asset files.
-    """
-    def __init__(self, master):
-        self.master = master
-        master.title("SDF Font JSON Editor By MrGamesKingPro")
-        master.geometry("850x650")
-        master.minsize(700, 500)
-
-        # Main notebook for tabs
-        self.notebook = ttk.Notebook(master)
-        self.notebook.pack(expand=True, fill='both', padx=10, pady=10)
-
-        # Create frames for each tab
-        self.tab1 = ttk.Frame(self.notebook)
-        self.tab2 = ttk.Frame(self.notebook)
-        self.tab3 = ttk.Frame(self.notebook)
-
-        self.notebook.add(self.tab1, text='Single File')
-        self.notebook.add(self.tab2, text='Batch (One-style)')
-        self.notebook.add(self.tab3, text='Batch (Multi-style)')
-
-        # Build the UI for each tab
-        self.create_single_file_tab()
-        self.create_batch_template_tab()
-        self.create_folder_to_folder_tab()
-
-        # ADDITION: Bind tab change event to update help text
-        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
-
-        # ADDITION: Set initial help text for the first tab on launch
-        self.on_tab_changed(None)
-
-
-    # --- UI Creation ---
-
-    def _create_path_selector(self, parent, row_index, label_text, string_var, is_folder=False):
-        """Helper function to create a labeled path entry with a browse button using grid."""
-        label = ttk.Label(parent, text=label_text)
-        label.grid(row=row_index, column=0, sticky='w', padx=5, pady=5)
-
-        entry = ttk.Entry(parent, textvariable=string_var)
-        entry.grid(row=row_index, column=1, sticky='ew', padx=5, pady=5)
-
-        if is_folder:
-            command = lambda: self.select_folder(string_var, f"Select {label_text}")
-            btn_text = "Browse Folder..."
-        else:
-            command = lambda: self.select_file(string_var, f"Select {label_text}")
-            btn_text = "Browse File..."
-
-        button = ttk.Button(parent, text=btn_text, command=command)
-        button.grid(row=row_index, column=2, sticky='e', padx=5, pady=5)
-
-
-    def _setup_tab_grid(self, tab_frame):
-        """Helper to configure the main grid layout for a tab."""
-        tab_frame.grid_columnconfigure(0, weight=1)
-        tab_frame.grid_rowconfigure(1, weight=1)
-
-    def _setup_input_frame(self, parent_tab):
-        """Helper to create and configure the 'Inputs' frame."""
-        frame = ttk.LabelFrame(parent_tab, text="Configuration")
-        frame.grid(row=0, column=0, sticky='ew', padx=5, pady=(5, 10))
-        frame.grid_columnconfigure(1, weight=1) # Allow the entry column to stretch
-        return frame
-
-
-    def create_single_file_tab(self):
-        parent = self.tab1
-        self._setup_tab_grid(parent)
-
-        inputs_frame = self._setup_input_frame(parent)
-
-        self.source_file_path_single = tk.StringVar()
-        self.target_file_path_single = tk.StringVar()
-
-        self._create_path_selector(inputs_frame, 0, "Source File (Original):", self.source_file_path_single)
-        self._create_path_selector(inputs_frame, 1, "Target File (To Patch):", self.target_file_path_single)
-
-        process_button = ttk.Button(inputs_frame, text="Process and Patch Single File", command=self.process_single_file, style='Accent.TButton')
-        process_button.grid(row=2, column=0, columnspan=3, sticky='ew', pady=(10, 5), padx=5)
-
-        log_frame = ttk.LabelFrame(parent, text="Log")
-        log_frame.grid(row=1, column=0, sticky='nsew', padx=5, pady=5)
-        self.log_area_single = scrolledtext.ScrolledText(log_frame, wrap=tk.WORD, height=10)
-        self.log_area_single.pack(expand=True, fill='both', padx=5, pady=5)
-
-
-    def create_batch_template_tab(self):
-        parent = self.tab2
-        self._setup_tab_grid(parent)
-
-        inputs_frame = self._setup_input_frame(parent)
-
-        self.source_folder_path_batch = tk.StringVar()
-        self.target_template_file_path = tk.StringVar()
-
-        self._create_path_selector(inputs_frame, 0, "Source Folder:", self.source_folder_path_batch, is_folder=True)
-        self._create_path_selector(inputs_frame, 1, "Target Single File:", self.target_template_file_path)
-
-        process_button = ttk.Button(inputs_frame, text="Process Batch Based On Single File", command=self.process_batch_template_mode, style='Accent.TButton')
-        process_button.grid(row=2, column=0, columnspan=3, sticky='ew', pady=(10, 5), padx=5)
-
-        log_frame = ttk.LabelFrame(parent, text="Log")
-        log_frame.grid(row=1, column=0, sticky='nsew', padx=5, pady=5)
-        self.log_area_batch_template = scrolledtext.ScrolledText(log_frame, wrap=tk.WORD, height=10)
-        self.log_area_batch_template.pack(expand=True, fill='both', padx=5, pady=5)
-
-
-    def create_folder_to_folder_tab(self):
-        parent = self.tab3
-        self._setup_tab_grid(parent)
-
-        inputs_frame = self._setup_input_frame(parent)
-
-        self.source_folder_path_map = tk.StringVar()
-        self.target_folder_path_map = tk.StringVar()
-
-        self._create_path_selector(inputs_frame, 0, "Source Folder:", self.source_folder_path_map, is_folder=True)
-        self._create_path_selector(inputs_frame, 1, "Target Folder:", self.target_folder_path_map, is_folder=True)
-
-        process_button = ttk.Button(inputs_frame, text="Process Matched Folders One By One", command=self.process_folder_to_folder, style='Accent.TButton')
-        process_button.grid(row=2, column=0, columnspan=3, sticky='ew', pady=(10, 5), padx=5)
-
-        log_frame = ttk.LabelFrame(parent, text="Log")
-        log_frame.grid(row=1, column=0, sticky='nsew', padx=5, pady=5)
-        self.log_area_map = scrolledtext.ScrolledText(log_frame, wrap=tk.WORD, height=10)
-        self.log_area_map.pack(expand=True, fill='both', padx=5, pady=5)
-
-
-    # --- Event Handlers ---
-
-    def on_tab_changed(self, event):
-        """Called when the user switches tabs. Clears and displays the relevant help text."""
-        selected_tab_index = self.notebook.index(self.notebook.select())
-
-        if selected_tab_index == 0:
-            log_area = self.log_area_single
-            help_text = HELP_TEXT_SINGLE
-        elif selected_tab_index == 1:
-            log_area = self.log_area_batch_template
-            help_text = HELP_TEXT_BATCH_TEMPLATE
-        elif selected_tab_index == 2:
-            log_area = self.log_area_map
-            help_text = HELP_TEXT_BATCH_MAP
-        else:
-            return # Should not happen
-
-        log_area.delete('1.0', tk.END)
-        log_area.insert('1.0', help_text)
-
-    # --- File/Folder Selection Dialogs (Unchanged) ---
-
-    def select_file(self, string_var, title):
-        filepath = filedialog.askopenfilename(
-            title=title,
-            filetypes=(("JSON files", "*.json"), ("All files", "*.*"))
-        )
-        if filepath:
-            string_var.set(filepath)
-
-    def select_folder(self, string_var, title):
-        folderpath = filedialog.askdirectory(title=title)
-        if folderpath:
-            string_var.set(folderpath)
-
-
-    # --- Processing Logic ---
-
-    def process_single_file(self):
-        log_area = self.log_area_single
-        log_area.delete('1.0', tk.END)
-        source_path = self.source_file_path_single.get()
-        target_path = self.target_file_path_single.get()
-
-        if not source_path or not target_path:
-            messagebox.showerror("Error", "Please select both a source and a target file.")
-            log_area.insert(tk.END, "Error: Missing file paths.\n")
-            return
-
-        try:
-            with open(source_path, 'r', encoding='utf-8') as f: source_data = json.load(f)
-            log_area.insert(tk.END, f"Loaded source file: {source_path}\n")
-            with open(target_path, 'r', encoding='utf-8') as f: target_data = json.load(f)
-            log_area.insert(tk.END, f"Loaded target file: {target_path}\n")
-        except Exception as e:
-            messagebox.showerror("File Read Error", f"Could not read or parse one of the JSON files:\n{e}")
-            log_area.insert(tk.END, f"Error loading files: {e}\n")
-            return
-
-        log_area.insert(tk.END, "\n--- Starting update process ---\n")
-        update_json_recursively(target_data, source_data, log_area)
-        log_area.insert(tk.END, "--- Update process finished ---\n\n")
-
-        try:
-            source_base, source_ext = os.path.splitext(os.path.basename(source_path))
-            save_path = filedialog.asksaveasfilename(
-                title="Save Patched File As...",
-                initialfile=f"{source_base}_modified{source_ext}",
-                defaultextension=".json",
-                filetypes=(("JSON files", "*.json"), ("All files", "*.*"))
-            )
-            if save_path:
-                with open(save_path, 'w', encoding='utf-8') as f:
-                    json.dump(target_data, f, indent=2, ensure_ascii=False)
-                messagebox.showinfo("Success", f"File successfully patched and saved to:\n{save_path}")
-                log_area.insert(tk.END, f"Patched file saved to: {save_path}\n")
-            else:
-                log_area.insert(tk.END, "Save operation was cancelled.\n")
-        except Exception as e:
-            messagebox.showerror("Save Error", f"Could not save the patched file:\n{e}")
-            log_area.insert(tk.END, f"Error saving file: {e}\n")
-
-
-    def process_batch_template_mode(self):
-        log_area = self.log_area_batch_template
-        log_area.delete('1.0', tk.END)
-
-        source_folder = self.source_folder_path_batch.get()
-        target_template_path = self.target_template_file_path.get()
-
-        if not source_folder or not target_template_path:
-            messagebox.showerror("Error", "Please select a source folder and a target template file.")
-            log_area.insert(tk.END, "Error: Incomplete inputs.\n")
-            return
-
-        if not os.path.isdir(source_folder):
-            messagebox.showerror("Error", "The specified source path is not a valid folder.")
-            log_area.insert(tk.END, "Error: Source path is not a folder.\n")
-            return
-
-        output_folder = filedialog.askdirectory(title="Select a folder to save the patched files")
-        if not output_folder:
-            log_area.insert(tk.END, "Operation cancelled. No output folder was selected.\n")
-            return
-
-        try:
-            with open(target_template_path, 'r', encoding='utf-8') as f:
-                target_template_data = json.load(f)
-            log_area.insert(tk.END, f"Loaded target template file: {target_template_path}\n\n")
-        except Exception as e:
-            messagebox.showerror("Target File Error", f"Could not read or parse the target template file:\n{e}")
-            log_area.insert(tk.END, f"Error loading target template: {e}\n")
-            return
-
-        log_area.insert(tk.END, f"--- Starting batch process for folder: {source_folder} ---\n")
-        processed_count = 0
-        source_files = [f for f in os.listdir(source_folder) if f.lower().endswith('.json')]
-
-        if not source_files:
-            messagebox.showwarning("Warning", "The source folder contains no .json files.")
-            log_area.insert(tk.END, "No .json files found in the source folder.\n")
-            return
-
-        for filename in source_files:
-            source_path = os.path.join(source_folder, filename)
-            log_area.insert(tk.END, f"\n--- Processing: {filename} ---\n")
-
-            try:
-                with open(source_path, 'r', encoding='utf-8') as f:
-                    source_data = json.load(f)
-
-                target_data_copy = copy.deepcopy(target_template_data)
-                update_json_recursively(target_data_copy, source_data, log_area)
-
-                output_path = os.path.join(output_folder, filename)
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    json.dump(target_data_copy, f, indent=2, ensure_ascii=False)
-
-                log_area.insert(tk.END, f"Successfully saved to: {output_path}\n")
-                processed_count += 1
-            except Exception as e:
-                log_area.insert(tk.END, f"!!! FAILED to process {filename}: {e}\n")
-
-        log_area.insert(tk.END, f"\n--- Batch process finished. Processed {processed_count} of {len(source_files)} files. ---\n")
-        messagebox.showinfo("Processing Complete", f"{processed_count} files were processed successfully.\nOutput saved to:\n{output_folder}")
-
-
-    def process_folder_to_folder(self):
-        log_area = self.log_area_map
-        log_area.delete('1.0', tk.END)
-
-        source_folder = self.source_folder_path_map.get()
-        target_folder = self.target_folder_path_map.get()
-
-        if not source_folder or not target_folder:
-            messagebox.showerror("Error", "Please select both a source and a target folder.")
-            log_area.insert(tk.END, "Error: Incomplete inputs.\n")
-            return
-
-        if not os.path.isdir(source_folder) or not os.path.isdir(target_folder):
-            messagebox.showerror("Error", "One of the specified paths is not a valid folder.")
-            log_area.insert(tk.END, "Error: Source or target path is not a folder.\n")
-            return
-
-        output_folder = filedialog.askdirectory(title="Select a folder to save the results")
-        if not output_folder:
-            log_area.insert(tk.END, "Operation cancelled. No output folder was selected.\n")
-            return
-
-        log_area.insert(tk.END, "Scanning for .json files in both folders...\n")
-        source_files = sorted([f for f in os.listdir(source_folder) if f.lower().endswith('.json')])
-        target_files = sorted([f for f in os.listdir(target_folder) if f.lower().endswith('.json')])
-
-        if not source_files:
-            messagebox.showwarning("Warning", "No .json files found in the source folder.")
-            log_area.insert(tk.END, "No files found in source folder.\n")
-            return
-
-        if len(source_files) != len(target_files):
-            messagebox.showerror("File Count Mismatch",
-                f"The number of .json files does not match!\n\n"
-                f"Source Folder: {len(source_files)} files\n"
-                f"Target Folder: {len(target_files)} files\n\n"
-                "Please ensure both folders contain the same number of JSON files to be matched.")
-            log_area.insert(tk.END, f"Error: File count mismatch. Source: {len(source_files)}, Target: {len(target_files)}.\n")
-            return
-
-        log_area.insert(tk.END, f"Found {len(source_files)} files to match and process.\n\n--- Starting matched folder process ---\n")
-        processed_count = 0
-
-        for i in range(len(source_files)):
-            source_filename = source_files[i]
-            target_filename = target_files[i]
-            source_path = os.path.join(source_folder, source_filename)
-            target_path = os.path.join(target_folder, target_filename)
-
-            log_area.insert(tk.END, f"\n--- Matching '{source_filename}'  ->  '{target_filename}' ---\n")
-
-            try:
-                with open(source_path, 'r', encoding='utf-8') as f:
-                    source_data = json.load(f)
-                with open(target_path, 'r', encoding='utf-8') as f:
-                    target_data = json.load(f)
-
-                update_json_recursively(target_data, source_data, log_area)
-
-                output_path = os.path.join(output_folder, source_filename)
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    json.dump(target_data, f, indent=2, ensure_ascii=False)
-
-                log_area.insert(tk.END, f"Successfully saved to: {output_path}\n")
-                processed_count += 1
-
-            except Exception as e:
-                log_area.insert(tk.END, f"!!! FAILED to process pair ('{source_filename}', '{target_filename}'): {e}\n")
-
-        log_area.insert(tk.END, f"\n--- Process finished. Processed {processed_count} of {len(source_files)} file pairs. ---\n")
-        messagebox.showinfo("Processing Complete", f"{processed_count} file pairs were processed successfully.\nOutput saved to:\n{output_folder}")
-
-
-if __name__ == "__main__":
-    root = tk.Tk()
-
-    style = ttk.Style(root)
-    # Use a modern theme if available
-    if 'clam' in style.theme_names():
-        style.theme_use('clam')
-    elif 'vista' in style.theme_names(): # Good fallback on Windows
-        style.theme_use('vista')
-
-    # Configure a custom style for the main action buttons
-    style.configure('Accent.TButton', font=('Segoe UI', 10, 'bold'), relief="raised")
-    # Tweak button color - this can be tricky with some themes, but we can try.
-    try:
-        style.map('Accent.TButton',
-            foreground=[('!disabled', 'white')],
-            background=[('!disabled', '#0078D7'), ('active', '#005a9e')])
-    except tk.TclError:
-        # Some themes don't allow background/foreground modification.
-        # The bold font will still apply.
-        pass
-
-    app = SdfFontPatcherApp(root)
-    root.mainloop()
+import os
+import sys
+import time
+import threading
+import queue
+import multiprocessing
+
+# The patch logic lives in sdf_patch, which can also be used without the GUI.
+from sdf_patch import (
+    DEFAULT_WORKER_COUNT, DEFAULT_CHUNK_SIZE, PROFILE_TRACE_FILENAME, PatchError, QueueLog, BatchProfile,
+    patch_single_file, run_batch_template, run_batch_map, watch_batch_template, is_archive_path,
+    MATCH_BY_STYLE, MATCH_BY_ORDER, OUTPUT_FORMATS, OUTPUT_PRETTY, DEFAULT_RULE_PROFILE, list_rule_profiles,
+)
+
+# ADDITION: Constants for help text
+HELP_TEXT_SINGLE = """# Single File #
+
+How to use:
+1 - In 'Source File (Original)', select an SDF JSON file.
+    (e.g., Alegreya-Regular SDF-resources.assets.json)
+
+2 - In 'Target File (To Patch)', select the SDF JSON file you want to modify.
+    (e.g., NotoSansArabic-Regular SDF-resources.assets.json)
+
+3 - Click 'Process and Patch Single File' and choose where to save the new file.
+    The saved file will be named based on the source file.
+    (e.g., Alegreya-Regular SDF-resources.assets_modified.json)
+"""
+
+HELP_TEXT_BATCH_TEMPLATE = """# Batch (One-style) #
+
+How to use:
+1 - In 'Source Folder', select a folder containing multiple source SDF JSON files.
+    Example folder contents:
+    - Alegreya-Regular SDF-resources.assets.json
+    - Alegreya-Medium SDF-resources.assets.json
+    - Alegreya-Italic SDF-resources.assets.json
+
+2 - In 'Target Single File', select one SDF JSON file to use as a same style for patching.
+    (e.g., NotoSansArabic-Regular SDF-resources.assets.json)
+
+3 - Click the process button and select an output folder.
+    Each source file will be patched using the template and saved in the output folder with its original name.
+
+Tip: 'Archive...' selects a .zip or .tar(.gz) file instead of a folder. The files are read
+straight from it, and the results are saved into a new archive you choose.
+
+Tip: 'Watch Source Folder' does the same, then keeps the template loaded and patches each
+source file again as soon as it is saved, until you click Cancel. Editing the template
+re-patches every file.
+"""
+
+HELP_TEXT_BATCH_MAP = """# Batch (Multi-style) #
+
+How to use:
+1 - In 'Source Folder', select a folder with your source SDF JSON files.
+    Example folder contents:
+    - Alegreya-Regular SDF-resources.assets.json
+    - Alegreya-Medium SDF-resources.assets.json
+    - Alegreya-Italic SDF-resources.assets.json
+
+2 - In 'Target Folder', select a folder with the corresponding target SDF JSON files to be patched.
+    Example folder contents:
+    - NotoSansArabic-Regular SDF-resources.assets.json
+    - NotoSansArabic-Medium SDF-resources.assets.json
+    - NotoSansArabic-Italic SDF-resources.assets.json
+
+    Each source file is matched with the target file of the same font style (Regular with Regular,
+    Italic with Italic, ...), read from m_FaceInfo.m_StyleName (or the end of m_Name).
+    Files without a partner of the same style are listed in the log and left out.
+    Tick 'Match by alphabetical order' to pair the files by their sorted names instead; both
+    folders must then have the same number of .json files.
+
+3 - Click the process button and select an output folder.
+    Each patched file will be saved with the name of its corresponding source file.
+
+Tip: 'Archive...' selects a .zip or .tar(.gz) file instead of a folder. The files are read
+straight from it, and the results are saved into a new archive you choose.
+"""
+
+
+# File types offered when a zip or tar archive is used in place of a folder.
+ARCHIVE_FILE_TYPES = (("Zip archives", "*.zip"), ("Tar archives", "*.tar *.tar.gz *.tgz *.tar.bz2 *.tar.xz"),
+                      ("All files", "*.*"))
+
+# How often the GUI drains the event queue, and how much log text it renders per tick.
+# Capping the text per tick keeps the window responsive no matter how much is logged.
+EVENT_POLL_INTERVAL_MS = 50
+EVENT_POLL_MAX_EVENTS = 10000
+LOG_FLUSH_MAX_CHARS = 64 * 1024
+
+
+class SdfFontPatcherApp:
+    """
+    A GUI application for patching JSON-based SDF Font Asset files.
+    """
+    def __init__(self, master):
+        self.master = master
+        master.title("SDF Font JSON Editor By MrGamesKingPro")
+        master.geometry("850x650")
+        master.minsize(700, 500)
+
+        # Main notebook for tabs
+        self.notebook = ttk.Notebook(master)
+        self.notebook.pack(expand=True, fill='both', padx=10, pady=10)
+
+        # Create frames for each tab
+        self.tab1 = ttk.Frame(self.notebook)
+        self.tab2 = ttk.Frame(self.notebook)
+        self.tab3 = ttk.Frame(self.notebook)
+
+        self.notebook.add(self.tab1, text='Single File')
+        self.notebook.add(self.tab2, text='Batch (One-style)')
+        self.notebook.add(self.tab3, text='Batch (Multi-style)')
+
+        # Build the UI for each tab
+        self.create_single_file_tab()
+        self.create_batch_template_tab()
+        self.create_folder_to_folder_tab()
+
+        self.create_status_bar()
+
+        # Background job state. The worker thread only talks to the GUI through this queue.
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.job_thread = None
+        self.job_log_area = None
+        self.job_start_time = None
+        self.pending_log = []
+        self.pending_log_area = None
+        self.master.after(EVENT_POLL_INTERVAL_MS, self.poll_events)
+
+        # ADDITION: Bind tab change event to update help text
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+
+        # ADDITION: Set initial help text for the first tab on launch
+        self.on_tab_changed(None)
+
+
+    # --- UI Creation ---
+
+    def _create_path_selector(self, parent, row_index, label_text, string_var, is_folder=False):
+        """Helper function to create a labeled path entry with a browse button using grid."""
+        label = ttk.Label(parent, text=label_text)
+        label.grid(row=row_index, column=0, sticky='w', padx=5, pady=5)
+
+        entry = ttk.Entry(parent, textvariable=string_var)
+        entry.grid(row=row_index, column=1, sticky='ew', padx=5, pady=5)
+
+        if is_folder:
+            # A zip or tar archive can be used in place of a folder.
+            buttons = ttk.Frame(parent)
+            buttons.grid(row=row_index, column=2, sticky='e', padx=5, pady=5)
+            ttk.Button(buttons, text="Browse Folder...",
+                       command=lambda: self.select_folder(string_var, f"Select {label_text}")).pack(side='left')
+            ttk.Button(buttons, text="Archive...",
+                       command=lambda: self.select_archive(string_var, f"Select {label_text}")).pack(side='left', padx=(5, 0))
+            return
+
+        command = lambda: self.select_file(string_var, f"Select {label_text}")
+        button = ttk.Button(parent, text="Browse File...", command=command)
+        button.grid(row=row_index, column=2, sticky='e', padx=5, pady=5)
+
+
+    def _create_pool_options(self, parent, row_index):
+        """Helper to create the worker count / chunk size / memory budget spinboxes for the batch tabs."""
+        workers_var = tk.IntVar(value=DEFAULT_WORKER_COUNT)
+        chunk_var = tk.IntVar(value=DEFAULT_CHUNK_SIZE)
+        memory_var = tk.IntVar(value=0)
+
+        label = ttk.Label(parent, text="Worker Processes:")
+        label.grid(row=row_index, column=0, sticky='w', padx=5, pady=5)
+
+        options_frame = ttk.Frame(parent)
+        options_frame.grid(row=row_index, column=1, columnspan=2, sticky='w', padx=5, pady=5)
+        ttk.Spinbox(options_frame, from_=1, to=256, width=5, textvariable=workers_var).pack(side='left')
+        ttk.Label(options_frame, text="Chunk Size:").pack(side='left', padx=(15, 5))
+        ttk.Spinbox(options_frame, from_=1, to=1000, width=5, textvariable=chunk_var).pack(side='left')
+        ttk.Label(options_frame, text="Memory Budget (MB, 0 = none):").pack(side='left', padx=(15, 5))
+        ttk.Spinbox(options_frame, from_=0, to=1048576, increment=512, width=7, textvariable=memory_var).pack(side='left')
+        return workers_var, chunk_var, memory_var
+
+    def _create_splice_option(self, parent, row_index):
+        """Helper to create the 'keep target formatting' checkbox."""
+        splice_var = tk.BooleanVar(value=False)
+        check = ttk.Checkbutton(parent, variable=splice_var,
+                                text="Keep target file formatting (only rewrite the changed values)")
+        check.grid(row=row_index, column=0, columnspan=3, sticky='w', padx=5, pady=5)
+        return splice_var
+
+    def _create_merge_option(self, parent, row_index):
+        """Helper to create the 'merge keyed records' checkbox."""
+        merge_var = tk.BooleanVar(value=False)
+        check = ttk.Checkbutton(parent, variable=merge_var,
+                                text="Merge kerning records by glyph pair (instead of replacing the whole table)")
+        check.grid(row=row_index, column=0, columnspan=3, sticky='w', padx=5, pady=5)
+        return merge_var
+
+    def _create_preflight_option(self, parent, row_index):
+        """Helper to create the 'check every input first' checkbox of the batch tabs."""
+        preflight_var = tk.BooleanVar(value=False)
+        check = ttk.Checkbutton(parent, variable=preflight_var,
+                                text="Check every input first (stop before writing anything if a file is broken or doesn't fit)")
+        check.grid(row=row_index, column=0, columnspan=3, sticky='w', padx=5, pady=5)
+        return preflight_var
+
+    def _create_format_option(self, parent, row_index):
+        """Helper to create the output format selector."""
+        format_var = tk.StringVar(value=OUTPUT_PRETTY)
+        label = ttk.Label(parent, text="Output Format:")
+        label.grid(row=row_index, column=0, sticky='w', padx=5, pady=5)
+        options_frame = ttk.Frame(parent)
+        options_frame.grid(row=row_index, column=1, columnspan=2, sticky='w', padx=5, pady=5)
+        ttk.Combobox(options_frame, textvariable=format_var, values=OUTPUT_FORMATS, state='readonly', width=10).pack(side='left')
+        ttk.Label(options_frame, text="(pretty = indented, compact = smallest and fastest, preserve = like the target file)").pack(side='left', padx=(10, 0))
+        return format_var
+
+    def _create_rules_option(self, parent, row_index):
+        """Helper to create the rule profile selector; the list is re-read each time it is opened."""
+        rules_var = tk.StringVar(value=DEFAULT_RULE_PROFILE)
+        label = ttk.Label(parent, text="Rule Profile:")
+        label.grid(row=row_index, column=0, sticky='w', padx=5, pady=5)
+        options_frame = ttk.Frame(parent)
+        options_frame.grid(row=row_index, column=1, columnspan=2, sticky='w', padx=5, pady=5)
+        combobox = ttk.Combobox(options_frame, textvariable=rules_var, values=list_rule_profiles(), state='readonly', width=24)
+        combobox.configure(postcommand=lambda: combobox.configure(values=list_rule_profiles()))
+        combobox.pack(side='left')
+        ttk.Label(options_frame, text="(the keys to patch; add a profile as a .json file in the rule_profiles folder)").pack(side='left', padx=(10, 0))
+        return rules_var
+
+    def _create_force_option(self, parent, row_index):
+        """Helper to create the 'rebuild every file' checkbox of the batch tabs."""
+        force_var = tk.BooleanVar(value=False)
+        check = ttk.Checkbutton(parent, variable=force_var,
+                                text="Rebuild every file (don't skip files whose inputs are unchanged since the last run)")
+        check.grid(row=row_index, column=0, columnspan=3, sticky='w', padx=5, pady=5)
+        return force_var
+
+    def _create_profile_option(self, parent, row_index, text):
+        """Helper to create the 'profile' checkbox."""
+        profile_var = tk.BooleanVar(value=False)
+        check = ttk.Checkbutton(parent, variable=profile_var, text=text)
+        check.grid(row=row_index, column=0, columnspan=3, sticky='w', padx=5, pady=5)
+        return profile_var
+
+    def _get_pool_options(self, workers_var, chunk_var, memory_var):
+        """
+        Reads the spinbox values, falling back to the defaults on bad input.
+        Returns (worker_count, chunk_size, memory_budget), the budget in bytes or None.
+        """
+        try:
+            worker_count = max(1, workers_var.get())
+        except tk.TclError:
+            worker_count = DEFAULT_WORKER_COUNT
+        try:
+            chunk_size = max(1, chunk_var.get())
+        except tk.TclError:
+            chunk_size = DEFAULT_CHUNK_SIZE
+        try:
+            memory_budget = max(0, memory_var.get()) * 1024 * 1024 or None
+        except tk.TclError:
+            memory_budget = None
+        return worker_count, chunk_size, memory_budget
+
+
+    def _setup_tab_grid(self, tab_frame):
+        """Helper to configure the main grid layout for a tab."""
+        tab_frame.grid_columnconfigure(0, weight=1)
+        tab_frame.grid_rowconfigure(1, weight=1)
+
+    def _setup_input_frame(self, parent_tab):
+        """Helper to create and configure the 'Inputs' frame."""
+        frame = ttk.LabelFrame(parent_tab, text="Configuration")
+        frame.grid(row=0, column=0, sticky='ew', padx=5, pady=(5, 10))
+        frame.grid_columnconfigure(1, weight=1) # Allow the entry column to stretch
+        return frame
+
+
+    def create_single_file_tab(self):
+        parent = self.tab1
+        self._setup_tab_grid(parent)
+
+        inputs_frame = self._setup_input_frame(parent)
+
+        self.source_file_path_single = tk.StringVar()
+        self.target_file_path_single = tk.StringVar()
+
+        self._create_path_selector(inputs_frame, 0, "Source File (Original):", self.source_file_path_single)
+        self._create_path_selector(inputs_frame, 1, "Target File (To Patch):", self.target_file_path_single)
+        self.splice_single = self._create_splice_option(inputs_frame, 2)
+        self.profile_single = self._create_profile_option(inputs_frame, 3, "Profile (show per-phase timings in the log)")
+        self.merge_single = self._create_merge_option(inputs_frame, 4)
+        self.format_single = self._create_format_option(inputs_frame, 5)
+        self.rules_single = self._create_rules_option(inputs_frame, 6)
+
+        process_button = ttk.Button(inputs_frame, text="Process and Patch Single File", command=self.process_single_file, style='Accent.TButton')
+        process_button.grid(row=7, column=0, columnspan=3, sticky='ew', pady=(10, 5), padx=5)
+
+        log_frame = ttk.LabelFrame(parent, text="Log")
+        log_frame.grid(row=1, column=0, sticky='nsew', padx=5, pady=5)
+        self.log_area_single = scrolledtext.ScrolledText(log_frame, wrap=tk.WORD, height=10)
+        self.log_area_single.pack(expand=True, fill='both', padx=5, pady=5)
+
+
+    def create_batch_template_tab(self):
+        parent = self.tab2
+        self._setup_tab_grid(parent)
+
+        inputs_frame = self._setup_input_frame(parent)
+
+        self.source_folder_path_batch = tk.StringVar()
+        self.target_template_file_path = tk.StringVar()
+
+        self._create_path_selector(inputs_frame, 0, "Source Folder:", self.source_folder_path_batch, is_folder=True)
+        self._create_path_selector(inputs_frame, 1, "Target Single File:", self.target_template_file_path)
+        self.workers_batch, self.chunk_size_batch, self.memory_batch = self._create_pool_options(inputs_frame, 2)
+        self.splice_batch = self._create_splice_option(inputs_frame, 3)
+        self.force_batch = self._create_force_option(inputs_frame, 4)
+        self.profile_batch = self._create_profile_option(inputs_frame, 5, "Profile (show per-phase timings in the log and save a trace file in the output folder)")
+        self.merge_batch = self._create_merge_option(inputs_frame, 6)
+        self.preflight_batch = self._create_preflight_option(inputs_frame, 7)
+        self.format_batch = self._create_format_option(inputs_frame, 8)
+        self.rules_batch = self._create_rules_option(inputs_frame, 9)
+
+        process_button = ttk.Button(inputs_frame, text="Process Batch Based On Single File", command=self.process_batch_template_mode, style='Accent.TButton')
+        process_button.grid(row=10, column=0, columnspan=3, sticky='ew', pady=(10, 5), padx=5)
+        watch_button = ttk.Button(inputs_frame, text="Watch Source Folder (re-patch changed files until Cancel)", command=self.watch_batch_template_mode)
+        watch_button.grid(row=11, column=0, columnspan=3, sticky='ew', pady=(0, 5), padx=5)
+
+        log_frame = ttk.LabelFrame(parent, text="Log")
+        log_frame.grid(row=1, column=0, sticky='nsew', padx=5, pady=5)
+        self.log_area_batch_template = scrolledtext.ScrolledText(log_frame, wrap=tk.WORD, height=10)
+        self.log_area_batch_template.pack(expand=True, fill='both', padx=5, pady=5)
+
+
+    def create_folder_to_folder_tab(self):
+        parent = self.tab3
+        self._setup_tab_grid(parent)
+
+        inputs_frame = self._setup_input_frame(parent)
+
+        self.source_folder_path_map = tk.StringVar()
+        self.target_folder_path_map = tk.StringVar()
+
+        self._create_path_selector(inputs_frame, 0, "Source Folder:", self.source_folder_path_map, is_folder=True)
+        self._create_path_selector(inputs_frame, 1, "Target Folder:", self.target_folder_path_map, is_folder=True)
+        self.workers_map, self.chunk_size_map, self.memory_map = self._create_pool_options(inputs_frame, 2)
+        self.splice_map = self._create_splice_option(inputs_frame, 3)
+        self.force_map = self._create_force_option(inputs_frame, 4)
+        self.profile_map = self._create_profile_option(inputs_frame, 5, "Profile (show per-phase timings in the log and save a trace file in the output folder)")
+        self.match_by_order_map = tk.BooleanVar(value=False)
+        ttk.Checkbutton(inputs_frame, variable=self.match_by_order_map,
+                        text="Match by alphabetical order (instead of by font style)").grid(
+            row=6, column=0, columnspan=3, sticky='w', padx=5, pady=5)
+        self.merge_map = self._create_merge_option(inputs_frame, 7)
+        self.preflight_map = self._create_preflight_option(inputs_frame, 8)
+        self.format_map = self._create_format_option(inputs_frame, 9)
+        self.rules_map = self._create_rules_option(inputs_frame, 10)
+
+        process_button = ttk.Button(inputs_frame, text="Process Matched Folders One By One", command=self.process_folder_to_folder, style='Accent.TButton')
+        process_button.grid(row=11, column=0, columnspan=3, sticky='ew', pady=(10, 5), padx=5)
+
+        log_frame = ttk.LabelFrame(parent, text="Log")
+        log_frame.grid(row=1, column=0, sticky='nsew', padx=5, pady=5)
+        self.log_area_map = scrolledtext.ScrolledText(log_frame, wrap=tk.WORD, height=10)
+        self.log_area_map.pack(expand=True, fill='both', padx=5, pady=5)
+
+
+    def create_status_bar(self):
+        status_frame = ttk.Frame(self.master)
+        status_frame.pack(fill='x', padx=10, pady=(0, 10))
+        status_frame.grid_columnconfigure(0, weight=1)
+
+        self.progress_bar = ttk.Progressbar(status_frame, mode='determinate')
+        self.progress_bar.grid(row=0, column=0, sticky='ew', padx=5)
+
+        self.status_text = tk.StringVar(value="Ready.")
+        status_label = ttk.Label(status_frame, textvariable=self.status_text, width=45)
+        status_label.grid(row=0, column=1, sticky='w', padx=5)
+
+        self.cancel_button = ttk.Button(status_frame, text="Cancel", command=self.cancel_job, state='disabled')
+        self.cancel_button.grid(row=0, column=2, sticky='e', padx=5)
+
+
+    # --- Event Handlers ---
+
+    def on_tab_changed(self, event):
+        """Called when the user switches tabs. Clears and displays the relevant help text."""
+        selected_tab_index = self.notebook.index(self.notebook.select())
+
+        if selected_tab_index == 0:
+            log_area = self.log_area_single
+            help_text = HELP_TEXT_SINGLE
+        elif selected_tab_index == 1:
+            log_area = self.log_area_batch_template
+            help_text = HELP_TEXT_BATCH_TEMPLATE
+        elif selected_tab_index == 2:
+            log_area = self.log_area_map
+            help_text = HELP_TEXT_BATCH_MAP
+        else:
+            return # Should not happen
+
+        if log_area is self.job_log_area or (log_area is self.pending_log_area and self.pending_log):
+            return # Keep the log of a running job
+
+        log_area.delete('1.0', tk.END)
+        log_area.insert('1.0', help_text)
+
+    # --- File/Folder Selection Dialogs (Unchanged) ---
+
+    def select_file(self, string_var, title):
+        filepath = filedialog.askopenfilename(
+            title=title,
+            filetypes=(("JSON files", "*.json"), ("All files", "*.*"))
+        )
+        if filepath:
+            string_var.set(filepath)
+
+    def select_folder(self, string_var, title):
+        folderpath = filedialog.askdirectory(title=title)
+        if folderpath:
+            string_var.set(folderpath)
+
+    def select_archive(self, string_var, title):
+        filepath = filedialog.askopenfilename(title=title, filetypes=ARCHIVE_FILE_TYPES)
+        if filepath:
+            string_var.set(filepath)
+
+    def ask_output_folder(self, input_folder, title):
+        """Asks where to save a batch: a new archive if the input is an archive, otherwise a folder."""
+        if is_archive_path(input_folder):
+            return filedialog.asksaveasfilename(title=title, filetypes=ARCHIVE_FILE_TYPES, defaultextension=".zip")
+        return filedialog.askdirectory(title=title)
+
+    @staticmethod
+    def is_input_folder(path):
+        return os.path.isdir(path) or (os.path.isfile(path) and is_archive_path(path))
+
+
+    # --- Background Jobs ---
+    # Processing runs on a worker thread. The worker posts ("log", text), ("progress", done, total),
+    # ("call", func, args) and ("finished",) events; poll_events() applies them on the Tk thread.
+
+    def warn_if_busy(self):
+        """Shows a warning and returns True while a background job is running."""
+        if self.job_log_area is not None:
+            messagebox.showwarning("Busy", "Another job is still running. Please wait for it to finish or cancel it.")
+            return True
+        return False
+
+    def start_job(self, log_area, work, *args):
+        """Runs work(*args) on a background thread, logging into log_area."""
+        self.cancel_event.clear()
+        self._flush_log(flush_all=True) # Text still owed to the previous job's log
+        self.job_log_area = log_area
+        self.pending_log_area = log_area
+        self.job_start_time = time.perf_counter()
+        self.progress_bar.configure(value=0, maximum=1)
+        self.status_text.set("Working...")
+        self.cancel_button.configure(state='normal')
+
+        self.job_thread = threading.Thread(target=self._run_job, args=(work, args), daemon=True)
+        self.job_thread.start()
+
+    def _run_job(self, work, args):
+        try:
+            work(*args)
+        except Exception as e:
+            self.post_log(f"!!! Unexpected error: {e}\n")
+        finally:
+            self.events.put(("finished",))
+
+    def post_log(self, text):
+        self.events.put(("log", text))
+
+    def post_progress(self, done, total):
+        self.events.put(("progress", done, total))
+
+    def call_in_gui(self, func, *args):
+        """Schedules func(*args) on the Tk thread (e.g. for message boxes and dialogs)."""
+        self.events.put(("call", func, args))
+
+    def call_in_gui_and_wait(self, func, *args, **kwargs):
+        """Runs func on the Tk thread and blocks the calling worker until it returns its result."""
+        reply = queue.Queue(maxsize=1)
+
+        def run():
+            try:
+                reply.put((func(*args, **kwargs), None))
+            except Exception as e:
+                reply.put((None, e))
+
+        self.call_in_gui(run)
+        result, error = reply.get()
+        if error is not None:
+            raise error
+        return result
+
+    def show_patch_error(self, error):
+        """Shows a PatchError raised by one of the modes in a message box."""
+        show = messagebox.showwarning if error.warning else messagebox.showerror
+        self.call_in_gui(show, error.title, str(error))
+
+    def cancel_job(self):
+        if self.job_log_area is not None:
+            self.cancel_event.set()
+            self.status_text.set("Cancelling after the current file...")
+            self.cancel_button.configure(state='disabled')
+
+    def poll_events(self):
+        """Drains the event queue and renders queued log text in one coalesced insert."""
+        calls = []
+        finished = False
+        try:
+            for _ in range(EVENT_POLL_MAX_EVENTS):
+                event = self.events.get_nowait()
+                kind = event[0]
+                if kind == "log":
+                    self.pending_log.append(event[1])
+                elif kind == "progress":
+                    self._update_progress(event[1], event[2])
+                elif kind == "call":
+                    calls.append(event[1:])
+                elif kind == "finished":
+                    finished = True
+        except queue.Empty:
+            pass
+
+        self._flush_log()
+
+        if finished:
+            self.job_log_area = None
+            self.cancel_button.configure(state='disabled')
+            self.status_text.set("Cancelled." if self.cancel_event.is_set() else "Done.")
+
+        for func, args in calls:
+            func(*args)
+
+        self.master.after(EVENT_POLL_INTERVAL_MS, self.poll_events)
+
+    def _flush_log(self, flush_all=False):
+        if not self.pending_log:
+            return
+        log_area = self.pending_log_area
+        text = "".join(self.pending_log)
+        self.pending_log = []
+        if not flush_all and len(text) > LOG_FLUSH_MAX_CHARS:
+            self.pending_log.append(text[LOG_FLUSH_MAX_CHARS:])
+            text = text[:LOG_FLUSH_MAX_CHARS]
+        if log_area is not None:
+            log_area.insert(tk.END, text)
+            log_area.see(tk.END)
+
+    def _update_progress(self, done, total):
+        self.progress_bar.configure(maximum=max(total, 1), value=done)
+        if self.cancel_event.is_set():
+            return
+        elapsed = time.perf_counter() - self.job_start_time
+        rate = done / elapsed if elapsed > 0 else 0.0
+        if rate > 0 and done < total:
+            eta = time.strftime("%H:%M:%S", time.gmtime((total - done) / rate))
+        else:
+            eta = "--:--:--"
+        self.status_text.set(f"{done}/{total} files | {rate:.1f} files/s | ETA {eta}")
+
+
+    # --- Processing Logic ---
+
+    def process_single_file(self):
+        if self.warn_if_busy():
+            return
+        log_area = self.log_area_single
+        log_area.delete('1.0', tk.END)
+        source_path = self.source_file_path_single.get()
+        target_path = self.target_file_path_single.get()
+
+        if not source_path or not target_path:
+            messagebox.showerror("Error", "Please select both a source and a target file.")
+            log_area.insert(tk.END, "Error: Missing file paths.\n")
+            return
+
+        self.start_job(log_area, self._patch_single_file, source_path, target_path,
+                       self.splice_single.get(), self.profile_single.get(), self.merge_single.get(),
+                       self.format_single.get(), self.rules_single.get())
+
+    def _patch_single_file(self, source_path, target_path, splice, profiled, merge, output_format, rule_profile):
+        profile = BatchProfile() if profiled else None
+        try:
+            patched = patch_single_file(source_path, target_path, self.events, splice, profile, merge, output_format,
+                                        rule_profile)
+        except PatchError as e:
+            self.show_patch_error(e)
+            return
+
+        with patched:
+            try:
+                source_base, source_ext = os.path.splitext(os.path.basename(source_path))
+                # Dialogs have to run on the Tk thread; this worker waits for the answer.
+                save_path = self.call_in_gui_and_wait(
+                    filedialog.asksaveasfilename,
+                    title="Save Patched File As...",
+                    initialfile=f"{source_base}_modified{source_ext}",
+                    defaultextension=".json",
+                    filetypes=(("JSON files", "*.json"), ("All files", "*.*"))
+                )
+                if save_path:
+                    patched.save(save_path, QueueLog(self.events))
+                    self.call_in_gui(messagebox.showinfo, "Success", f"File successfully patched and saved to:\n{save_path}")
+                    self.post_log(f"Patched file saved to: {save_path}\n")
+                else:
+                    self.post_log("Save operation was cancelled.\n")
+            except Exception as e:
+                self.call_in_gui(messagebox.showerror, "Save Error", f"Could not save the patched file:\n{e}")
+                self.post_log(f"Error saving file: {e}\n")
+        if profile is not None:
+            self.post_log(profile.summary_table())
+
+
+    def _save_profile_trace(self, profile, output_folder):
+        if profile is None:
+            return
+        if is_archive_path(output_folder): # Saved next to the output archive
+            trace_path = os.path.join(os.path.dirname(os.path.abspath(output_folder)), PROFILE_TRACE_FILENAME)
+        else:
+            trace_path = os.path.join(output_folder, PROFILE_TRACE_FILENAME)
+        try:
+            profile.write_chrome_trace(trace_path)
+            self.post_log(f"Profile trace (open it in https://ui.perfetto.dev) saved to: {trace_path}\n")
+        except OSError as e:
+            self.post_log(f"Could not save the profile trace: {e}\n")
+
+
+    def process_batch_template_mode(self):
+        if self.warn_if_busy():
+            return
+        log_area = self.log_area_batch_template
+        log_area.delete('1.0', tk.END)
+
+        source_folder = self.source_folder_path_batch.get()
+        target_template_path = self.target_template_file_path.get()
+
+        if not source_folder or not target_template_path:
+            messagebox.showerror("Error", "Please select a source folder and a target template file.")
+            log_area.insert(tk.END, "Error: Incomplete inputs.\n")
+            return
+
+        if not self.is_input_folder(source_folder):
+            messagebox.showerror("Error", "The specified source path is not a valid folder or archive.")
+            log_area.insert(tk.END, "Error: Source path is not a folder or archive.\n")
+            return
+
+        output_folder = self.ask_output_folder(source_folder, "Select a folder to save the patched files")
+        if not output_folder:
+            log_area.insert(tk.END, "Operation cancelled. No output folder was selected.\n")
+            return
+
+        worker_count, chunk_size, memory_budget = self._get_pool_options(self.workers_batch, self.chunk_size_batch, self.memory_batch)
+        self.start_job(log_area, self._run_batch_template_mode, source_folder, target_template_path,
+                       output_folder, worker_count, chunk_size, self.splice_batch.get(), self.force_batch.get(),
+                       self.profile_batch.get(), memory_budget, self.merge_batch.get(), self.preflight_batch.get(),
+                       self.format_batch.get(), self.rules_batch.get())
+
+    def _run_batch_template_mode(self, source_folder, target_template_path, output_folder, worker_count, chunk_size, splice, force, profiled,
+                                 memory_budget, merge, preflight, output_format, rule_profile):
+        profile = BatchProfile() if profiled else None
+        try:
+            result = run_batch_template(source_folder, target_template_path, output_folder, self.events,
+                                        worker_count, chunk_size, splice, self.cancel_event, force, profile, memory_budget,
+                                        merge, preflight, output_format, rule_profile)
+        except PatchError as e:
+            self.show_patch_error(e)
+            return
+        self._save_profile_trace(profile, output_folder)
+        if not result.cancelled:
+            self.call_in_gui(messagebox.showinfo, "Processing Complete", f"{result.processed} files were processed successfully.\nOutput saved to:\n{output_folder}")
+
+    def watch_batch_template_mode(self):
+        if self.warn_if_busy():
+            return
+        log_area = self.log_area_batch_template
+        log_area.delete('1.0', tk.END)
+
+        source_folder = self.source_folder_path_batch.get()
+        target_template_path = self.target_template_file_path.get()
+
+        if not source_folder or not target_template_path:
+            messagebox.showerror("Error", "Please select a source folder and a target template file.")
+            log_area.insert(tk.END, "Error: Incomplete inputs.\n")
+            return
+
+        if not os.path.isdir(source_folder):
+            messagebox.showerror("Error", "Watch mode needs a source folder (not an archive).")
+            log_area.insert(tk.END, "Error: Source path is not a folder.\n")
+            return
+
+        output_folder = filedialog.askdirectory(title="Select a folder to save the patched files")
+        if not output_folder:
+            log_area.insert(tk.END, "Operation cancelled. No output folder was selected.\n")
+            return
+
+        self.start_job(log_area, self._run_watch_mode, source_folder, target_template_path, output_folder,
+                       self.splice_batch.get(), self.force_batch.get(), self.merge_batch.get(), self.format_batch.get(),
+                       self.rules_batch.get())
+
+    def _run_watch_mode(self, source_folder, target_template_path, output_folder, splice, force, merge, output_format,
+                        rule_profile):
+        try:
+            watch_batch_template(source_folder, target_template_path, output_folder, self.events, splice,
+                                 self.cancel_event, force, merge=merge, output_format=output_format,
+                                 rule_profile=rule_profile)
+        except PatchError as e:
+            self.show_patch_error(e)
+
+
+    def process_folder_to_folder(self):
+        if self.warn_if_busy():
+            return
+        log_area = self.log_area_map
+        log_area.delete('1.0', tk.END)
+
+        source_folder = self.source_folder_path_map.get()
+        target_folder = self.target_folder_path_map.get()
+
+        if not source_folder or not target_folder:
+            messagebox.showerror("Error", "Please select both a source and a target folder.")
+            log_area.insert(tk.END, "Error: Incomplete inputs.\n")
+            return
+
+        if not self.is_input_folder(source_folder) or not self.is_input_folder(target_folder):
+            messagebox.showerror("Error", "One of the specified paths is not a valid folder or archive.")
+            log_area.insert(tk.END, "Error: Source or target path is not a folder or archive.\n")
+            return
+
+        output_folder = self.ask_output_folder(source_folder, "Select a folder to save the results")
+        if not output_folder:
+            log_area.insert(tk.END, "Operation cancelled. No output folder was selected.\n")
+            return
+
+        worker_count, chunk_size, memory_budget = self._get_pool_options(self.workers_map, self.chunk_size_map, self.memory_map)
+        self.start_job(log_area, self._run_folder_to_folder, source_folder, target_folder,
+                       output_folder, worker_count, chunk_size, self.splice_map.get(), self.force_map.get(),
+                       self.profile_map.get(), MATCH_BY_ORDER if self.match_by_order_map.get() else MATCH_BY_STYLE,
+                       memory_budget, self.merge_map.get(), self.preflight_map.get(), self.format_map.get(),
+                       self.rules_map.get())
+
+    def _run_folder_to_folder(self, source_folder, target_folder, output_folder, worker_count, chunk_size, splice, force, profiled, match,
+                              memory_budget, merge, preflight, output_format, rule_profile):
+        profile = BatchProfile() if profiled else None
+        try:
+            result = run_batch_map(source_folder, target_folder, output_folder, self.events,
+                                   worker_count, chunk_size, splice, self.cancel_event, force, profile, match, memory_budget,
+                                   merge, preflight, output_format, rule_profile)
+        except PatchError as e:
+            self.show_patch_error(e)
+            return
+        self._save_profile_trace(profile, output_folder)
+        if not result.cancelled:
+            message = f"{result.processed} file pairs were processed successfully.\nOutput saved to:\n{output_folder}"
+            unmatched = len(result.unmatched_sources) + len(result.unmatched_targets)
+            if unmatched:
+                message += f"\n\n{unmatched} file(s) had no partner of the same style and were left out (see the log)."
+            if result.unreadable:
+                message += f"\n\n{len(result.unreadable)} file(s) could not be read and were left out (see the log)."
+            self.call_in_gui(messagebox.showinfo, "Processing Complete", message)
+
+
+if __name__ == "__main__":
+    # Required for the process pool when running as a frozen executable.
+    multiprocessing.freeze_support()
+
+    # With arguments, run the command line interface instead of the window (see sdf_patch.main).
+    if len(sys.argv) > 1:
+        import sdf_patch
+        argv = sys.argv[1:]
+        if argv[0] == "--benchmark": # Old form: --benchmark SOURCE_FOLDER TEMPLATE_FILE [WORKERS] [CHUNK_SIZE]
+            argv = ["benchmark"] + argv[1:3] + [option for name, value in zip(("--workers", "--chunk-size"), argv[3:5])
+                                                for option in (name, value)]
+        sys.exit(sdf_patch.main(argv))
+
+    # Only the window needs tkinter, so it is imported here: the command line above also works on
+    # a Python without Tk, and the worker processes of a batch don't load it.
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox, scrolledtext
+
+    root = tk.Tk()
+
+    style = ttk.Style(root)
+    # Use a modern theme if available
+    if 'clam' in style.theme_names():
+        style.theme_use('clam')
+    elif 'vista' in style.theme_names(): # Good fallback on Windows
+        style.theme_use('vista')
+
+    # Configure a custom style for the main action buttons
+    style.configure('Accent.TButton', font=('Segoe UI', 10, 'bold'), relief="raised")
+    # Tweak button color - this can be tricky with some themes, but we can try.
+    try:
+        style.map('Accent.TButton',
+            foreground=[('!disabled', 'white')],
+            background=[('!disabled', '#0078D7'), ('active', '#005a9e')])
+    except tk.TclError:
+        # Some themes don't allow background/foreground modification.
+        # The bold font will still apply.
+        pass
+
+    app = SdfFontPatcherApp(root)
+    root.mainloop()
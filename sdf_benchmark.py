@@ -0,0 +1,472 @@
+"""
+Benchmark suite for the patch pipeline of sdf_patch.
+
+Generates synthetic TextMesh Pro SDF font assets with the key layout of real UABEA exports
+(configurable glyph, kerning-pair and file counts), times the load, patch and dump phases of
+the three modes separately, records the peak memory of each mode and writes a JSON report.
+A report from an earlier run can be passed as a baseline to catch regressions:
+
+    python -m sdf_benchmark --glyphs 5000 --kerning-pairs 20000 --files 8 --output report.json
+    python -m sdf_benchmark ... --baseline report.json --tolerance 0.25
+"""
+import json
+import os
+import sys
+import time
+import random
+import platform
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import sdf_patch
+
+try:
+    import resource # Not available on Windows
+except ImportError:
+    resource = None
+
+REPORT_VERSION = 1
+DEFAULT_GLYPH_COUNT = 2000
+DEFAULT_KERNING_PAIR_COUNT = 10000
+DEFAULT_FILE_COUNT = 4
+DEFAULT_REPEAT = 3
+# A phase only counts as a regression if it is slower than the baseline by this fraction.
+DEFAULT_TOLERANCE = 0.25
+# Phases faster than this (in seconds) are too noisy to compare against a baseline.
+MIN_COMPARED_SECONDS = 0.01
+
+EXIT_OK = 0
+EXIT_REGRESSION = 1
+
+
+# --- Synthetic Assets ---
+
+def _file_reference(rng):
+    return {"m_FileID": 0, "m_PathID": rng.randrange(1, 2 ** 62)}
+
+
+def _guid(rng):
+    return "%032x" % rng.getrandbits(128)
+
+
+def _glyph_value_record(rng):
+    return {
+        "m_XPlacement": 0.0,
+        "m_YPlacement": 0.0,
+        "m_XAdvance": round(rng.uniform(-8.0, 2.0), 2),
+        "m_YAdvance": 0.0,
+    }
+
+
+def generate_sdf_asset(family_name, style_name="Regular", glyph_count=DEFAULT_GLYPH_COUNT,
+                       kerning_pair_count=DEFAULT_KERNING_PAIR_COUNT, fallback_count=2, newer_format=True, seed=0):
+    """
+    Returns a synthetic TextMesh Pro font asset as a dict, laid out like a UABEA JSON export.
+    newer_format adds the fields of newer TMP versions (m_FaceInfo.m_UnitsPerEM and
+    m_ClassDefinitionType on every glyph), which the patch adds to older targets.
+    The same arguments always give the same asset.
+    """
+    rng = random.Random(f"{family_name}/{style_name}/{seed}")
+    atlas_size = 4096
+
+    glyphs = []
+    characters = []
+    for index in range(glyph_count):
+        width, height = rng.randint(10, 90), rng.randint(10, 110)
+        glyph = {
+            "m_Index": index,
+            "m_Metrics": {
+                "m_Width": float(width),
+                "m_Height": float(height),
+                "m_HorizontalBearingX": float(rng.randint(-5, 10)),
+                "m_HorizontalBearingY": float(rng.randint(0, 90)),
+                "m_HorizontalAdvance": float(width + rng.randint(2, 12)),
+            },
+            "m_GlyphRect": {
+                "m_X": rng.randrange(atlas_size),
+                "m_Y": rng.randrange(atlas_size),
+                "m_Width": width + 2,
+                "m_Height": height + 2,
+            },
+            "m_Scale": 1.0,
+            "m_AtlasIndex": 0,
+        }
+        if newer_format:
+            glyph["m_ClassDefinitionType"] = 0
+        glyphs.append(glyph)
+        characters.append({"m_ElementType": 1, "m_Unicode": 0x20 + index, "m_GlyphIndex": index, "m_Scale": 1.0})
+
+    kerning_records = []
+    for _ in range(kerning_pair_count):
+        kerning_records.append({
+            "m_FirstAdjustmentRecord": {
+                "m_GlyphIndex": rng.randrange(max(glyph_count, 1)),
+                "m_GlyphValueRecord": _glyph_value_record(rng),
+            },
+            "m_SecondAdjustmentRecord": {
+                "m_GlyphIndex": rng.randrange(max(glyph_count, 1)),
+                "m_GlyphValueRecord": {"m_XPlacement": 0.0, "m_YPlacement": 0.0, "m_XAdvance": 0.0, "m_YAdvance": 0.0},
+            },
+            "m_FeatureLookupFlags": 0,
+        })
+
+    face_info = {
+        "m_FaceIndex": 0,
+        "m_FamilyName": family_name,
+        "m_StyleName": style_name,
+        "m_PointSize": 90,
+        "m_Scale": 1.0,
+        "m_LineHeight": 122.0,
+        "m_AscentLine": 96.0,
+        "m_CapLine": 66.0,
+        "m_MeanLine": 48.0,
+        "m_Baseline": 0.0,
+        "m_DescentLine": -26.0,
+        "m_SuperscriptOffset": 96.0,
+        "m_SuperscriptSize": 0.5,
+        "m_SubscriptOffset": -13.0,
+        "m_SubscriptSize": 0.5,
+        "m_UnderlineOffset": -9.0,
+        "m_UnderlineThickness": 4.5,
+        "m_StrikethroughOffset": 19.2,
+        "m_StrikethroughThickness": 4.5,
+        "m_TabWidth": 20.0,
+    }
+    if newer_format:
+        face_info = dict(face_info, m_UnitsPerEM=1000)
+
+    source_font_guid = _guid(rng)
+    return {
+        "m_GameObject": {"m_FileID": 0, "m_PathID": 0},
+        "m_Enabled": 1,
+        "m_Script": _file_reference(rng),
+        "m_Name": f"{family_name}-{style_name} SDF",
+        "hashCode": rng.randrange(-2 ** 31, 2 ** 31),
+        "material": _file_reference(rng),
+        "materialHashCode": rng.randrange(-2 ** 31, 2 ** 31),
+        "m_Version": "1.1.0",
+        "m_SourceFontFileGUID": source_font_guid,
+        "m_SourceFontFile": {"m_FileID": 0, "m_PathID": 0},
+        "m_AtlasPopulationMode": 0,
+        "m_FaceInfo": face_info,
+        "m_GlyphTable": {"Array": glyphs},
+        "m_CharacterTable": {"Array": characters},
+        "m_AtlasTextures": {"Array": [_file_reference(rng)]},
+        "m_AtlasTextureIndex": 0,
+        "m_IsMultiAtlasTexturesEnabled": 0,
+        "m_ClearDynamicDataOnBuild": 0,
+        "m_UsedGlyphRects": {"Array": [g["m_GlyphRect"] for g in glyphs]},
+        "m_FreeGlyphRects": {"Array": [{"m_X": 0, "m_Y": 0, "m_Width": atlas_size - 1, "m_Height": atlas_size - 1}]},
+        "m_FontFeatureTable": {"m_GlyphPairAdjustmentRecords": {"Array": kerning_records}},
+        "fallbackFontAssets": {"Array": []},
+        "m_FallbackFontAssetTable": {"Array": [_file_reference(rng) for _ in range(fallback_count)]},
+        "m_CreationSettings": {
+            "sourceFontFileName": "",
+            "sourceFontFileGUID": source_font_guid,
+            "pointSizeSamplingMode": 0,
+            "pointSize": 90,
+            "padding": 9,
+            "packingMode": 4,
+            "atlasWidth": atlas_size,
+            "atlasHeight": atlas_size,
+            "characterSetSelectionMode": 7,
+            "characterSequence": "",
+            "referencedFontAssetGUID": "",
+            "referencedTextAssetGUID": "",
+            "fontStyle": 0,
+            "fontStyleModifier": 2.0,
+            "renderMode": 4165,
+            "includeFontFeatures": 1,
+        },
+        "m_FontWeightTable": {"Array": [
+            {"regularTypeface": {"m_FileID": 0, "m_PathID": 0}, "italicTypeface": {"m_FileID": 0, "m_PathID": 0}}
+            for _ in range(10)
+        ]},
+        "normalStyle": 0,
+        "normalSpacingOffset": 0.0,
+        "boldStyle": 0.75,
+        "boldSpacing": 7.0,
+        "italicStyle": 35,
+        "tabSize": 10,
+    }
+
+
+def write_asset(path, asset, indent=2):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(asset, f, indent=indent, ensure_ascii=False)
+
+
+# The styles used for the generated file sets, in order.
+_STYLES = ["Regular", "Bold", "Italic", "BoldItalic", "Light", "Medium", "SemiBold", "Black", "Thin", "ExtraBold"]
+
+
+def write_asset_set(folder, family_name, file_count, newer_format, glyph_count, kerning_pair_count, seed=0):
+    """Writes file_count assets of one font family into folder. Returns the file names in order."""
+    names = []
+    for i in range(file_count):
+        style = _STYLES[i % len(_STYLES)] + ("" if i < len(_STYLES) else str(i // len(_STYLES)))
+        name = f"{family_name}-{style} SDF-resources.assets.json"
+        asset = generate_sdf_asset(family_name, style, glyph_count, kerning_pair_count,
+                                   newer_format=newer_format, seed=seed)
+        write_asset(os.path.join(folder, name), asset)
+        names.append(name)
+    return names
+
+
+# --- Measurements ---
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where it can't be measured."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class PhaseTimer:
+    """Adds up wall-clock time per phase name."""
+    def __init__(self):
+        self.totals = {}
+
+    def run(self, phase, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.totals[phase] = self.totals.get(phase, 0.0) + time.perf_counter() - start
+
+
+def _load_target(path, splice):
+    if splice:
+        layout = sdf_patch.JsonLayout(path)
+        return layout.load(), layout
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f), None
+
+
+def _json_format(path, output_format):
+    head = sdf_patch.read_format_head(path) if output_format == sdf_patch.OUTPUT_PRESERVE else None
+    return sdf_patch.output_format_for(output_format, head)
+
+
+def _remove_output(path):
+    # An output that already holds the same bytes is not written again, which is not what the dump phase should time.
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _time_single(source_path, target_path, output_path, splice, output_format=sdf_patch.OUTPUT_PRETTY):
+    timer = PhaseTimer()
+    log = sdf_patch.BufferedLog()
+    json_format = _json_format(target_path, output_format)
+    source_data = timer.run("load", sdf_patch.load_source_data, source_path)
+    target_data, layout = timer.run("load", _load_target, target_path, splice)
+    try:
+        changes = [] if splice else None
+        timer.run("patch", sdf_patch.update_json_recursively, target_data, source_data, log, changes=changes)
+        _remove_output(output_path)
+        timer.run("dump", sdf_patch.write_patched_file, output_path, target_data, log, layout, changes,
+                  output_format=json_format)
+    finally:
+        if layout is not None:
+            layout.close()
+    return timer.totals
+
+
+def _time_batch_template(source_paths, template_path, output_folder, splice, output_format=sdf_patch.OUTPUT_PRETTY):
+    timer = PhaseTimer()
+    log = sdf_patch.BufferedLog()
+    json_format = _json_format(template_path, output_format)
+    template_data, layout = timer.run("load", _load_target, template_path, splice)
+    try:
+        for source_path in source_paths:
+            output_path = os.path.join(output_folder, os.path.basename(source_path))
+            source_data = timer.run("load", sdf_patch.load_source_data, source_path)
+            changes = [] if splice else None
+            patched = timer.run("patch", sdf_patch.patch_copy_on_write, template_data, source_data, log, changes=changes)
+            _remove_output(output_path)
+            timer.run("dump", sdf_patch.write_patched_file, output_path, patched, log, layout, changes, template_data,
+                      json_format)
+    finally:
+        if layout is not None:
+            layout.close()
+    return timer.totals
+
+
+def _time_batch_map(pairs, output_folder, splice, output_format=sdf_patch.OUTPUT_PRETTY):
+    totals = {}
+    for source_path, target_path in pairs:
+        output_path = os.path.join(output_folder, os.path.basename(source_path))
+        for phase, seconds in _time_single(source_path, target_path, output_path, splice, output_format).items():
+            totals[phase] = totals.get(phase, 0.0) + seconds
+    return totals
+
+
+def _measure_phases(mode, args, repeat):
+    """
+    Runs one mode repeat times (in a fresh process, so the memory peak belongs to this mode)
+    and returns the fastest time of each phase and the peak memory.
+    """
+    func = {"single": _time_single, "batch_template": _time_batch_template, "batch_map": _time_batch_map}[mode]
+    best = {}
+    for _ in range(repeat):
+        for phase, seconds in func(*args).items():
+            best[phase] = min(seconds, best.get(phase, seconds))
+    return {"phases": {phase: round(seconds, 4) for phase, seconds in best.items()},
+            "total": round(sum(best.values()), 4),
+            "peak_rss_mb": peak_rss_mb()}
+
+
+def _measure_end_to_end(func, args, kwargs, repeat):
+    """Fastest wall-clock time of a full run_batch_* call, with its process pool. args[2] is the output folder."""
+    best = None
+    for _ in range(repeat):
+        for name in os.listdir(args[2]):
+            _remove_output(os.path.join(args[2], name))
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 4)
+
+
+def run_benchmark_suite(glyph_count=DEFAULT_GLYPH_COUNT, kerning_pair_count=DEFAULT_KERNING_PAIR_COUNT,
+                        file_count=DEFAULT_FILE_COUNT, worker_count=sdf_patch.DEFAULT_WORKER_COUNT,
+                        repeat=DEFAULT_REPEAT, splice=False, work_folder=None, output_format=sdf_patch.OUTPUT_PRETTY):
+    """
+    Generates the assets, benchmarks the three modes and returns the report as a dict.
+    Sources use the newer asset format and targets the older one, so every rule type fires.
+    """
+    with tempfile.TemporaryDirectory(dir=work_folder) as folder:
+        source_folder = os.path.join(folder, "source")
+        target_folder = os.path.join(folder, "target")
+        output_folder = os.path.join(folder, "output")
+        for path in (source_folder, target_folder, output_folder):
+            os.mkdir(path)
+
+        generate_start = time.perf_counter()
+        source_names = write_asset_set(source_folder, "Alegreya", file_count, True, glyph_count, kerning_pair_count)
+        target_names = write_asset_set(target_folder, "NotoSansArabic", file_count, False, glyph_count, kerning_pair_count, seed=1)
+        generate_seconds = time.perf_counter() - generate_start
+
+        source_paths = [os.path.join(source_folder, name) for name in source_names]
+        target_paths = [os.path.join(target_folder, name) for name in target_names]
+        phase_jobs = {
+            "single": (source_paths[0], target_paths[0], os.path.join(output_folder, "single.json"), splice, output_format),
+            "batch_template": (source_paths, target_paths[0], output_folder, splice, output_format),
+            "batch_map": (list(zip(source_paths, target_paths)), output_folder, splice, output_format),
+        }
+
+        modes = {}
+        for mode, args in phase_jobs.items():
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                modes[mode] = pool.submit(_measure_phases, mode, args, repeat).result()
+
+        pool_options = dict(worker_count=worker_count, splice=splice, force=True, output_format=output_format)
+        modes["batch_template"]["end_to_end"] = _measure_end_to_end(
+            sdf_patch.run_batch_template, (source_folder, target_paths[0], output_folder), pool_options, repeat)
+        modes["batch_map"]["end_to_end"] = _measure_end_to_end(
+            sdf_patch.run_batch_map, (source_folder, target_folder, output_folder), pool_options, repeat)
+
+        file_size = os.path.getsize(target_paths[0])
+
+    return {
+        "version": REPORT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "glyphs": glyph_count,
+            "kerning_pairs": kerning_pair_count,
+            "files": file_count,
+            "workers": worker_count,
+            "repeat": repeat,
+            "splice": splice,
+            "format": output_format,
+            "rules": sdf_patch.DEFAULT_PATCH_PLAN.fingerprint,
+        },
+        "asset_size_mb": round(file_size / (1024 * 1024), 2),
+        "generate_seconds": round(generate_seconds, 2),
+        "modes": modes,
+    }
+
+
+def find_regressions(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compares the phase and end-to-end times of report with baseline. Returns a list of
+    (name, baseline seconds, new seconds) for every time that got slower than the tolerance.
+    """
+    regressions = []
+    for mode, timings in report["modes"].items():
+        old = baseline.get("modes", {}).get(mode)
+        if old is None:
+            continue
+        pairs = [(f"{mode}.{phase}", old.get("phases", {}).get(phase), seconds)
+                 for phase, seconds in timings["phases"].items()]
+        pairs.append((f"{mode}.end_to_end", old.get("end_to_end"), timings.get("end_to_end")))
+        for name, old_seconds, new_seconds in pairs:
+            if old_seconds is None or new_seconds is None or old_seconds < MIN_COMPARED_SECONDS:
+                continue
+            if new_seconds > old_seconds * (1 + tolerance):
+                regressions.append((name, old_seconds, new_seconds))
+    return regressions
+
+
+def format_report(report):
+    """A short human-readable table of a report."""
+    config = report["config"]
+    lines = [f"{config['files']} files, {config['glyphs']} glyphs, {config['kerning_pairs']} kerning pairs "
+             f"({report['asset_size_mb']} MB per asset), best of {config['repeat']}"]
+    lines.append(f"{'mode':<16}{'load':>9}{'patch':>9}{'dump':>9}{'total':>9}{'e2e':>9}{'peak MB':>10}")
+    for mode, timings in report["modes"].items():
+        phases = timings["phases"]
+        end_to_end = timings.get("end_to_end")
+        lines.append(f"{mode:<16}{phases.get('load', 0):>9.3f}{phases.get('patch', 0):>9.3f}{phases.get('dump', 0):>9.3f}"
+                     f"{timings['total']:>9.3f}{'' if end_to_end is None else format(end_to_end, '.3f'):>9}"
+                     f"{'' if timings['peak_rss_mb'] is None else timings['peak_rss_mb']:>10}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog="sdf_benchmark", description="Benchmark the SDF font patch pipeline on synthetic assets.")
+    parser.add_argument("--glyphs", type=int, default=DEFAULT_GLYPH_COUNT, help="glyphs (and characters) per asset")
+    parser.add_argument("--kerning-pairs", type=int, default=DEFAULT_KERNING_PAIR_COUNT, help="glyph pair adjustment records per asset")
+    parser.add_argument("--files", type=int, default=DEFAULT_FILE_COUNT, help="files per folder for the batch modes")
+    parser.add_argument("--workers", type=int, default=sdf_patch.DEFAULT_WORKER_COUNT, help="worker processes for the end-to-end runs")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="runs per measurement; the fastest is reported")
+    parser.add_argument("--splice", action="store_true", help="benchmark the byte-splice output mode")
+    parser.add_argument("--format", dest="output_format", choices=sdf_patch.OUTPUT_FORMATS, default=sdf_patch.OUTPUT_PRETTY,
+                        help="output format to benchmark")
+    parser.add_argument("--work-folder", help="where to generate the assets (default: the system temp folder)")
+    parser.add_argument("-o", "--output", help="write the JSON report to this file (default: stdout)")
+    parser.add_argument("--baseline", help="earlier JSON report to compare with; exits with 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown against the baseline (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark_suite(max(0, args.glyphs), max(0, args.kerning_pairs), max(1, args.files),
+                                 max(1, args.workers), max(1, args.repeat), args.splice, args.work_folder, args.output_format)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    print(format_report(report), file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print("Warning: the baseline was made with different settings.", file=sys.stderr)
+        regressions = find_regressions(report, baseline, args.tolerance)
+        for name, old_seconds, new_seconds in regressions:
+            print(f"REGRESSION {name}: {old_seconds:.3f} s -> {new_seconds:.3f} s", file=sys.stderr)
+        if regressions:
+            return EXIT_REGRESSION
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
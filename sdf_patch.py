@@ -0,0 +1,4057 @@
+"""
+Core of the SDF Font JSON Editor: the patch rules, the patch functions and the batch modes,
+usable without a display. The GUI (SDF-Font-JSON-Editor.py) is built on top of this module,
+and running it as a script gives a command line interface (see main()).
+"""
+import json
+import hashlib
+import re
+import mmap
+import pickle
+import os
+import sys
+import time
+import tempfile
+import io
+import threading
+import contextlib
+import collections
+
+# --- Core Definitions and Functions (Logic Modified) ---
+
+# Index used when writing to a log widget (same value as tk.END).
+END = "end"
+
+# Keys whose values will be directly replaced if found in both source and target.
+KEYS_TO_REPLACE_VALUES = [
+    "m_FileID",
+    "m_PathID",
+    "m_Name",
+    "m_SourceFontFileGUID",
+    "m_FamilyName",
+    "m_StyleName",
+    "sourceFontFileGUID"
+]
+
+# Keys containing an "Array" that should have its entire content replaced.
+# This handles nested structures.
+KEYS_WITH_ARRAY_TO_REPLACE = {
+    "m_FallbackFontAssetTable": "Array",
+    "m_FontFeatureTable": {
+        "m_GlyphPairAdjustmentRecords": "Array"
+    }
+}
+
+# How the records of an array are told apart when arrays are merged instead of replaced
+# (the "merge" option): array name -> the fields of a record that form its key, each given
+# as a path of dict keys. An array rule for an array not listed here, or whose records lack
+# these fields, still replaces the whole array. To merge the character or glyph table of the
+# source into the target, use the "glyph-tables" rule profile (see load_rule_profile) and turn
+# the option on.
+ARRAY_RECORD_KEYS = {
+    "m_GlyphPairAdjustmentRecords": (("m_FirstAdjustmentRecord", "m_GlyphIndex"),
+                                     ("m_SecondAdjustmentRecord", "m_GlyphIndex")),
+    "m_CharacterTable": (("m_Unicode",),),
+    "m_GlyphTable": (("m_Index",),),
+}
+
+# <<<--- NEW ADDITION ---<<<
+# Keys to add to the target if they exist in the source but are missing in the target.
+# This is useful for newer versions of the format that add fields.
+# To solve your specific case, add "m_ClassDefinitionType" to this list.
+KEYS_TO_ADD_IF_MISSING = [
+    "m_UnitsPerEM",
+    "m_ClassDefinitionType" # Added based on your request
+]
+
+
+# Name of the rule profile made of the constants above (see load_rule_profile).
+DEFAULT_RULE_PROFILE = "default"
+
+
+# --- Compiled Patch Plan ---
+
+# Lists shorter than this are always walked item by item.
+PRUNE_MIN_LIST_LENGTH = 64
+# Long lists are checked in slices of this many items, so a few matching
+# items do not force a walk of the whole list.
+PRUNE_SLICE_LENGTH = 1024
+
+
+def _compile_array_path(path_to_array):
+    """Turns a KEYS_WITH_ARRAY_TO_REPLACE value into a tuple of keys, e.g. ('m_GlyphPairAdjustmentRecords', 'Array')."""
+    path = []
+    while isinstance(path_to_array, dict):
+        nested_key = list(path_to_array.keys())[0]
+        path.append(nested_key)
+        path_to_array = path_to_array[nested_key]
+    if not isinstance(path_to_array, str):
+        return None
+    path.append(path_to_array)
+    return tuple(path)
+
+
+def _compile_key_probe(keys):
+    """
+    Returns the byte strings to look for in a pickled subtree. Pickle writes every
+    distinct string at least once as raw UTF-8 and, unlike JSON, writes numbers in
+    binary, so pickling a slice is much cheaper than walking or JSON-encoding it.
+    A match may be a false positive (e.g. a value that contains the key name),
+    which only means the slice is walked as usual.
+    """
+    return tuple(sorted(key.encode('utf-8') for key in keys))
+
+
+class PatchPlan:
+    """
+    The rule constants compiled once into the lookups used by update_json_recursively.
+    Besides set/dict lookups for the rules, it holds two key probes that tell whether
+    a slice of a long list (glyph table, character table, ...) can be affected at all:
+    a target slice matters only if it contains a key to replace, and a source slice
+    only if it contains a key to add. Slices where neither is found are skipped.
+    With merge_records, the arrays of KEYS_WITH_ARRAY_TO_REPLACE whose records have a key in
+    array_record_keys (ARRAY_RECORD_KEYS if omitted) are merged record by record instead of
+    replaced (see merge_keyed_records); record_keys maps each array rule key to its record key
+    paths, or None. name and description tell which rule profile the plan was made from.
+    """
+    def __init__(self, keys_to_replace_values, keys_with_array_to_replace, keys_to_add_if_missing, merge_records=False,
+                 array_record_keys=None, name=DEFAULT_RULE_PROFILE, description=""):
+        if array_record_keys is None:
+            array_record_keys = ARRAY_RECORD_KEYS
+        self._rules = (keys_to_replace_values, keys_with_array_to_replace, keys_to_add_if_missing)
+        self._merging = None
+        self.merge_records = merge_records
+        self.array_record_keys = array_record_keys
+        self.name = name
+        self.description = description
+        self.replace_keys = frozenset(keys_to_replace_values)
+        self.array_paths = {key: _compile_array_path(value) for key, value in keys_with_array_to_replace.items()}
+        self.record_keys = {}
+        if merge_records:
+            for key, array_path in self.array_paths.items():
+                names = [name for name in (key,) + (array_path or ()) if name != "Array"]
+                self.record_keys[key] = array_record_keys.get(names[-1]) if array_path else None
+        self.add_keys = frozenset(keys_to_add_if_missing)
+        self._target_probe = _compile_key_probe(self.replace_keys | set(self.array_paths))
+        self._source_probe = _compile_key_probe(self.add_keys)
+        # Every key the patch can read from a source file, and how each one looks as a JSON key
+        # written without escapes (as this tool and Unity write it; see may_contain_source_key).
+        self.source_keys = self.replace_keys | set(self.array_paths) | self.add_keys
+        self.source_key_probe = tuple(sorted(json.dumps(key, ensure_ascii=False).encode('utf-8')
+                                             for key in self.source_keys))
+        self._slash_escapes = any('/' in key for key in self.source_keys)
+        # Identifies the rule set, e.g. in the manifest of incremental runs (see BuildManifest).
+        rules = [sorted(keys_to_replace_values), keys_with_array_to_replace, sorted(keys_to_add_if_missing)]
+        if merge_records:
+            rules.append({key: paths for key, paths in self.record_keys.items() if paths is not None})
+        self.fingerprint = hashlib.sha256(json.dumps(rules, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def may_contain_source_key(self, buf, start=0, end=None):
+        """
+        Tells whether the JSON bytes buf[start:end] can contain one of source_keys. Besides the
+        plain spelling of each key, a key can be written with escapes ("m_N\\u0061me" is "m_Name"),
+        which no byte probe can rule out, so bytes with such an escape are always a maybe.
+        """
+        if end is None:
+            end = len(buf)
+        if any(buf.find(key, start, end) != -1 for key in self.source_key_probe):
+            return True
+        return buf.find(b'\\u', start, end) != -1 or (self._slash_escapes and buf.find(b'\\/', start, end) != -1)
+
+    def with_merge(self, merge=True):
+        """This plan with merge_records turned on (or off, with merge=False)."""
+        if merge == self.merge_records:
+            return self
+        if self._merging is None:
+            self._merging = PatchPlan(*self._rules, merge_records=merge, array_record_keys=self.array_record_keys,
+                                      name=self.name, description=self.description)
+        return self._merging
+
+    def _contains_rule_keys(self, probe, nodes):
+        if not probe:
+            return False
+        try:
+            data = pickle.dumps(nodes, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return True # Not plain data, so don't risk skipping it
+        return any(key in data for key in probe)
+
+    def list_ranges(self, target_list, source_list, count, stats=None):
+        """Yields the (start, end) index ranges of the first count items that can possibly be affected."""
+        if count < PRUNE_MIN_LIST_LENGTH:
+            yield 0, count
+            return
+        for start in range(0, count, PRUNE_SLICE_LENGTH):
+            end = min(start + PRUNE_SLICE_LENGTH, count)
+            if self._contains_rule_keys(self._target_probe, target_list[start:end]) or \
+               self._contains_rule_keys(self._source_probe, source_list[start:end]):
+                yield start, end
+            elif stats is not None:
+                stats.items_skipped += end - start
+
+
+class PatchStats:
+    """Counters filled in by update_json_recursively: nodes visited and rule hits."""
+    def __init__(self):
+        self.nodes_visited = 0
+        self.items_skipped = 0
+        self.values_replaced = 0
+        self.values_matched = 0
+        self.arrays_replaced = 0
+        self.arrays_matched = 0
+        self.arrays_merged = 0
+        self.records_added = 0
+        self.records_updated = 0
+        self.records_kept = 0
+        self.keys_added = 0
+
+    def summary(self):
+        return f"Visited {self.nodes_visited} nodes, skipped {self.items_skipped} list items that no rule can match.\n"
+
+
+DEFAULT_PATCH_PLAN = PatchPlan(KEYS_TO_REPLACE_VALUES, KEYS_WITH_ARRAY_TO_REPLACE, KEYS_TO_ADD_IF_MISSING)
+
+
+# --- Rule Profiles ---
+# Other rule sets (e.g. for other TextMesh Pro versions) are kept as JSON files in
+# RULE_PROFILE_FOLDER, so adding one needs no code change. A profile file looks like
+#   {"description": "What the profile is for",
+#    "replace_values": ["m_Name", ...],                          (as KEYS_TO_REPLACE_VALUES)
+#    "replace_arrays": {"m_FallbackFontAssetTable": "Array", ...}, (as KEYS_WITH_ARRAY_TO_REPLACE)
+#    "add_if_missing": ["m_UnitsPerEM", ...],                     (as KEYS_TO_ADD_IF_MISSING)
+#    "record_keys": {"m_GlyphTable": [["m_Index"]], ...}}         (as ARRAY_RECORD_KEYS)
+# Every entry is optional; a missing record_keys uses ARRAY_RECORD_KEYS.
+# The built-in profile DEFAULT_RULE_PROFILE is the constants at the top of this module.
+
+RULE_PROFILE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rule_profiles")
+RULE_PROFILE_EXTENSION = ".json"
+
+# Compiled profiles by the SHA-256 of their file, so a profile is only validated and
+# compiled again when its content changes.
+_compiled_profiles = {}
+
+
+class RuleProfileError(ValueError):
+    """Raised by load_rule_profile for a missing, unreadable or invalid rule profile."""
+
+
+def list_rule_profiles(folder=RULE_PROFILE_FOLDER):
+    """Names of the available rule profiles: DEFAULT_RULE_PROFILE, then the files in folder."""
+    try:
+        names = sorted(os.path.splitext(f)[0] for f in os.listdir(folder)
+                       if f.lower().endswith(RULE_PROFILE_EXTENSION))
+    except OSError:
+        names = []
+    return [DEFAULT_RULE_PROFILE] + [name for name in names if name != DEFAULT_RULE_PROFILE]
+
+
+def rule_profile_path(profile, folder=RULE_PROFILE_FOLDER):
+    """The file of a rule profile given by name (a file in folder) or by path."""
+    if os.path.dirname(profile) or profile.lower().endswith(RULE_PROFILE_EXTENSION):
+        return profile
+    return os.path.join(folder, profile + RULE_PROFILE_EXTENSION)
+
+
+def load_rule_profile(profile=None, folder=RULE_PROFILE_FOLDER):
+    """
+    Returns the PatchPlan of a rule profile: a name from list_rule_profiles, the path of a
+    profile file, or None for the default. A PatchPlan is returned as it is.
+    Raises RuleProfileError if the profile can't be read or is not valid.
+    """
+    if profile is None or profile == DEFAULT_RULE_PROFILE:
+        return DEFAULT_PATCH_PLAN
+    if isinstance(profile, PatchPlan):
+        return profile
+    path = rule_profile_path(profile, folder)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        raise RuleProfileError(f"Could not read the rule profile '{profile}': {e}") from e
+    key = hashlib.sha256(data).hexdigest()
+    plan = _compiled_profiles.get(key)
+    if plan is None:
+        plan = _compile_rule_profile(data, os.path.splitext(os.path.basename(path))[0])
+        _compiled_profiles[key] = plan
+    return plan
+
+
+def _compile_rule_profile(data, name):
+    try:
+        profile = json.loads(data)
+    except ValueError as e:
+        raise RuleProfileError(f"Rule profile '{name}' is not valid JSON: {e}") from e
+    if not isinstance(profile, dict):
+        raise RuleProfileError(f"Rule profile '{name}' must be a JSON object.")
+    unknown = set(profile) - {"description", "replace_values", "replace_arrays", "add_if_missing", "record_keys"}
+    if unknown:
+        raise RuleProfileError(f"Rule profile '{name}' has unknown entries: {', '.join(sorted(unknown))}")
+
+    def fail(entry, message):
+        raise RuleProfileError(f"Rule profile '{name}', {entry}: {message}")
+
+    def key_list(entry):
+        keys = profile.get(entry, [])
+        if not isinstance(keys, list) or not all(isinstance(key, str) and key for key in keys):
+            fail(entry, "must be a list of key names")
+        return keys
+
+    description = profile.get("description", "")
+    if not isinstance(description, str):
+        fail("description", "must be a string")
+    replace_values = key_list("replace_values")
+    add_if_missing = key_list("add_if_missing")
+
+    replace_arrays = profile.get("replace_arrays", {})
+    if not isinstance(replace_arrays, dict):
+        fail("replace_arrays", "must be an object of key -> array path")
+    for key, path_to_array in replace_arrays.items():
+        node = path_to_array
+        while isinstance(node, dict) and len(node) == 1:
+            node = next(iter(node.values()))
+        if not (isinstance(node, str) and node):
+            fail(f"replace_arrays.{key}", 'must be the name of the array ("Array"), '
+                                          'or an object with one key leading to it')
+        if key in replace_values:
+            fail(f"replace_arrays.{key}", "is also in replace_values")
+
+    record_keys = profile.get("record_keys")
+    if record_keys is not None:
+        if not isinstance(record_keys, dict):
+            fail("record_keys", "must be an object of array name -> key paths")
+        for array_name, key_paths in record_keys.items():
+            if not (isinstance(key_paths, list) and key_paths and
+                    all(isinstance(key_path, list) and key_path and
+                        all(isinstance(part, str) and part for part in key_path) for key_path in key_paths)):
+                fail(f"record_keys.{array_name}", "must be a list of key paths, each a list of key names")
+        record_keys = {array_name: tuple(tuple(key_path) for key_path in key_paths)
+                       for array_name, key_paths in record_keys.items()}
+
+    if not (replace_values or replace_arrays or add_if_missing):
+        raise RuleProfileError(f"Rule profile '{name}' has no rules.")
+    return PatchPlan(replace_values, replace_arrays, add_if_missing, array_record_keys=record_keys,
+                     name=name, description=description)
+
+
+# --- Array Fingerprints ---
+
+# Arrays shorter than this are compared directly.
+FINGERPRINT_MIN_LENGTH = 64
+# Number of items sampled across an array for its fingerprint.
+FINGERPRINT_SAMPLES = 16
+# Number of arrays (and compared pairs) remembered. Entries keep their arrays alive
+# until the patch ends, so this stays small: the arrays of one file are enough.
+FINGERPRINT_CACHE_SIZE = 4
+
+
+class FingerprintCache:
+    """
+    Decides whether two large replaced arrays (kerning records, fallback tables) are equal
+    without a deep comparison in the common cases. A fingerprint is the array's length plus
+    a few items sampled across it; if two fingerprints differ the arrays differ, and only if
+    they match is the full comparison run. Fingerprints and the verdict for a compared pair
+    are cached per object, but only for one patch: update_json_recursively and
+    patch_copy_on_write clear the cache when they return, as the entries would otherwise
+    keep the arrays of finished files alive in a worker. Sampling the template's arrays
+    again for every file costs a few list lookups. Hashing the whole array is not used on
+    purpose: encoding a parsed array to hash it costs several times more than comparing it,
+    and even hashing the JSON text it was decoded from costs about as much as the
+    comparison it would save.
+    Cached arrays must not be modified in place (the patch never does).
+    """
+    def __init__(self, size=FINGERPRINT_CACHE_SIZE):
+        self.size = size
+        self._fingerprints = collections.OrderedDict() # id -> (array, fingerprint)
+        self._verdicts = collections.OrderedDict() # (id, id) -> (array, array, equal)
+
+    def _remember(self, cache, key, entry):
+        cache[key] = entry
+        if len(cache) > self.size:
+            cache.popitem(last=False)
+
+    def fingerprint(self, array):
+        entry = self._fingerprints.get(id(array))
+        if entry is not None and entry[0] is array:
+            self._fingerprints.move_to_end(id(array))
+            return entry[1]
+        count = len(array)
+        step = max(1, count // FINGERPRINT_SAMPLES)
+        fingerprint = (count, [array[i] for i in range(0, count, step)], array[-1] if count else None)
+        self._remember(self._fingerprints, id(array), (array, fingerprint))
+        return fingerprint
+
+    def equal(self, a, b):
+        if a is b:
+            return True
+        if not (isinstance(a, list) and isinstance(b, list)) or len(a) < FINGERPRINT_MIN_LENGTH:
+            return a == b
+        if len(a) != len(b):
+            return False
+
+        key = (id(a), id(b))
+        entry = self._verdicts.get(key)
+        if entry is not None and entry[0] is a and entry[1] is b:
+            return entry[2]
+        equal = self.fingerprint(a) == self.fingerprint(b) and a == b
+        self._remember(self._verdicts, key, (a, b, equal))
+        return equal
+
+    def clear(self):
+        self._fingerprints.clear()
+        self._verdicts.clear()
+
+
+# Used by update_json_recursively and patch_copy_on_write for the KEYS_WITH_ARRAY_TO_REPLACE rules.
+ARRAY_FINGERPRINTS = FingerprintCache()
+
+
+def update_json_recursively(target_node, source_node, log_area, plan=None, stats=None, changes=None):
+    """
+    Recursively updates the target_node based on the source_node.
+    It follows the rules defined in the global KEY constants and adds missing keys.
+    plan is the compiled form of the rules (DEFAULT_PATCH_PLAN if omitted);
+    stats, if given, is a PatchStats that counts the visited nodes;
+    changes, if given, is a list that receives one entry per change (see _PatchContext).
+    """
+    context = _PatchContext(log_area, plan, stats, False, changes)
+    try:
+        _update_node(target_node, source_node, context, () if changes is not None else None)
+    finally:
+        ARRAY_FINGERPRINTS.clear()
+
+
+def patch_copy_on_write(template_node, source_node, log_area, plan=None, stats=None, changes=None):
+    """
+    Same as update_json_recursively, but leaves template_node untouched and returns the patched result.
+    Only the dicts and lists on the path to a changed key are copied; every other subtree
+    (glyph table, character table, ...) is shared with the template. This replaces a full
+    copy.deepcopy of the template per file, and the result can be passed to json.dump as is.
+    """
+    context = _PatchContext(log_area, plan, stats, True, changes)
+    try:
+        return _update_node(template_node, source_node, context, () if changes is not None else None)
+    finally:
+        ARRAY_FINGERPRINTS.clear()
+
+
+class _PatchContext:
+    """
+    Settings shared by one run of _update_node.
+    If shared is False the target is patched in place. If it is True the target
+    belongs to a template: a node is copied before its first change, and the copy
+    is returned so the caller can link it into its own copy.
+    If changes is a list, every change is appended to it as either
+    ("set", path, value) - the value at path was replaced - or
+    ("add", path, key, value) - key was added to the dict at path,
+    where path is a tuple of dict keys and list indexes from the root.
+    """
+    def __init__(self, log_area, plan, stats, shared, changes):
+        self.log_area = log_area
+        self.plan = plan or DEFAULT_PATCH_PLAN
+        self.stats = stats
+        self.shared = shared
+        self.changes = changes
+
+
+def _update_node(target_node, source_node, context, path):
+    """
+    The recursive worker behind update_json_recursively and patch_copy_on_write.
+    path is the position of target_node (only tracked when changes are recorded).
+    Returns the node that should be stored in place of target_node.
+    """
+    log_area = context.log_area
+    plan = context.plan
+    changes = context.changes
+    if context.stats is not None:
+        context.stats.nodes_visited += 1
+
+    if not isinstance(target_node, type(source_node)):
+        return target_node
+
+    node = target_node
+    owned = not context.shared
+
+    if isinstance(target_node, dict):
+        # --- 1. Update existing keys ---
+        for key in list(target_node.keys()): # Use list to avoid issues with dict size changing
+            if key in source_node:
+                source_value = source_node[key]
+                target_value = target_node[key]
+                new_value = target_value
+
+                if key in plan.replace_keys:
+                    if target_value != source_value:
+                        log_area.insert(END, f"Updating '{key}': from '{target_value}' to '{source_value}'\n")
+                        new_value = source_value
+                        if changes is not None:
+                            changes.append(("set", path + (key,), source_value))
+                        if context.stats is not None:
+                            context.stats.values_replaced += 1
+                    else:
+                        log_area.insert(END, f"Key '{key}': Value already matches ('{source_value}'). No change.\n")
+                        if context.stats is not None:
+                            context.stats.values_matched += 1
+
+                elif key in plan.array_paths:
+                    array_path = plan.array_paths[key]
+                    if array_path is not None:
+                        new_value = _replace_nested_array(key, target_value, source_value, array_path, context,
+                                                          path + (key,) if changes is not None else None)
+
+                elif isinstance(target_value, (dict, list)):
+                    # Continue recursion for other nested structures.
+                    new_value = _update_node(target_value, source_value, context,
+                                             path + (key,) if changes is not None else None)
+
+                if new_value is not target_value:
+                    if not owned:
+                        node = dict(node)
+                        owned = True
+                    node[key] = new_value
+
+        # --- 2. Add missing keys from source (as defined in KEYS_TO_ADD_IF_MISSING) ---
+        if plan.add_keys:
+            for key, source_value in source_node.items():
+                if key in plan.add_keys and key not in node:
+                    log_area.insert(END, f"Adding missing key '{key}' with value '{source_value}'\n")
+                    if not owned:
+                        node = dict(node)
+                        owned = True
+                    node[key] = source_value # Add the key-value pair to the target dictionary
+                    if changes is not None:
+                        changes.append(("add", path, key, source_value))
+                    if context.stats is not None:
+                        context.stats.keys_added += 1
+
+    elif isinstance(target_node, list):
+        # Recursively process items in a list, matched by index.
+        # Slices that no rule can touch are skipped by the plan.
+        for start, end in plan.list_ranges(target_node, source_node, min(len(target_node), len(source_node)), context.stats):
+            for i in range(start, end):
+                target_item = target_node[i]
+                if isinstance(target_item, (dict, list)) and isinstance(source_node[i], (dict, list)):
+                    new_item = _update_node(target_item, source_node[i], context,
+                                            path + (i,) if changes is not None else None)
+                    if new_item is not target_item:
+                        if not owned:
+                            node = list(node)
+                            owned = True
+                        node[i] = new_item
+
+    return node
+
+
+def _replace_nested_array(key, target_value, source_value, array_path, context, value_path):
+    """
+    Replaces target_value[path...] with source_value[path...] for a KEYS_WITH_ARRAY_TO_REPLACE rule,
+    provided both sides have dicts all the way down the path. Returns the (possibly copied) target_value.
+    """
+    log_area = context.log_area
+    target_levels = [target_value]
+    current_source_level = source_value
+    for path_key in array_path[:-1]:
+        current_target_level = target_levels[-1]
+        if not (isinstance(current_target_level, dict) and isinstance(current_target_level.get(path_key), dict) and
+                isinstance(current_source_level, dict) and isinstance(current_source_level.get(path_key), dict)):
+            log_area.insert(END, f"Skipping '{key}': Structure for Array replacement not found or mismatched.\n")
+            return target_value
+        target_levels.append(current_target_level[path_key])
+        current_source_level = current_source_level[path_key]
+
+    current_target_level = target_levels[-1]
+    array_key = array_path[-1]
+    full_path = ".".join((key,) + array_path)
+    if isinstance(current_target_level, dict) and array_key in current_target_level and \
+       isinstance(current_source_level, dict) and array_key in current_source_level:
+        target_array = current_target_level[array_key]
+        source_array = current_source_level[array_key]
+        record_key_paths = context.plan.record_keys.get(key)
+        if record_key_paths is not None and isinstance(target_array, list) and isinstance(source_array, list):
+            merge = merge_keyed_records(target_array, source_array, record_key_paths)
+            if merge is not None:
+                return _merge_nested_array(target_levels, target_array, merge, array_path, full_path, context, value_path)
+            log_area.insert(END, f"Records in '{full_path}' have no unique key; replacing the whole array.\n")
+        if not ARRAY_FINGERPRINTS.equal(target_array, source_array):
+            log_area.insert(END, f"Updating nested Array in '{full_path}'\n")
+            if context.stats is not None:
+                context.stats.arrays_replaced += 1
+            if context.changes is not None:
+                context.changes.append(("set", value_path + array_path, source_array))
+            return _set_nested_array(target_levels, array_path, source_array, context)
+        log_area.insert(END, f"Nested Array in '{full_path}' already matches. No change.\n")
+        if context.stats is not None:
+            context.stats.arrays_matched += 1
+    else:
+        log_area.insert(END, f"Skipping '{key}': Structure for Array replacement not found or mismatched.\n")
+    return target_value
+
+
+def _set_nested_array(target_levels, array_path, new_array, context):
+    """Stores new_array at the end of the dicts in target_levels and returns the (possibly copied) top level."""
+    if context.shared:
+        # Copy the dicts down to the array and link the copies together.
+        target_levels = [dict(level) for level in target_levels]
+        for parent, path_key, child in zip(target_levels, array_path[:-1], target_levels[1:]):
+            parent[path_key] = child
+    target_levels[-1][array_path[-1]] = new_array
+    return target_levels[0]
+
+
+def _merge_nested_array(target_levels, target_array, merge, array_path, full_path, context, value_path):
+    """Applies the result of merge_keyed_records to the target array for _replace_nested_array."""
+    updated, added, kept = merge
+    stats = context.stats
+    if stats is not None:
+        stats.records_updated += len(updated)
+        stats.records_added += len(added)
+        stats.records_kept += kept
+    if not updated and not added:
+        context.log_area.insert(END, f"Records in '{full_path}' already match ({kept} kept). No change.\n")
+        if stats is not None:
+            stats.arrays_matched += 1
+        return target_levels[0]
+
+    context.log_area.insert(END, f"Merged records into '{full_path}': {len(added)} added, "
+                                 f"{len(updated)} updated, {kept} kept\n")
+    if stats is not None:
+        stats.arrays_merged += 1
+    # A new list, never the target's own: arrays may be cached by ARRAY_FINGERPRINTS or ENCODED_FRAGMENTS.
+    merged = list(target_array)
+    for index, record in updated.items():
+        merged[index] = record
+    merged.extend(added)
+    if context.changes is not None:
+        if added:
+            context.changes.append(("set", value_path + array_path, merged))
+        else:
+            # Only the updated records are re-encoded when splicing.
+            context.changes.extend(("set", value_path + array_path + (index,), record) for index, record in updated.items())
+    return _set_nested_array(target_levels, array_path, merged, context)
+
+
+def _record_key(record, key_paths):
+    key = []
+    for path in key_paths:
+        value = record
+        for path_key in path:
+            value = value[path_key]
+        key.append(value)
+    return tuple(key)
+
+
+def merge_keyed_records(target_records, source_records, key_paths):
+    """
+    Merges the records (dicts) of source_records into target_records by their key, the values
+    at key_paths (see ARRAY_RECORD_KEYS), through a dict of the source records: O(n + m)
+    instead of a deep compare and copy of the whole array. A target record whose key is in the
+    source is updated to the source record if they differ; source records with a new key are
+    added at the end, in source order; every other target record is kept as it is.
+    Returns (updated, added, kept): {index: new record}, a list of records, and the count of
+    records kept. Returns None if a record lacks a key field, has an unhashable key or shares
+    its key with another record of the same list, in which case the array can't be merged.
+    Neither list is modified.
+    """
+    try:
+        source_index = {_record_key(record, key_paths): record for record in source_records}
+        if len(source_index) != len(source_records):
+            return None
+        updated = {}
+        kept = 0
+        seen = set()
+        for index, record in enumerate(target_records):
+            key = _record_key(record, key_paths)
+            seen.add(key)
+            source_record = source_index.get(key)
+            if source_record is None or source_record == record:
+                kept += 1
+            else:
+                updated[index] = source_record
+    except (KeyError, TypeError, IndexError):
+        return None
+    if len(seen) != len(target_records):
+        return None
+    added = [record for key, record in source_index.items() if key not in seen]
+    return updated, added, kept
+
+
+# --- Byte-Level JSON Scanning and Splicing ---
+# These helpers walk raw JSON bytes (usually an mmap of the file) with regexes, so values can be
+# located and skipped without building Python objects. The byte-splice output mode uses them to
+# copy the target file through unchanged and re-encode only the values the patch changed.
+
+_JSON_WS = re.compile(rb'[ \t\n\r]*')
+_JSON_INDENT = re.compile(rb'[ \t]*')
+# Only what json.loads accepts: no control characters in strings, and only JSON's escapes.
+_JSON_STRING_PATTERN = rb'"[^"\\\x00-\x1f]*(?:\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4})[^"\\\x00-\x1f]*)*"'
+_JSON_STRING = re.compile(_JSON_STRING_PATTERN)
+_JSON_SCALAR = re.compile(rb'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?|true|false|null|NaN|-?Infinity')
+# What may sit between the strings and brackets of a container: scalars, separators and whitespace.
+_JSON_FILLER_PATTERN = rb'[-+.:,\w \t\n\r]*'
+_JSON_FILLER = re.compile(_JSON_FILLER_PATTERN)
+_UTF8_BOM = b'\xef\xbb\xbf'
+
+
+def _build_container_pattern(max_depth):
+    """
+    Builds a regex that matches a whole JSON object or array nested at most max_depth levels,
+    so the regex engine can skip a typical glyph or character table in a single call.
+    Brackets must pair up and strings must be valid; the scalars and separators between them
+    are only checked for their characters, which is left to json.loads where a value is decoded.
+    """
+    item = _JSON_STRING_PATTERN
+    for _ in range(max_depth):
+        members = _JSON_FILLER_PATTERN + rb'(?:(?:' + item + rb')' + _JSON_FILLER_PATTERN + rb')*'
+        container = rb'\[' + members + rb'\]|\{' + members + rb'\}'
+        item = _JSON_STRING_PATTERN + rb'|' + container
+    return re.compile(container)
+
+
+# Built on first use by _json_container: compiling it would take most of the start-up time.
+_JSON_CONTAINER = None
+
+
+def _json_container():
+    global _JSON_CONTAINER
+    if _JSON_CONTAINER is None:
+        # Deep enough for a kerning record under m_FontFeatureTable; each level doubles the regex.
+        _JSON_CONTAINER = _build_container_pattern(6)
+    return _JSON_CONTAINER
+
+
+class JsonScanError(ValueError):
+    """Raised when JSON bytes do not have the structure the scanner expects."""
+
+
+def skip_json_value(buf, pos):
+    """Returns the offset just past the JSON value that starts at pos, without decoding it."""
+    first = buf[pos:pos + 1]
+    if first == b'"':
+        match = _JSON_STRING.match(buf, pos)
+    elif first in (b'{', b'['):
+        match = _json_container().match(buf, pos)
+        if match is None:
+            return _skip_deep_container(buf, pos)
+    else:
+        match = _JSON_SCALAR.match(buf, pos)
+    if match is None:
+        raise JsonScanError(f"Invalid JSON value at byte {pos}")
+    return match.end()
+
+
+def _skip_deep_container(buf, pos):
+    """
+    Slow path of skip_json_value for containers nested deeper than _JSON_CONTAINER handles,
+    with the same checks. Also finds the byte where a malformed container goes wrong.
+    """
+    closers = []
+    while True:
+        pos = _JSON_FILLER.match(buf, pos).end()
+        first = buf[pos:pos + 1]
+        if first == b'"':
+            match = _JSON_STRING.match(buf, pos)
+            if match is None:
+                raise JsonScanError(f"Invalid JSON string at byte {pos}")
+            pos = match.end()
+        elif first in (b'{', b'['):
+            inner = _json_container().match(buf, pos) if closers else None
+            if inner is not None:
+                pos = inner.end()
+            else:
+                closers.append(b'}' if first == b'{' else b']')
+                pos += 1
+        elif closers and first == closers[-1]:
+            closers.pop()
+            pos += 1
+            if not closers:
+                return pos
+        elif not first:
+            raise JsonScanError(f"Unterminated JSON container at byte {pos}")
+        else:
+            raise JsonScanError(f"Unexpected {first!r} in a JSON container at byte {pos}")
+
+
+def skip_json_whitespace(buf, pos):
+    return _JSON_WS.match(buf, pos).end()
+
+
+def read_json_key(buf, pos):
+    """Reads the object key at pos. Returns (key, offset just past the key's closing quote)."""
+    match = _JSON_STRING.match(buf, pos)
+    if match is None:
+        raise JsonScanError(f"Expected an object key at byte {pos}")
+    raw = match.group()
+    key = json.loads(raw) if b'\\' in raw else raw[1:-1].decode('utf-8')
+    return key, match.end()
+
+
+def json_root_offset(buf):
+    """Returns the offset of the top-level value (after an optional UTF-8 BOM and whitespace)."""
+    return skip_json_whitespace(buf, 3 if buf[:3] == _UTF8_BOM else 0)
+
+
+class _StopScan(Exception):
+    """Raised inside the scanners once everything that was asked for has been found."""
+
+
+class _LayoutRequest:
+    """A node of the path trie passed to the layout scanner."""
+    __slots__ = ("children", "want_span", "want_members")
+
+    def __init__(self):
+        self.children = {}
+        self.want_span = False
+        self.want_members = False
+
+
+@contextlib.contextmanager
+def atomic_write(output_path, encoding=None):
+    """
+    Opens a temporary file next to output_path (binary, or text if an encoding is given)
+    and renames it over output_path once the block finishes. A crash or error part-way
+    never leaves a half-written output, and an existing output stays intact until then.
+    """
+    temp_path = f"{output_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        with open(temp_path, 'x' if encoding else 'xb', encoding=encoding) as f:
+            yield f
+        os.replace(temp_path, output_path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+
+# Bytes compared (or encoded and written) at once when an output is saved.
+WRITE_BLOCK_SIZE = 1024 * 1024
+
+
+@contextlib.contextmanager
+def write_if_changed(output_path):
+    """
+    Like atomic_write (binary), but leaves output_path alone if it already holds exactly the
+    bytes written. They are compared with the existing file block by block as they come in, and
+    a temporary file is only started at the first difference, with the equal part copied over.
+    An unchanged output thus costs one read of the old file and no write: its modification time
+    stays as it is, and the tools watching it see nothing. The yielded file's changed attribute
+    tells, once the block is done, whether the file was written.
+    """
+    f = _ComparingWriter(output_path)
+    try:
+        yield f
+        f.finish()
+    finally:
+        f.close()
+
+
+class _ComparingWriter:
+    """The file object of write_if_changed."""
+    def __init__(self, path):
+        self.path = path
+        self.changed = None
+        self._matched = 0 # Bytes known to equal the start of the existing file
+        self._temp = None
+        self._temp_path = None
+        try:
+            self._existing = open(path, 'rb')
+        except OSError:
+            self._existing = None
+            self._start_writing()
+
+    def write(self, data):
+        if self._existing is None:
+            self._temp.write(data)
+            return
+        with memoryview(data) as view:
+            for start in range(0, len(view), WRITE_BLOCK_SIZE):
+                block = view[start:start + WRITE_BLOCK_SIZE]
+                if self._existing.read(len(block)) != block:
+                    self._start_writing()
+                    self._temp.write(view[start:])
+                    return
+                self._matched += len(block)
+
+    def _start_writing(self):
+        self._temp_path = f"{self.path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        self._temp = open(self._temp_path, 'xb')
+        if self._existing is None:
+            return
+        self._existing.seek(0)
+        remaining = self._matched
+        while remaining:
+            block = self._existing.read(min(remaining, WRITE_BLOCK_SIZE))
+            if not block:
+                raise OSError(f"The file changed while it was being compared: {self.path}")
+            self._temp.write(block)
+            remaining -= len(block)
+        self._existing.close()
+        self._existing = None
+
+    def finish(self):
+        if self._existing is not None:
+            if not self._existing.read(1):
+                self.changed = False # Every byte matched, and the old file has no more
+                return
+            self._start_writing()
+        self._temp.close()
+        os.replace(self._temp_path, self.path)
+        self._temp = None
+        self.changed = True
+
+    def close(self):
+        if self._existing is not None:
+            self._existing.close()
+            self._existing = None
+        if self._temp is not None: # Failed part-way: drop the temporary file
+            self._temp.close()
+            self._temp = None
+            with contextlib.suppress(OSError):
+                os.remove(self._temp_path)
+
+
+# Output formats of a re-encoded document (the output_format option of the patch functions).
+OUTPUT_PRETTY = "pretty" # Indented by two spaces, as json.dump(indent=2) writes it
+OUTPUT_COMPACT = "compact" # No whitespace: about half the size, and several times faster to encode
+OUTPUT_PRESERVE = "preserve" # The indentation, separators and line endings of the target file
+OUTPUT_FORMATS = (OUTPUT_PRETTY, OUTPUT_COMPACT, OUTPUT_PRESERVE)
+# Bytes at the start of a file that its format is detected from.
+FORMAT_DETECT_SIZE = 64 * 1024
+
+
+class JsonFormat:
+    """
+    How a document is encoded: indent is the indent of one level, or None for a single line;
+    separators are the (item, key) separators, as for json.dumps; newline is the line ending.
+    """
+    __slots__ = ("indent", "separators", "newline")
+
+    def __init__(self, indent="  ", separators=(",", ": "), newline=os.linesep):
+        self.indent = indent
+        self.separators = separators
+        self.newline = newline
+
+    @classmethod
+    def detect(cls, head):
+        """The format of the JSON text that starts with the bytes head."""
+        newline = '\r\n' if b'\r\n' in head else '\n'
+        indent_match = re.search(rb'[{\[][ \t]*\r?\n([ \t]+)\S', head)
+        indent = indent_match.group(1).decode('ascii') if indent_match else None
+        spaced = re.search(rb'":[ \t]', head) is not None
+        if indent is not None:
+            separators = (',', ': ' if spaced else ':')
+        else:
+            separators = (', ', ': ') if spaced else (',', ':')
+        return cls(indent, separators, newline)
+
+
+# json.dump(indent=2) into a text file, which is what the tool has always written.
+PRETTY_FORMAT = JsonFormat()
+COMPACT_FORMAT = JsonFormat(None, (',', ':'))
+
+
+def output_format_for(name, head=None):
+    """
+    The JsonFormat of one of OUTPUT_FORMATS. For OUTPUT_PRESERVE, head is the start of the
+    target file (see FORMAT_DETECT_SIZE); without it the pretty format is used.
+    """
+    if name == OUTPUT_COMPACT:
+        return COMPACT_FORMAT
+    if name == OUTPUT_PRESERVE and head:
+        return JsonFormat.detect(head)
+    if name not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {name}")
+    return PRETTY_FORMAT
+
+
+def read_format_head(path):
+    """Reads the start of a file for output_format_for."""
+    with open(path, 'rb') as f:
+        return f.read(FORMAT_DETECT_SIZE)
+
+
+class JsonLayout:
+    """
+    Byte positions of values inside a JSON file, looked up on demand and cached.
+    Used to write a patched copy of the file by copying the original bytes and splicing
+    in only the re-encoded changed values, so unchanged parts keep their exact formatting.
+    The file is memory-mapped, so the untouched ranges are never decoded or copied in Python.
+    """
+    def __init__(self, path, data=None):
+        self.path = path
+        if data is not None: # Bytes already read ahead by the batch pipeline
+            if not data:
+                raise JsonScanError(f"File is empty: {path}")
+            self._file = None
+            self.buffer = data
+        else:
+            self._file = open(path, 'rb')
+            try:
+                self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # Empty file
+                self._file.close()
+                raise JsonScanError(f"File is empty: {path}")
+        self.root = json_root_offset(self.buffer)
+
+        self.format = JsonFormat.detect(self.buffer[:FORMAT_DETECT_SIZE])
+        self._layout = {}
+        self._lock = threading.Lock() # The pipeline's writer threads share the template's layout
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self.buffer.close()
+            self._file.close()
+            self._file = None
+        self.buffer = None
+
+    def load(self):
+        """Parses the whole file."""
+        return json.loads(self.buffer[:])
+
+    # --- Locating values ---
+
+    def _locate(self, requests):
+        """Finds the layout for every (path, kind) in requests that is not cached yet."""
+        root = _LayoutRequest()
+        remaining = 0
+        for path, kind in requests:
+            if (path, kind) in self._layout:
+                continue
+            node = root
+            for key in path:
+                node = node.children.setdefault(key, _LayoutRequest())
+            if kind == "span" and not node.want_span:
+                node.want_span = True
+                remaining += 1
+            elif kind == "members" and not node.want_members:
+                node.want_members = True
+                remaining += 1
+        if remaining == 0:
+            return
+        self._remaining = remaining
+        try:
+            self._scan(self.root, root, ())
+        except _StopScan:
+            pass
+        if self._remaining:
+            raise JsonScanError("Some changed values could not be found in the target file.")
+
+    def _found(self, key, value):
+        self._layout[key] = value
+        self._remaining -= 1
+        if self._remaining == 0:
+            raise _StopScan()
+
+    def _scan(self, pos, request, path):
+        """Walks the value at pos along the request trie. Returns the offset just past the value."""
+        buf = self.buffer
+        if request.want_span:
+            end = skip_json_value(buf, pos)
+            self._found((path, "span"), (pos, end))
+            return end
+
+        opener = buf[pos:pos + 1]
+        if opener not in (b'{', b'['):
+            return skip_json_value(buf, pos)
+        is_object = opener == b'{'
+        closer = b'}' if is_object else b']'
+
+        member_start = pos + 1
+        pos = skip_json_whitespace(buf, member_start)
+        last_member = None
+        index = 0
+        while buf[pos:pos + 1] != closer:
+            item_start = pos
+            if is_object:
+                key, key_end = read_json_key(buf, pos)
+                pos = skip_json_whitespace(buf, key_end)
+                if buf[pos:pos + 1] != b':':
+                    raise JsonScanError(f"Expected ':' at byte {pos}")
+                pos = skip_json_whitespace(buf, pos + 1)
+                separator = buf[key_end:pos]
+            else:
+                key = index
+                index += 1
+
+            child = request.children.get(key)
+            if child is not None:
+                end = self._scan(pos, child, path + (key,))
+            else:
+                end = skip_json_value(buf, pos)
+            if is_object:
+                last_member = (buf[member_start:item_start], separator, end)
+
+            pos = skip_json_whitespace(buf, end)
+            delimiter = buf[pos:pos + 1]
+            if delimiter == b',':
+                member_start = pos + 1
+                pos = skip_json_whitespace(buf, member_start)
+            elif delimiter != closer:
+                raise JsonScanError(f"Expected ',' or '{closer.decode()}' at byte {pos}")
+
+        if request.want_members:
+            self._found((path, "members"), (last_member, pos))
+        return pos + 1
+
+    # --- Writing ---
+
+    def _line_indent(self, pos):
+        line_start = self.buffer.rfind(b'\n', 0, pos) + 1
+        return _JSON_INDENT.match(self.buffer, line_start).group().decode('ascii')
+
+    def _encode(self, value, line_indent):
+        """Encodes value the way the file is formatted, for a value that starts on a line indented by line_indent."""
+        output_format = self.format
+        if output_format.indent is None:
+            return json.dumps(value, ensure_ascii=False, separators=output_format.separators).encode('utf-8')
+        text = json.dumps(value, ensure_ascii=False, indent=output_format.indent, separators=output_format.separators)
+        return text.replace('\n', output_format.newline + line_indent).encode('utf-8')
+
+    def write_spliced(self, output, changes, patched_root):
+        """
+        Writes the file to output (a path, or a binary file object) with the recorded changes
+        (see _PatchContext) spliced in. patched_root is the patched document; it is only needed
+        to rebuild dicts that were empty. Returns the number of edits made, and whether the
+        output was written: a file that already holds the result is left alone (see write_if_changed).
+        """
+        with self._lock:
+            self._locate([(change[1], "span" if change[0] == "set" else "members") for change in changes])
+
+        edits = [] # (start, end, order, replacement bytes)
+        rebuilt = set()
+        for order, change in enumerate(changes):
+            if change[0] == "set":
+                _, path, value = change
+                start, end = self._layout[(path, "span")]
+                edits.append((start, end, order, self._encode(value, self._line_indent(start))))
+                continue
+
+            _, path, key, value = change
+            last_member, close_pos = self._layout[(path, "members")]
+            if last_member is None:
+                # The dict was empty, so there is no formatting to follow: rewrite it as a whole.
+                if path in rebuilt:
+                    continue
+                rebuilt.add(path)
+                node = patched_root
+                for path_key in path:
+                    node = node[path_key]
+                open_pos = self.buffer.rfind(b'{', 0, close_pos)
+                edits.append((open_pos, close_pos + 1, order, self._encode(node, self._line_indent(open_pos))))
+                continue
+
+            prefix, separator, value_end = last_member
+            if b'\n' in prefix:
+                line_indent = prefix.rsplit(b'\n', 1)[1].decode('ascii')
+            else:
+                line_indent = self._line_indent(value_end)
+            member = b',' + prefix + json.dumps(key, ensure_ascii=False).encode('utf-8') + separator + \
+                     self._encode(value, line_indent)
+            edits.append((value_end, value_end, order, member))
+
+        edits.sort(key=lambda edit: (edit[0], edit[2]))
+
+        if not isinstance(output, (str, os.PathLike)):
+            self._write_edits(output, edits)
+            return len(edits), True
+        # Written atomically, which also lets the target be overwritten with its own patched version.
+        with write_if_changed(output) as f:
+            self._write_edits(f, edits)
+            if os.path.exists(output) and os.path.samefile(output, self.path):
+                self.close() # Windows can't replace a file that is still mapped
+        return len(edits), f.changed
+
+    def _write_edits(self, f, edits):
+        with memoryview(self.buffer) as view:
+            position = 0
+            for start, end, _, replacement in edits:
+                f.write(view[position:start])
+                f.write(replacement)
+                position = end
+            f.write(view[position:])
+
+
+def iter_json_items(buf, pos):
+    """
+    Yields (key, value_start, value_end) for each member of the JSON object or array at pos,
+    without decoding the values. For arrays, key is the item index.
+    """
+    is_object = buf[pos:pos + 1] == b'{'
+    closer = b'}' if is_object else b']'
+    pos = skip_json_whitespace(buf, pos + 1)
+    index = 0
+    while buf[pos:pos + 1] != closer:
+        if is_object:
+            key, key_end = read_json_key(buf, pos)
+            pos = skip_json_whitespace(buf, key_end)
+            if buf[pos:pos + 1] != b':':
+                raise JsonScanError(f"Expected ':' at byte {pos}")
+            pos = skip_json_whitespace(buf, pos + 1)
+        else:
+            key = index
+            index += 1
+        end = skip_json_value(buf, pos)
+        yield key, pos, end
+
+        pos = skip_json_whitespace(buf, end)
+        delimiter = buf[pos:pos + 1]
+        if delimiter == b',':
+            pos = skip_json_whitespace(buf, pos + 1)
+        elif delimiter != closer:
+            raise JsonScanError(f"Expected ',' or '{closer.decode()}' at byte {pos}")
+
+
+# Returned by _read_rule_subset for a value no patch rule can read.
+_NOT_NEEDED = object()
+
+
+def _read_rule_subset(buf, start, end, plan):
+    """Decodes the parts of the value in buf[start:end] that contain a key of plan.source_keys."""
+    if not plan.may_contain_source_key(buf, start, end):
+        return _NOT_NEEDED
+    opener = buf[start:start + 1]
+    if opener == b'{':
+        return _read_object_subset(buf, start, plan)[0]
+    if opener == b'[':
+        # A list with rule keys in it usually has them in every item (e.g. m_ClassDefinitionType
+        # on each glyph), so it is decoded as a whole, which is far faster than item by item.
+        return json.loads(buf[start:end])
+    return _NOT_NEEDED # A scalar only matters as the value of a rule key
+
+
+def _read_object_subset(buf, start, plan):
+    """
+    The object branch of _read_rule_subset, for the object at start. Returns the subset and
+    the offset just past the object.
+    """
+    node = {}
+    last_end = start + 1
+    for key, value_start, value_end in iter_json_items(buf, start):
+        if key in plan.source_keys:
+            node[key] = json.loads(buf[value_start:value_end])
+        else:
+            value = _read_rule_subset(buf, value_start, value_end, plan)
+            if value is not _NOT_NEEDED:
+                node[key] = value
+        last_end = value_end
+    return node, skip_json_whitespace(buf, last_end) + 1 # iter_json_items stopped at the closing brace
+
+
+def load_source_data(path, plan=None, data=None):
+    """
+    Loads a source file for patching, keeping only what the patch rules can read from it.
+    Subtrees that contain none of the rule keys (glyph table, character table, ...) are
+    skipped on the memory-mapped bytes without being decoded and dict members outside the
+    rules are left out; lists that contain a rule key are decoded whole. Patching a target with the
+    result gives the same output as patching it with the fully loaded source. The skipped parts
+    are still checked for paired brackets and valid strings, and a file that fails the scan is
+    loaded with json.loads instead, which raises where it is malformed.
+    If data holds the file's bytes (read ahead by the batch pipeline), it is scanned instead.
+    """
+    if data is not None:
+        if not data:
+            raise JsonScanError(f"File is empty: {path}")
+        return _load_source_buffer(data, plan or DEFAULT_PATCH_PLAN)
+    with open(path, 'rb') as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # Empty file
+            raise JsonScanError(f"File is empty: {path}")
+        with buf:
+            return _load_source_buffer(buf, plan or DEFAULT_PATCH_PLAN)
+
+
+def _load_source_buffer(buf, plan):
+    start = json_root_offset(buf)
+    if buf[start:start + 1] != b'{':
+        return json.loads(buf[start:]) # Not a font asset; nothing to skip
+    try:
+        # Every member is either decoded or skipped by skip_json_value, which checks that its
+        # brackets pair up and its strings are valid.
+        data, end = _read_object_subset(buf, start, plan)
+        if skip_json_whitespace(buf, end) != len(buf):
+            raise JsonScanError(f"Extra data after the JSON value, at byte {end}")
+    except JsonScanError:
+        # json.loads tells where the file is malformed, or loads what the scanner is too strict for.
+        return json.loads(buf[start:])
+    return data
+
+
+# --- Profiling ---
+
+# Values of the profile argument of the patch functions (None turns profiling off).
+PROFILE_TIME = "time"
+PROFILE_MEMORY = "memory" # Also records tracemalloc peaks, which slows the run down noticeably
+# Name of the Chrome trace written to the output folder by a profiled batch in the GUI. It is
+# JSON, but has no .json extension so it is never taken for a font asset.
+PROFILE_TRACE_FILENAME = "sdf_patch_profile.trace"
+
+
+class FileTrace:
+    """
+    Per-phase timings of one file, recorded by whichever process handles the file and sent
+    back with its result. Each phase records its start (time.perf_counter, which all
+    processes share), wall and CPU seconds and, with PROFILE_MEMORY, the tracemalloc peak.
+    Bytes read and written and the PatchStats counters are recorded per file.
+    """
+    def __init__(self, label, profile=PROFILE_TIME):
+        self.label = label
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+        self.trace_memory = profile == PROFILE_MEMORY
+        self.phases = []
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.counters = {}
+        if self.trace_memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if self.trace_memory:
+            import tracemalloc
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            record = {"name": name, "start": start, "wall": time.perf_counter() - start,
+                      "cpu": time.thread_time() - cpu_start, "tid": threading.get_ident()}
+            if self.trace_memory:
+                record["memory_peak"] = tracemalloc.get_traced_memory()[1]
+            self.phases.append(record)
+
+    def read(self, path, size=None):
+        self.bytes_read += os.path.getsize(path) if size is None else size
+
+    def wrote(self, path, size=None):
+        self.bytes_written += os.path.getsize(path) if size is None else size
+
+    def add_stats(self, stats):
+        for name, value in vars(stats).items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+class _NoTrace:
+    """Stands in for a FileTrace when profiling is off, so the patch code needs no checks."""
+    def phase(self, name):
+        return _NULL_PHASE
+
+    def read(self, path, size=None):
+        pass
+
+    def wrote(self, path, size=None):
+        pass
+
+    def add_stats(self, stats):
+        pass
+
+
+_NULL_PHASE = contextlib.nullcontext()
+NO_TRACE = _NoTrace()
+
+
+def _new_trace(label, profile):
+    return FileTrace(label, profile) if profile else NO_TRACE
+
+
+class BatchProfile:
+    """
+    Collects the FileTraces of a run and reports them as a summary table (for the log)
+    or as a Chrome trace / Perfetto JSON file. Work done by the batch itself (e.g. checking
+    the manifest) is recorded with phase().
+    """
+    def __init__(self, profile=PROFILE_TIME):
+        self.profile = profile
+        self.files = []
+        self.main = FileTrace("batch", profile)
+        self.files.append(self.main)
+
+    def phase(self, name):
+        return self.main.phase(name)
+
+    def add(self, trace):
+        if trace is not None and trace is not NO_TRACE:
+            self.files.append(trace)
+
+    def phase_totals(self):
+        """Returns {phase: [count, wall, cpu, max wall, max memory peak]} in first-seen order."""
+        totals = {}
+        for trace in self.files:
+            for record in trace.phases:
+                entry = totals.setdefault(record["name"], [0, 0.0, 0.0, 0.0, None])
+                entry[0] += 1
+                entry[1] += record["wall"]
+                entry[2] += record["cpu"]
+                entry[3] = max(entry[3], record["wall"])
+                if "memory_peak" in record:
+                    entry[4] = max(entry[4] or 0, record["memory_peak"])
+        return totals
+
+    def summary_table(self, slowest_count=5):
+        totals = self.phase_totals()
+        lines = ["\n--- Profile ---",
+                 f"{'phase':<16}{'count':>7}{'wall s':>10}{'cpu s':>10}{'max s':>9}{'peak MB':>10}"]
+        for name, (count, wall, cpu, max_wall, memory_peak) in totals.items():
+            memory = "" if memory_peak is None else f"{memory_peak / (1024 * 1024):.1f}"
+            lines.append(f"{name:<16}{count:>7}{wall:>10.3f}{cpu:>10.3f}{max_wall:>9.3f}{memory:>10}")
+
+        files = self.files[1:]
+        bytes_read = sum(trace.bytes_read for trace in files)
+        bytes_written = sum(trace.bytes_written for trace in files)
+        lines.append(f"Read {bytes_read / (1024 * 1024):.1f} MB, wrote {bytes_written / (1024 * 1024):.1f} MB.")
+        counters = {}
+        for trace in files:
+            for name, value in trace.counters.items():
+                counters[name] = counters.get(name, 0) + value
+        if counters:
+            lines.append(", ".join(f"{name.replace('_', ' ')}: {value}" for name, value in counters.items()))
+
+        slowest = sorted(files, key=lambda trace: -sum(record["wall"] for record in trace.phases))[:slowest_count]
+        if len(files) > 1 and slowest:
+            lines.append("Slowest files: " + ", ".join(
+                f"{trace.label} ({sum(record['wall'] for record in trace.phases):.2f} s)" for trace in slowest))
+        return "\n".join(lines) + "\n"
+
+    def chrome_trace(self):
+        """The run in the Chrome trace event format, which Perfetto and chrome://tracing open."""
+        origin = min((record["start"] for trace in self.files for record in trace.phases), default=0.0)
+        events = []
+        process_ids = []
+        for trace in self.files:
+            if trace.pid not in process_ids:
+                process_ids.append(trace.pid)
+                events.append({"ph": "M", "name": "process_name", "pid": trace.pid,
+                               "args": {"name": "main" if trace is self.main else f"worker {len(process_ids) - 1}"}})
+            # The write phase runs on a pipeline writer thread; the file's span covers the
+            # phases on its own thread, so spans of consecutive files don't overlap.
+            own_phases = [record for record in trace.phases if record["tid"] == trace.tid]
+            if not own_phases:
+                continue
+            start = min(record["start"] for record in own_phases)
+            end = max(record["start"] + record["wall"] for record in own_phases)
+            events.append({"ph": "X", "name": trace.label, "cat": "file", "pid": trace.pid, "tid": trace.tid,
+                           "ts": (start - origin) * 1e6, "dur": (end - start) * 1e6,
+                           "args": dict(trace.counters, bytes_read=trace.bytes_read, bytes_written=trace.bytes_written)})
+            for record in trace.phases:
+                args = {"cpu_ms": round(record["cpu"] * 1000, 3)}
+                if "memory_peak" in record:
+                    args["memory_peak"] = record["memory_peak"]
+                events.append({"ph": "X", "name": record["name"], "cat": "phase", "pid": trace.pid,
+                               "tid": record["tid"],
+                               "ts": (record["start"] - origin) * 1e6, "dur": record["wall"] * 1e6, "args": args})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+
+
+# --- Encoded Fragment Cache ---
+
+# Lists shorter than this are encoded directly; longer ones go through the fragment cache.
+FRAGMENT_MIN_LENGTH = 64
+# Characters of encoded text the cache holds per process. An entry of a replaced array also
+# keeps the parsed array alive, which is counted as PARSE_MEMORY_RATIO times its text.
+FRAGMENT_CACHE_BYTES = 64 * 1024 * 1024
+# Number of replaced-array keys remembered as seen once (see FragmentCache).
+FRAGMENT_SEEN_SIZE = 64
+# Number of items sampled across an array for its cache key.
+FRAGMENT_SAMPLES = 16
+
+
+class FragmentCache:
+    """
+    Encodes documents exactly like json.dump(ensure_ascii=False) in a given JsonFormat (by
+    default json.dump(indent=2)), but reuses the encoded text of large arrays that appear in
+    many outputs of a batch, so each is encoded once instead of once per file. Two kinds of
+    arrays are cached:
+    - arrays shared with the template, keyed by identity: patch_copy_on_write leaves the
+      untouched glyph and character tables shared, so every output holds the same objects;
+    - arrays at a KEYS_WITH_ARRAY_TO_REPLACE path, keyed by their length and a few sampled
+      items and confirmed with == on a hit, since many sources carry identical kerning
+      records. Comparing a parsed array costs a fraction of encoding it with an indent.
+      Most sources bring arrays of their own, though, so such an array is only stored the
+      second time its key is seen; until then only the key is remembered.
+    Fragments are stored unindented and re-indented to their nesting level when used.
+    The least recently used entries are dropped when the entries cost more than max_bytes
+    (see FRAGMENT_CACHE_BYTES); a fragment larger than that is not stored at all. A batch
+    clears the cache when it ends, so nothing is kept alive between runs.
+    A format without indent is encoded in one call to json's C encoder instead, which is
+    faster than any splicing of fragments.
+    Cached arrays must not be modified in place (the patch never does). Thread-safe, so
+    the pipeline's writer threads can share one cache.
+    """
+    def __init__(self, max_bytes=FRAGMENT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._fragments = collections.OrderedDict() # key -> (array, text, cost)
+        self._seen = collections.OrderedDict() # key of a replaced array seen once -> None
+        self._cost = 0
+        self._lock = threading.Lock()
+        self._encoders = {} # (indent, separators) -> json.JSONEncoder
+
+    def encode(self, data, template=None, plan=None, output_format=None):
+        """
+        Returns the encoded document as a list of string chunks, and how many large
+        arrays were taken from the cache and how many had to be encoded.
+        template is the document data shares its untouched subtrees with, if any.
+        output_format is a JsonFormat (PRETTY_FORMAT if omitted).
+        """
+        output_format = output_format or PRETTY_FORMAT
+        style = (output_format.indent, output_format.separators)
+        encoder = self._encoders.get(style)
+        if encoder is None:
+            encoder = self._encoders[style] = json.JSONEncoder(
+                indent=output_format.indent, separators=output_format.separators, ensure_ascii=False)
+        if output_format.indent is None:
+            return [encoder.encode(data)], 0, 0
+        counts = [0, 0]
+        chunks = []
+        self._encode_node(data, template, 0, chunks, counts, plan or DEFAULT_PATCH_PLAN, set(),
+                          output_format, encoder)
+        return chunks, counts[0], counts[1]
+
+    def _encode_node(self, node, template_node, level, chunks, counts, plan, rule_arrays, output_format, encoder):
+        indent = output_format.indent
+        if isinstance(node, dict) and node and all(isinstance(key, str) for key in node):
+            item_separator, key_separator = output_format.separators
+            newline = output_format.newline + indent * (level + 1)
+            separator = '{' + newline
+            for key, value in node.items():
+                array_path = plan.array_paths.get(key)
+                if array_path:
+                    rule_array = value
+                    for path_key in array_path:
+                        rule_array = rule_array.get(path_key) if isinstance(rule_array, dict) else None
+                    if isinstance(rule_array, list):
+                        rule_arrays.add(id(rule_array))
+                chunks.append(separator)
+                chunks.append(json.encoder.encode_basestring(key))
+                chunks.append(key_separator)
+                child_template = template_node.get(key) if isinstance(template_node, dict) else None
+                self._encode_node(value, child_template, level + 1, chunks, counts, plan, rule_arrays,
+                                  output_format, encoder)
+                separator = item_separator + newline
+            chunks.append(output_format.newline + indent * level + '}')
+            return
+
+        if isinstance(node, list) and len(node) >= FRAGMENT_MIN_LENGTH and \
+           (node is template_node or id(node) in rule_arrays):
+            text, reused = self._fragment(node, node is template_node, encoder)
+            counts[0 if reused else 1] += 1
+        else:
+            text = encoder.encode(node)
+        if level or output_format.newline != '\n':
+            text = text.replace('\n', output_format.newline + indent * level)
+        chunks.append(text)
+
+    def _fragment(self, array, identity, encoder):
+        style = (encoder.indent, encoder.item_separator, encoder.key_separator)
+        if identity:
+            key = (style, "id", id(array))
+        else:
+            step = max(1, len(array) // FRAGMENT_SAMPLES)
+            key = (style, "items", len(array), pickle.dumps(array[::step] + array[-1:], protocol=pickle.HIGHEST_PROTOCOL))
+        with self._lock:
+            entry = self._fragments.get(key)
+            if entry is not None:
+                self._fragments.move_to_end(key)
+        if entry is not None and (entry[0] is array or (not identity and entry[0] == array)):
+            return entry[1], True
+
+        text = encoder.encode(array)
+        # An array shared with the template stays alive anyway; a replaced one is kept alive by the entry.
+        cost = len(text) if identity else len(text) * (1 + PARSE_MEMORY_RATIO)
+        with self._lock:
+            if not identity and key not in self._seen:
+                self._seen[key] = None
+                while len(self._seen) > FRAGMENT_SEEN_SIZE:
+                    self._seen.popitem(last=False)
+                return text, False
+            if cost > self.max_bytes:
+                return text, False
+            old = self._fragments.pop(key, None)
+            if old is not None:
+                self._cost -= old[2]
+            self._fragments[key] = (array, text, cost)
+            self._cost += cost
+            while self._cost > self.max_bytes:
+                self._cost -= self._fragments.popitem(last=False)[1][2]
+        return text, False
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+            self._seen.clear()
+            self._cost = 0
+
+
+# Used by write_patched_file, shared by every output a process writes.
+ENCODED_FRAGMENTS = FragmentCache()
+
+
+# --- Parallel Batch Engine ---
+
+# Default size of the process pool used by the batch tabs.
+DEFAULT_WORKER_COUNT = os.cpu_count() or 1
+# Number of files handed to a worker in one go. Larger chunks mean less
+# inter-process traffic, smaller chunks mean better load balancing.
+DEFAULT_CHUNK_SIZE = 1
+
+
+class BufferedLog:
+    """
+    A stand-in for the Tk log widget that collects messages in memory.
+    Worker processes cannot touch the GUI, so they log into this and
+    ship the text back with their result.
+    """
+    def __init__(self):
+        self.lines = []
+
+    def insert(self, index, text):
+        self.lines.append(text)
+
+    def getvalue(self):
+        return "".join(self.lines)
+
+
+class QueueLog:
+    """
+    A stand-in for the Tk log widget that forwards every message to an event queue,
+    so code running on a background thread never touches the widget directly.
+    """
+    def __init__(self, event_queue):
+        self.event_queue = event_queue
+
+    def insert(self, index, text):
+        self.event_queue.put(("log", text))
+
+
+# The parsed target template, set once per worker process by the pool
+# initializer so it is not pickled again for every task. The layout of the
+# template file is only needed (and opened) for byte-splice output.
+_worker_template = None
+_worker_template_layout = None
+
+
+def _init_template_worker(template_data, template_path=None):
+    global _worker_template, _worker_template_layout
+    if _worker_template_layout is not None:
+        _worker_template_layout.close()
+    _worker_template = template_data
+    ENCODED_FRAGMENTS.clear() # Fragments of a previous template can't be reused
+    _worker_template_layout = JsonLayout(template_path) if template_path else None
+
+
+def _release_worker_state():
+    """
+    Drops the template and the cached fragments a run left in this process. Pool
+    workers end with their run; this is for runs in this process, so a GUI or script that
+    goes on after a batch doesn't keep its large arrays alive.
+    """
+    global _worker_template
+    _init_template_worker(None)
+    _worker_template = None
+
+
+def write_patched_file(output, patched_data, log_area, layout=None, changes=None, template=None, output_format=None,
+                       plan=None):
+    """
+    Saves patched_data to output: a file path, or a binary file object (UTF-8 is written to it).
+    With a layout (of the target file the data was loaded from) and the recorded changes,
+    the changes are spliced into a copy of the original bytes instead of re-serializing the
+    whole document. Otherwise it is encoded through ENCODED_FRAGMENTS in output_format (a
+    JsonFormat, PRETTY_FORMAT if omitted); template is the document patched_data shares subtrees
+    with, and plan the PatchPlan it was patched with, whose array rules tell which replaced
+    arrays are worth caching. An output file that already holds the same bytes is not written again (see
+    write_if_changed). Returns how many large arrays were taken from the fragment cache and how
+    many were encoded, and whether the output was written.
+    """
+    if layout is not None:
+        try:
+            edit_count, changed = layout.write_spliced(output, changes, patched_data)
+            log_area.insert(END, f"Spliced {edit_count} change(s) into the original target bytes.\n")
+            if not changed:
+                log_area.insert(END, "The output already holds these bytes; it was left untouched.\n")
+            return 0, 0, changed
+        except JsonScanError as e:
+            log_area.insert(END, f"Could not splice into the target file ({e}); writing it re-formatted instead.\n")
+
+    chunks, reused, encoded = ENCODED_FRAGMENTS.encode(patched_data, template, plan, output_format)
+    if not isinstance(output, (str, os.PathLike)):
+        _write_chunks(output, chunks)
+        return reused, encoded, True
+    with write_if_changed(output) as f:
+        _write_chunks(f, chunks)
+    if not f.changed:
+        log_area.insert(END, "The output already holds these bytes; it was left untouched.\n")
+    return reused, encoded, f.changed
+
+
+def _write_chunks(f, chunks):
+    """Writes encoded text chunks to a binary file as UTF-8, joined into blocks of about WRITE_BLOCK_SIZE."""
+    block = []
+    size = 0
+    for chunk in chunks:
+        block.append(chunk)
+        size += len(chunk)
+        if size >= WRITE_BLOCK_SIZE:
+            f.write("".join(block).encode('utf-8'))
+            block = []
+            size = 0
+    if block:
+        f.write("".join(block).encode('utf-8'))
+
+
+class JobResult:
+    """
+    The outcome of patch_file_with_template or patch_file_pair for one file, sent back by the worker.
+    trace is a FileTrace if profiling was requested, otherwise None. fragments is the (reused,
+    encoded) count of large arrays from write_patched_file. output_data holds the encoded output
+    if it was written to memory (for an output archive), otherwise None. memory is the
+    (process id, peak memory) of the worker process that ran it, if it was run by a pool.
+    unchanged tells that the output file already held the result and was left untouched.
+    """
+    def __init__(self, success, log_text, error=None, trace=None, fragments=(0, 0), output_data=None, unchanged=False):
+        self.success = success
+        self.log_text = log_text
+        self.error = error
+        self.trace = trace
+        self.fragments = fragments
+        self.output_data = output_data
+        self.unchanged = unchanged
+        self.memory = None
+
+
+class _PendingOutput:
+    """
+    One file on its way through the batch pipeline: the patched document, waiting to be
+    written, along with the log and trace collected for it so far.
+    """
+    def __init__(self, output_path, profile, to_memory=False, output_format=None, plan=None):
+        self.output_path = output_path
+        self.to_memory = to_memory
+        self.output_format = output_format
+        self.plan = plan
+        self.log = BufferedLog()
+        self.trace = _new_trace(os.path.basename(output_path), profile)
+        self.profile = profile
+        self.data = None
+        self.layout = None
+        self.owns_layout = False
+        self.changes = None
+        self.template = None
+        self.error = None
+
+    def fail(self, error):
+        self.error = str(error)
+        self.close()
+
+    def close(self):
+        if self.owns_layout and self.layout is not None:
+            self.layout.close()
+        self.layout = None
+
+    def finish(self):
+        """Writes the output (to output_path, or to memory) if patching succeeded. Returns a JobResult."""
+        fragments = (0, 0)
+        output_data = None
+        changed = True
+        if self.error is None:
+            try:
+                with self.trace.phase("write"):
+                    if self.to_memory:
+                        buffer = io.BytesIO()
+                        *fragments, changed = write_patched_file(buffer, self.data, self.log, self.layout,
+                                                                 self.changes, self.template, self.output_format,
+                                                                 self.plan)
+                        output_data = buffer.getvalue()
+                    else:
+                        *fragments, changed = write_patched_file(self.output_path, self.data, self.log, self.layout,
+                                                                 self.changes, self.template, self.output_format,
+                                                                 self.plan)
+                if changed:
+                    self.trace.wrote(self.output_path, None if output_data is None else len(output_data))
+            except Exception as e:
+                self.error = str(e)
+            finally:
+                self.close()
+        self.data = self.template = None
+        return JobResult(self.error is None, self.log.getvalue(), self.error, self.trace if self.profile else None,
+                         tuple(fragments), output_data, not changed)
+
+
+def _prepare_template_file(source_path, output_path, splice=False, profile=None, to_memory=False, plan=None,
+                           output_format=None, files=None):
+    """
+    The patch stage of patch_file_with_template. files maps paths to bytes read ahead
+    by the pipeline; files not in it are read from disk. Errors are kept in the result.
+    """
+    pending = _PendingOutput(output_path, profile, to_memory, output_format, plan)
+    trace = pending.trace
+    source_bytes = (files or {}).get(source_path)
+    try:
+        with trace.phase("load source"):
+            source_data = load_source_data(source_path, plan, source_bytes)
+        trace.read(source_path, None if source_bytes is None else len(source_bytes))
+
+        # The template itself is never modified; untouched subtrees are shared with it.
+        stats = PatchStats()
+        pending.changes = [] if splice else None
+        with trace.phase("patch"):
+            pending.data = patch_copy_on_write(_worker_template, source_data, pending.log, plan, stats,
+                                               pending.changes)
+        pending.log.insert(END, stats.summary())
+        trace.add_stats(stats)
+        pending.layout = _worker_template_layout if splice else None
+        pending.template = _worker_template
+    except Exception as e:
+        pending.fail(e)
+    return pending
+
+
+def _prepare_file_pair(source_path, target_path, output_path, splice=False, profile=None, to_memory=False,
+                       plan=None, output_format=None, files=None):
+    """The patch stage of patch_file_pair, see _prepare_template_file."""
+    files = files or {}
+    pending = _PendingOutput(output_path, profile, to_memory, output_format, plan)
+    trace = pending.trace
+    source_bytes = files.get(source_path)
+    target_bytes = files.get(target_path)
+    try:
+        with trace.phase("load source"):
+            source_data = load_source_data(source_path, plan, source_bytes)
+        trace.read(source_path, None if source_bytes is None else len(source_bytes))
+
+        with trace.phase("load target"):
+            if splice:
+                pending.layout = JsonLayout(target_path, data=target_bytes)
+                pending.owns_layout = True
+                target_data = pending.layout.load()
+            elif target_bytes is not None:
+                target_data = json.loads(target_bytes)
+            else:
+                with open(target_path, 'r', encoding='utf-8') as f:
+                    target_data = json.load(f)
+        trace.read(target_path, None if target_bytes is None else len(target_bytes))
+        if output_format == OUTPUT_PRESERVE:
+            if pending.layout is not None:
+                pending.output_format = pending.layout.format
+            else:
+                pending.output_format = output_format_for(OUTPUT_PRESERVE, target_bytes[:FORMAT_DETECT_SIZE]
+                                                          if target_bytes is not None else read_format_head(target_path))
+
+        stats = PatchStats()
+        pending.changes = [] if splice else None
+        with trace.phase("patch"):
+            update_json_recursively(target_data, source_data, pending.log, plan, stats, pending.changes)
+        pending.log.insert(END, stats.summary())
+        trace.add_stats(stats)
+        pending.data = target_data
+    except Exception as e:
+        pending.fail(e)
+    return pending
+
+
+def patch_file_with_template(source_path, output_path, splice=False, profile=None, to_memory=False, plan=None,
+                             output_format=None, files=None):
+    """
+    Patches the worker's template with one source file and saves the result. Returns a JobResult;
+    it has a FileTrace if profile is PROFILE_TIME or PROFILE_MEMORY. With to_memory, the output
+    is returned in the result instead of being saved (output_path then only names it).
+    plan is the PatchPlan to patch with (DEFAULT_PATCH_PLAN if omitted), output_format the
+    JsonFormat of the output (see write_patched_file).
+    files optionally maps input paths to their bytes, e.g. for members of an archive.
+    """
+    return _prepare_template_file(source_path, output_path, splice, profile, to_memory, plan, output_format,
+                                  files).finish()
+
+
+def patch_file_pair(source_path, target_path, output_path, splice=False, profile=None, to_memory=False, plan=None,
+                    output_format=None, files=None):
+    """
+    Patches one target file with its matched source file and saves it.
+    Returns a JobResult, like patch_file_with_template. output_format can also be
+    OUTPUT_PRESERVE, for the format of the target file.
+    """
+    return _prepare_file_pair(source_path, target_path, output_path, splice, profile, to_memory, plan, output_format,
+                              files).finish()
+
+
+def _template_job_inputs(source_path, *options):
+    return [source_path]
+
+
+def _pair_job_inputs(source_path, target_path, *options):
+    return [source_path, target_path]
+
+
+# How the batch pipeline splits each job function into stages: the files a job reads,
+# and the patch stage that turns the job (plus the bytes read ahead) into a _PendingOutput.
+PIPELINE_STAGES = {
+    patch_file_with_template: (_template_job_inputs, _prepare_template_file),
+    patch_file_pair: (_pair_job_inputs, _prepare_file_pair),
+}
+
+# Number of jobs whose input files are read ahead of the patch stage.
+PIPELINE_READ_AHEAD = 4
+# Bytes of input files the pipeline holds besides the job being patched: files read ahead,
+# and the jobs whose outputs wait for a writer (each holds its documents and encoded output,
+# which take several times its input size). With large files this allows one job at most
+# either way, which loses little: reading ahead gains nothing from a single disk.
+PIPELINE_WINDOW_BYTES = 64 * 1024 * 1024
+# Number of threads reading input files, and writing outputs.
+PIPELINE_READER_COUNT = 2
+PIPELINE_WRITER_COUNT = 2
+
+
+def _read_files(paths):
+    files = {}
+    for path in paths:
+        with open(path, 'rb') as f:
+            files[path] = f.read()
+    return files
+
+
+def _job_input_size(job_inputs, job):
+    """The size of a job's input files on disk, or None if they are not files (archive members)."""
+    try:
+        return sum(os.path.getsize(path) for path in job_inputs(*job))
+    except OSError:
+        return None
+
+
+def run_pipeline(func, jobs, cancel_event=None, read_inputs=None, read_ahead=PIPELINE_READ_AHEAD,
+                 reader_count=PIPELINE_READER_COUNT, writer_count=PIPELINE_WRITER_COUNT, budget=None, job_costs=None,
+                 window_bytes=PIPELINE_WINDOW_BYTES):
+    """
+    Runs func(*job) for every job, like a serial loop, but as three overlapping stages:
+    reader threads prefetch the input files of the next read_ahead jobs, this thread
+    patches, and a pool of writer_count threads saves the outputs. The stages are
+    connected by bounded queues, so a slow stage holds back the others instead of
+    piling up files in memory: besides the job being patched, the files read ahead and the
+    jobs waiting for a writer each stay within window_bytes of input files (one job is
+    always let through). func must be one of PIPELINE_STAGES.
+    read_inputs(job), if given, replaces reading the job's input files from disk; it
+    returns a {path: bytes} dict (see run_batch_jobs). Such inputs are not read ahead, as
+    their size is not known before they are read.
+    Yields the results in the same order as jobs. If cancel_event is set, no further
+    jobs are patched; outputs already patched are still written.
+    With a MemoryBudget, a job is only patched once job_costs of it and of the outputs still
+    waiting to be written fit in the budget.
+    """
+    # Imported here, like the process pool: serial runs of a single file don't need it.
+    from concurrent.futures import ThreadPoolExecutor
+    job_inputs, prepare = PIPELINE_STAGES[func]
+    if read_inputs is None:
+        read_inputs = lambda job: _read_files(job_inputs(*job))
+    jobs = list(jobs)
+    sizes = [_job_input_size(job_inputs, job) for job in jobs]
+    sizes = [window_bytes + 1 if size is None else size for size in sizes]
+    reads = collections.deque() # (future, size)
+    writes = collections.deque() # (future, cost, size)
+    next_read = 0
+
+    def finish_oldest():
+        write, cost, _ = writes.popleft()
+        job_result = write.result()
+        if budget is not None:
+            budget.release(cost)
+        return job_result
+
+    def bytes_after_first(queue):
+        return sum(entry[-1] for entry in queue) - (queue[0][-1] if queue else 0)
+
+    with ThreadPoolExecutor(max_workers=reader_count, thread_name_prefix="sdf-read") as readers, \
+         ThreadPoolExecutor(max_workers=writer_count, thread_name_prefix="sdf-write") as writers:
+        try:
+            for index, job in enumerate(jobs):
+                while next_read < len(jobs) and len(reads) < read_ahead and \
+                        (not reads or bytes_after_first(reads) + sizes[next_read] <= window_bytes):
+                    reads.append((readers.submit(read_inputs, jobs[next_read]), sizes[next_read]))
+                    next_read += 1
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                cost = job_costs[index] if budget is not None else 0
+                while budget is not None and not budget.admit(cost, bool(writes)):
+                    yield finish_oldest()
+                try:
+                    files = reads.popleft()[0].result()
+                except Exception as e:
+                    writes.append((writers.submit(JobResult, False, "", f"Could not read the input files: {e}"), cost,
+                                   sizes[index]))
+                else:
+                    writes.append((writers.submit(prepare(*job, files=files).finish), cost, sizes[index]))
+                # Wait for the oldest write once the queue is full, keeping results in order.
+                while len(writes) > writer_count or (len(writes) > 1 and
+                                                     sum(write[2] for write in writes) - writes[-1][2] > window_bytes):
+                    yield finish_oldest()
+            while writes:
+                yield finish_oldest()
+        finally:
+            for read, _ in reads:
+                read.cancel()
+
+
+def _read_chunk_inputs(read_inputs, chunk):
+    chunk_files = []
+    for job in chunk:
+        try:
+            chunk_files.append(read_inputs(job))
+        except Exception as e:
+            chunk_files.append(e) # Reported as the job's failure by the worker
+    return chunk_files
+
+
+def _run_job_chunk(func, chunk, chunk_files=None):
+    if chunk_files is not None:
+        results = [JobResult(False, "", f"Could not read the input files: {files}") if isinstance(files, Exception)
+                   else func(*job, files=files) for job, files in zip(chunk, chunk_files)]
+    elif func in PIPELINE_STAGES and len(chunk) > 1:
+        results = list(run_pipeline(func, chunk))
+    else:
+        results = [func(*job) for job in chunk]
+    memory = (os.getpid(), process_peak_memory())
+    for result in results:
+        result.memory = memory
+    return results
+
+
+def _chunk_memory(costs):
+    """Estimated memory of a chunk of jobs in a worker, from their job_costs: the pipeline holds a few at once."""
+    return max(costs) * min(len(costs), PIPELINE_WRITER_COUNT + 1)
+
+
+def run_batch_jobs(func, jobs, worker_count=DEFAULT_WORKER_COUNT, chunk_size=DEFAULT_CHUNK_SIZE,
+                   initializer=None, initargs=(), cancel_event=None, read_inputs=None, budget=None, job_costs=None):
+    """
+    Runs func(*job) for every job and yields the results in the same order as jobs.
+    With more than one worker the jobs are fanned out over a process pool in chunks
+    of chunk_size; otherwise they run one after another in this process. Either way,
+    the patch functions run through run_pipeline, so reading and writing files overlap
+    with patching.
+    read_inputs(job), if given, reads the job's input files in this process (members of an
+    archive, which the workers can't open efficiently) and returns a {path: bytes} dict that
+    is passed to func as files.
+    If cancel_event is set, no further jobs are started. Chunks a worker has already
+    picked up are allowed to finish, so no file is left half-written.
+    budget, a MemoryBudget, holds back further chunks while the estimated memory of those in
+    flight (job_costs, one per job) would exceed it, and is told the peak memory of every worker.
+    """
+    jobs = list(jobs)
+    if worker_count <= 1 or len(jobs) <= 1:
+        try:
+            if initializer is not None:
+                initializer(*initargs)
+            if func in PIPELINE_STAGES:
+                yield from run_pipeline(func, jobs, cancel_event, read_inputs, budget=budget, job_costs=job_costs)
+                return
+            for job in jobs:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                yield func(*job) if read_inputs is None else func(*job, files=read_inputs(job))
+        finally:
+            _release_worker_state()
+        return
+
+    # Imported here: the pool machinery is slow to import and not needed by serial runs.
+    from concurrent.futures import ProcessPoolExecutor
+    chunk_size = max(1, chunk_size)
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+    if budget is not None:
+        chunk_costs = [job_costs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+    worker_count = min(worker_count, len(chunks))
+    pool = ProcessPoolExecutor(max_workers=worker_count, initializer=initializer, initargs=initargs)
+    try:
+        # Only keep a couple of chunks per worker in flight, so a cancel does not have to
+        # wait for the whole batch and memory stays bounded. Results are collected in
+        # submission order, so the log reads the same as a serial run.
+        pending = collections.deque()
+        next_chunk = 0
+        while next_chunk < len(chunks) or pending:
+            while next_chunk < len(chunks) and len(pending) < worker_count * 2:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                cost = _chunk_memory(chunk_costs[next_chunk]) if budget is not None else 0
+                if budget is not None and not budget.admit(cost, bool(pending)):
+                    break
+                chunk = chunks[next_chunk]
+                chunk_files = _read_chunk_inputs(read_inputs, chunk) if read_inputs is not None else None
+                pending.append((pool.submit(_run_job_chunk, func, chunk, chunk_files), cost))
+                next_chunk += 1
+            if not pending:
+                return
+            future, cost = pending.popleft()
+            chunk_results = future.result()
+            if budget is not None:
+                budget.release(cost)
+                for job_result in chunk_results:
+                    budget.record_peak(job_result.memory)
+            yield from chunk_results
+            if cancel_event is not None and cancel_event.is_set():
+                next_chunk = len(chunks)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def list_json_files(folder):
+    return [f for f in os.listdir(folder) if f.lower().endswith('.json')]
+
+
+def benchmark_batch_template(source_folder, template_path, worker_count=DEFAULT_WORKER_COUNT,
+                             chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Runs the One-style batch over the same folder serially and in parallel
+    (into throw-away output folders) and returns the wall-clock times.
+    """
+    with open(template_path, 'r', encoding='utf-8') as f:
+        template_data = json.load(f)
+    source_files = list_json_files(source_folder)
+
+    timings = {}
+    for label, workers in (("serial", 1), ("parallel", worker_count)):
+        with tempfile.TemporaryDirectory() as output_folder:
+            jobs = [(os.path.join(source_folder, name), os.path.join(output_folder, name)) for name in source_files]
+            start = time.perf_counter()
+            for _ in run_batch_jobs(patch_file_with_template, jobs, workers, chunk_size,
+                                    _init_template_worker, (template_data,)):
+                pass
+            timings[label] = time.perf_counter() - start
+    return len(source_files), timings
+
+
+
+# --- Memory Budget ---
+# With very large assets (CJK fonts of 50 MB and more), every file a worker holds costs several
+# times its size in memory, and a pool with one worker per core can run out of it. A batch can
+# be given a memory budget: the worker count and the files in flight are then limited by an
+# estimate of what each file needs, and the largest files are started first, so the long jobs
+# don't end up alone at the end of the run.
+
+# Memory of the parsed document per byte of JSON text, allocator overhead included. Indented
+# asset files parse to about twice their size in Python objects, compact ones to several times it.
+PARSE_MEMORY_RATIO = 5
+# Memory of a worker process before it holds any document (interpreter and modules).
+WORKER_BASE_MEMORY = 32 * 1024 * 1024
+# Memory the process that patches keeps between files besides its documents: the encoded-fragment
+# cache, full, and the input files the pipeline reads ahead. (The fingerprint cache is emptied after
+# every file, and the outputs waiting for a writer are counted as jobs in flight.)
+WORKER_CACHE_MEMORY = FRAGMENT_CACHE_BYTES + PIPELINE_WINDOW_BYTES
+
+
+def process_peak_memory():
+    """Peak resident memory of this process in bytes, or None where it can't be measured."""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        kernel32 = ctypes.WinDLL("kernel32")
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        psapi = ctypes.WinDLL("psapi")
+        psapi.GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(PROCESS_MEMORY_COUNTERS), wintypes.DWORD]
+        if not psapi.GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024 # Linux reports kilobytes, macOS bytes
+
+
+def estimate_job_memory(input_sizes, output_size):
+    """Estimated memory of patching one file: its inputs, read and parsed, plus the encoded output."""
+    return sum(input_sizes) * (1 + PARSE_MEMORY_RATIO) + output_size
+
+
+class MemoryBudget:
+    """
+    Admits batch jobs against a memory limit (bytes), from the estimates of estimate_job_memory.
+    worker_cost is what every worker process holds for the whole run (e.g. the parsed template)
+    and reserved what this process holds. cache_cost is what the process that patches keeps
+    between files (see WORKER_CACHE_MEMORY): every worker, or this process if it runs the jobs
+    itself. Records the estimated peak and the actual peak memory reported by the workers.
+    """
+    def __init__(self, limit, worker_cost=WORKER_BASE_MEMORY, reserved=WORKER_BASE_MEMORY,
+                 cache_cost=WORKER_CACHE_MEMORY):
+        self.limit = limit
+        self.worker_cost = worker_cost
+        self.reserved = reserved
+        self.cache_cost = cache_cost
+        self.worker_count = 1
+        self.in_flight = 0
+        self.estimated_peak = 0
+        self._worker_peaks = {} # Process id -> peak memory
+
+    def plan_workers(self, worker_count, largest_cost):
+        """
+        Returns how many of worker_count workers fit in the budget, so that each of them can
+        still hold the largest job (largest_cost, a chunk of jobs for a pool). At least one worker
+        is always used.
+        """
+        while worker_count > 1 and \
+                self.reserved + worker_count * (self.worker_cost + self.cache_cost + largest_cost) > self.limit:
+            worker_count -= 1
+        self.worker_count = worker_count if worker_count > 1 else 0 # A single worker runs in this process
+        self.estimated_peak = self._fixed_cost() + largest_cost
+        return worker_count
+
+    def _fixed_cost(self):
+        if not self.worker_count:
+            return self.reserved + self.cache_cost
+        return self.reserved + self.worker_count * (self.worker_cost + self.cache_cost)
+
+    def admit(self, cost, busy):
+        """
+        Reserves cost if it fits next to the jobs in flight. A job is always admitted when
+        nothing else is running, even one larger than the budget, so a batch can't stall.
+        """
+        if busy and self._fixed_cost() + self.in_flight + cost > self.limit:
+            return False
+        self.in_flight += cost
+        self.estimated_peak = max(self.estimated_peak, self._fixed_cost() + self.in_flight)
+        return True
+
+    def release(self, cost):
+        self.in_flight -= cost
+
+    def record_peak(self, memory):
+        """Takes the (process id, peak memory) a worker reported with a JobResult."""
+        if memory is not None and memory[1] is not None:
+            self._worker_peaks[memory[0]] = max(memory[1], self._worker_peaks.get(memory[0], 0))
+
+    def peak_memory(self):
+        """
+        The peak memory of the run: this process plus every worker, each at its own peak.
+        None if it can't be measured on this platform.
+        """
+        own_peak = process_peak_memory()
+        if own_peak is None:
+            return None
+        return own_peak + sum(self._worker_peaks.values())
+
+    def summary(self, peak_memory):
+        megabyte = 1024 * 1024
+        line = f"Memory budget: {self.limit / megabyte:.0f} MB, estimated peak {self.estimated_peak / megabyte:.0f} MB"
+        if peak_memory is not None:
+            line += f", measured peak {peak_memory / megabyte:.0f} MB"
+            if peak_memory > self.limit:
+                line += " (over budget)"
+        return line + "\n"
+
+
+# --- Archives ---
+# A zip or tar archive can stand in for the source folder, the target folder or the output
+# folder of a batch. Members are read into memory and outputs are written into the archive
+# directly, so nothing is extracted to disk. zipfile and tarfile are imported when an archive
+# is opened, to keep the start-up of the command line fast.
+
+# Extensions of the tar formats and the compression tarfile uses for them.
+TAR_EXTENSIONS = {".tar": "", ".tar.gz": "gz", ".tgz": "gz", ".tar.bz2": "bz2", ".tbz2": "bz2",
+                  ".tar.xz": "xz", ".txz": "xz"}
+
+
+def _tar_compression(path):
+    lower = path.lower()
+    for extension, compression in TAR_EXTENSIONS.items():
+        if lower.endswith(extension):
+            return compression
+    return None
+
+
+def is_archive_path(path):
+    """Tells whether path names a zip or tar archive, going by its extension."""
+    return path.lower().endswith(".zip") or _tar_compression(path) is not None
+
+
+class JsonFolder:
+    """The .json files of a plain folder, with the same interface as JsonArchive."""
+    is_archive = False
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def names(self):
+        return list_json_files(self.path)
+
+    def member_path(self, name):
+        return os.path.join(self.path, name)
+
+    def member_size(self, name):
+        return os.path.getsize(self.member_path(name))
+
+    def read(self, path, limit=-1):
+        with open(path, 'rb') as f:
+            return f.read(limit)
+
+    def close(self):
+        pass
+
+
+class JsonArchive:
+    """
+    The .json files inside a zip or tar archive, used in place of a folder. Members are known
+    by their file name wherever they sit in the archive, and member_path() joins that name to
+    the archive path, which is how they appear in logs and results. read() returns a member's
+    bytes without extracting it. Zip members and those of an uncompressed tar are read directly.
+    A compressed tar can only be read front to back: reading a member out of order decompresses
+    the archive again from its start, and a batch reads members in its own order. So it is
+    decompressed once, when it is opened, and its .json members are spooled to a temporary
+    folder that close() removes.
+    """
+    is_archive = True
+
+    def __init__(self, path):
+        import zipfile, tarfile, shutil
+        self.path = path
+        self._lock = threading.Lock() # The pipeline's reader threads share the archive
+        self._members = {} # File name -> ZipInfo or TarInfo, in archive order
+        self._zip = self._tar = self._spool = None
+        try:
+            if path.lower().endswith(".zip"):
+                self._zip = zipfile.ZipFile(path)
+                for info in self._zip.infolist():
+                    if not info.is_dir():
+                        self._add_member(info.filename, info)
+            elif _tar_compression(path):
+                self._spool = tempfile.TemporaryDirectory(prefix="sdf-archive-")
+                with tarfile.open(path, 'r|' + _tar_compression(path)) as tar:
+                    for info in tar:
+                        if info.isfile() and self._add_member(info.name, info):
+                            with tar.extractfile(info) as src, open(self._spooled(info), 'wb') as dst:
+                                shutil.copyfileobj(src, dst)
+            else:
+                self._tar = tarfile.open(path, 'r:*')
+                for info in self._tar.getmembers():
+                    if info.isfile():
+                        self._add_member(info.name, info)
+        except BaseException:
+            self.close()
+            raise
+
+    def _add_member(self, member_name, info):
+        """Indexes a .json member by its file name; returns whether it is one."""
+        name = member_name.replace('\\', '/').rsplit('/', 1)[-1]
+        if not name.lower().endswith('.json'):
+            return False
+        if name in self._members:
+            raise ValueError(f"The archive contains more than one file named '{name}': {self.path}")
+        self._members[name] = info
+        return True
+
+    def _spooled(self, info):
+        return os.path.join(self._spool.name, f"{info.offset}.json")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def names(self):
+        return list(self._members)
+
+    def member_path(self, name):
+        return os.path.join(self.path, name)
+
+    def member_hash(self, name):
+        """
+        Identifies a member's content: a zip member by the CRC-32 in the archive index, without
+        reading it; a tar member, whose header only has its size and time, by hashing it.
+        """
+        info = self._members[name]
+        if self._zip is not None:
+            return f"zip:{info.CRC:08x}:{info.file_size}"
+        if self._spool is not None:
+            return "tar:" + hash_file(self._spooled(info))
+        digest = hashlib.sha256()
+        with self._lock, self._tar.extractfile(info) as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        return "tar:" + digest.hexdigest()
+
+    def member_size(self, name):
+        """The uncompressed size of a member."""
+        info = self._members[name]
+        return info.file_size if self._zip is not None else info.size
+
+    def read(self, path, limit=-1):
+        """Returns the bytes of a member, or only its first limit bytes."""
+        info = self._members[os.path.basename(path)]
+        if self._spool is not None:
+            with open(self._spooled(info), 'rb') as f:
+                return f.read(limit)
+        with self._lock:
+            if self._zip is not None:
+                if limit < 0:
+                    return self._zip.read(info)
+                with self._zip.open(info) as f:
+                    return f.read(limit)
+            with self._tar.extractfile(info) as f:
+                return f.read(limit)
+
+    def close(self):
+        archive = self._zip or self._tar
+        if archive is not None:
+            archive.close()
+        if self._spool is not None:
+            self._spool.cleanup()
+        self._zip = self._tar = self._spool = None
+
+
+def open_json_folder(path):
+    """Returns a JsonArchive if path is an archive file, otherwise a JsonFolder."""
+    if os.path.isfile(path) and is_archive_path(path):
+        return JsonArchive(path)
+    return JsonFolder(path)
+
+
+class ArchiveWriter:
+    """
+    Writes the outputs of a batch as members of a new zip or tar archive (the format follows the
+    extension of path), straight from memory. The archive is built in a temporary file next to
+    path and renamed into place when it is closed, like atomic_write.
+    """
+    def __init__(self, path):
+        import zipfile, tarfile
+        self.path = path
+        self._stack = contextlib.ExitStack()
+        f = self._stack.enter_context(atomic_write(path))
+        try:
+            if path.lower().endswith(".zip"):
+                self._zip = zipfile.ZipFile(f, 'w', compression=zipfile.ZIP_DEFLATED)
+                self._tar = None
+            else:
+                self._zip = None
+                self._tar = tarfile.open(fileobj=f, mode='w:' + _tar_compression(path))
+        except BaseException:
+            self._stack.__exit__(*sys.exc_info())
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            (self._zip or self._tar).close()
+        finally:
+            self._stack.__exit__(*exc_info)
+
+    def member_path(self, name):
+        return os.path.join(self.path, name)
+
+    def add(self, name, data):
+        if self._zip is not None:
+            import zipfile
+            info = zipfile.ZipInfo(name, time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            self._zip.writestr(info, data)
+        else:
+            import tarfile
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            self._tar.addfile(info, io.BytesIO(data))
+
+
+# --- Header Index ---
+# Multi-style batches pair each source with the target of the same font style (Regular with
+# Regular, Italic with Italic, ...). The style comes from a few fields near the start of each
+# file, which are read without parsing the glyph, character and kerning tables after them.
+
+# Bytes read from the start of a file to find its header fields. The whole file is only read
+# if they are not all within this prefix.
+HEADER_READ_SIZE = 64 * 1024
+# Threads reading headers at once; the reads are mostly waiting on the disk.
+HEADER_READER_COUNT = 8
+
+MATCH_BY_STYLE = "style"
+MATCH_BY_ORDER = "order" # The files of both folders are paired by their alphabetical order
+
+
+class FontHeader:
+    """The m_Name, m_FaceInfo.m_FamilyName and m_FaceInfo.m_StyleName of an asset; None where missing."""
+    __slots__ = ("name", "family_name", "style_name")
+
+    def __init__(self, name=None, family_name=None, style_name=None):
+        self.name = name
+        self.family_name = family_name
+        self.style_name = style_name
+
+    def is_complete(self):
+        return None not in (self.name, self.family_name, self.style_name)
+
+    def style_key(self):
+        """
+        The key the file is matched on: its style name, or the part of m_Name after the last
+        '-' ("Alegreya-Bold Italic SDF" -> "Bold Italic") if it has none. Case, spaces, '-'
+        and '_' are ignored. None if neither gives a style.
+        """
+        style = self.style_name
+        if not style and self.name and '-' in self.name:
+            style = self.name.rsplit('-', 1)[1]
+            if style.endswith(" SDF"):
+                style = style[:-4]
+        if not style:
+            return None
+        return re.sub(r'[\s_-]+', '', style).casefold() or None
+
+
+def _decode_string(buf, start, end):
+    value = json.loads(buf[start:end])
+    return value if isinstance(value, str) else None
+
+
+def read_font_header(buf):
+    """
+    Reads the FontHeader of the asset JSON in buf, stopping as soon as every field is found.
+    Raises JsonScanError if buf ends (or is malformed) before that, so a prefix of a file can
+    be tried first.
+    """
+    header = FontHeader()
+    start = json_root_offset(buf)
+    if buf[start:start + 1] != b'{':
+        return header
+    for key, value_start, value_end in iter_json_items(buf, start):
+        if key == "m_Name":
+            header.name = _decode_string(buf, value_start, value_end)
+        elif key == "m_FaceInfo" and buf[value_start:value_start + 1] == b'{':
+            for face_key, face_start, face_end in iter_json_items(buf, value_start):
+                if face_key == "m_FamilyName":
+                    header.family_name = _decode_string(buf, face_start, face_end)
+                elif face_key == "m_StyleName":
+                    header.style_name = _decode_string(buf, face_start, face_end)
+        if header.is_complete():
+            break
+    return header
+
+
+def read_file_header(folder, name):
+    """
+    Reads the FontHeader of a file of a JsonFolder or JsonArchive. Raises OSError if the file
+    can't be read and ValueError if it is not valid JSON.
+    """
+    path = folder.member_path(name)
+    buf = folder.read(path, HEADER_READ_SIZE)
+    try:
+        return read_font_header(buf)
+    except ValueError:
+        if len(buf) < HEADER_READ_SIZE:
+            raise
+    return read_font_header(folder.read(path))
+
+
+def _read_header_or_error(folder, name):
+    """(FontHeader, None), or (None, error message) if the file could not be read."""
+    try:
+        return read_file_header(folder, name), None
+    except OSError as e:
+        return None, f"Could not read the file: {e}"
+    except ValueError as e:
+        return None, f"Could not read the font style, not valid JSON: {e}"
+
+
+def index_font_headers(folder, names):
+    """
+    Reads the FontHeader of the given files of a folder, in parallel. Returns ({name: FontHeader},
+    {name: error message}); a file that could not be read is only in the second dict.
+    """
+    if len(names) < 2:
+        results = [_read_header_or_error(folder, name) for name in names]
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(min(HEADER_READER_COUNT, len(names))) as executor:
+            results = list(executor.map(lambda name: _read_header_or_error(folder, name), names))
+    headers = {}
+    errors = {}
+    for name, (header, error) in zip(names, results):
+        if error is None:
+            headers[name] = header
+        else:
+            errors[name] = error
+    return headers, errors
+
+
+def match_files_by_style(source_headers, target_headers):
+    """
+    Pairs source and target files that have the same style key, through a dict of the targets
+    by style. If several files on both sides share a style (e.g. two families in one folder),
+    they are paired in alphabetical order. Takes {name: FontHeader} for each side (see
+    index_font_headers; files that could not be read are left out of it and reported apart) and
+    returns (pairs, unmatched_sources, unmatched_targets), each sorted by source/target name.
+    """
+    targets_by_style = collections.defaultdict(collections.deque)
+    unmatched_targets = []
+    for name in sorted(target_headers):
+        header = target_headers[name]
+        style = header.style_key() if header is not None else None
+        if style is None:
+            unmatched_targets.append(name)
+        else:
+            targets_by_style[style].append(name)
+
+    pairs = []
+    unmatched_sources = []
+    for name in sorted(source_headers):
+        header = source_headers[name]
+        candidates = targets_by_style.get(header.style_key() if header is not None else None)
+        if candidates:
+            pairs.append((name, candidates.popleft()))
+        else:
+            unmatched_sources.append(name)
+    for candidates in targets_by_style.values():
+        unmatched_targets.extend(candidates)
+    return pairs, unmatched_sources, sorted(unmatched_targets)
+
+
+# --- Pre-flight Check ---
+# A batch can check all of its inputs before it patches anything: that each file is valid JSON
+# with an object at the top, that the rule paths it has hold the types the rules expect, and
+# that a source fits the template or target it is patched into wherever the rules reach. The
+# patch itself passes over such mismatches (update_json_recursively leaves a subtree alone if
+# the types differ), so without the check they show up as outputs quietly left unpatched, or
+# as failures after other files have been written. The files are checked by the worker pool;
+# nothing is encoded or written, and sources are only decoded as far as the rules need.
+
+CHECK_ERROR = "error"
+CHECK_WARNING = "warning"
+# Errors listed in the message of a PreflightError; the log has all of them.
+PREFLIGHT_ERRORS_SHOWN = 10
+
+
+class CheckProblem:
+    """One finding of the pre-flight check. path is the file it was found in."""
+    def __init__(self, severity, path, message):
+        self.severity = severity
+        self.path = path
+        self.message = message
+
+    def to_dict(self):
+        return {"severity": self.severity, "file": self.path, "message": self.message}
+
+
+class FileCheck:
+    """The problems found in one job of the pre-flight check, sent back by the worker."""
+    def __init__(self, problems=None):
+        self.problems = problems or []
+        self.memory = None # Set by _run_job_chunk, as for a JobResult
+
+    def add(self, severity, path, message):
+        self.problems.append(CheckProblem(severity, path, message))
+
+
+def _json_type(value):
+    if isinstance(value, dict):
+        return "an object"
+    if isinstance(value, list):
+        return "a list"
+    if isinstance(value, str):
+        return "a string"
+    if isinstance(value, bool):
+        return "a boolean"
+    if value is None:
+        return "null"
+    return "a number"
+
+
+def _format_path(path):
+    """('m_FontFeatureTable', 'm_GlyphPairAdjustmentRecords', 3) -> 'm_FontFeatureTable.m_GlyphPairAdjustmentRecords[3]'"""
+    text = ""
+    for key in path:
+        text += f"[{key}]" if isinstance(key, int) else (f".{key}" if text else key)
+    return text
+
+
+def _load_document(buf, path, role, plan, check):
+    """
+    Loads the bytes of a file for the pre-flight check the way the patch will: a source with
+    the subset reader of load_source_data, a target whole. Loading it is also the check that
+    it is well-formed. Returns the loaded document, or None if it can't be patched at all.
+    """
+    try:
+        data = _load_source_buffer(buf, plan) if role == "source" else json.loads(buf)
+    except ValueError as e:
+        check.add(CHECK_ERROR, path, f"Not valid JSON: {e}")
+        return None
+    if not isinstance(data, dict):
+        check.add(CHECK_ERROR, path, f"The {role} is {_json_type(data)}, not an object")
+        return None
+    return data
+
+
+def _check_document(buf, path, role, plan, check):
+    """_load_document, followed by the checks that need only this file."""
+    data = _load_document(buf, path, role, plan, check)
+    if data is not None:
+        _check_rule_paths(data, path, role, plan, check, buf)
+    return data
+
+
+def _find_keys(node, keys):
+    """Returns the keys of keys that are found anywhere in node, a decoded JSON document."""
+    found = set()
+    stack = [node]
+    while stack and len(found) < len(keys):
+        node = stack.pop()
+        if isinstance(node, dict):
+            found.update(key for key in node if key in keys)
+            stack.extend(value for value in node.values() if isinstance(value, (dict, list)))
+        elif isinstance(node, list):
+            stack.extend(value for value in node if isinstance(value, (dict, list)))
+    return found
+
+
+def _check_rule_paths(data, path, role, plan, check, buf=None):
+    """
+    Checks that the rule keys are found in the file, and that the paths of the array rules lead
+    through objects to a list. Array rule paths are followed from the top level, where
+    TextMeshPro keeps them. data is the loaded document. If buf holds its bytes, the keys are
+    looked for there, and data is only searched if buf has escapes that could spell a key
+    (see PatchPlan.may_contain_source_key).
+    """
+    missing = sorted(plan.replace_keys)
+    if buf is not None:
+        missing = [key for key in missing if json.dumps(key, ensure_ascii=False).encode('utf-8') not in buf]
+    if missing and (buf is None or b'\\u' in buf or b'\\/' in buf):
+        found = _find_keys(data, frozenset(missing))
+        missing = [key for key in missing if key not in found]
+    for key in missing:
+        check.add(CHECK_WARNING, path, f"No '{key}' in the {role}; its rule does nothing for it")
+    for key, array_path in sorted(plan.array_paths.items()):
+        if array_path is None:
+            continue
+        full_path = (key,) + array_path
+        value = data
+        for depth, path_key in enumerate(full_path):
+            if not isinstance(value, dict):
+                check.add(CHECK_ERROR, path, f"'{_format_path(full_path[:depth])}' is {_json_type(value)} "
+                                             f"in the {role}, not an object")
+                break
+            if path_key not in value:
+                if depth:
+                    check.add(CHECK_WARNING, path, f"No '{_format_path(full_path[:depth + 1])}' in the {role}; "
+                                                   f"the '{key}' rule skips it")
+                else:
+                    check.add(CHECK_WARNING, path, f"No '{key}' in the {role}; its rule does nothing for it")
+                break
+            value = value[path_key]
+        else:
+            if not isinstance(value, list):
+                check.add(CHECK_ERROR, path, f"'{_format_path(full_path)}' is {_json_type(value)} "
+                                             f"in the {role}, not a list")
+
+
+def _check_compatible(target_node, source_node, plan, path, target_role, report):
+    """
+    Walks a source (as loaded for patching) and its target the way update_json_recursively
+    does and calls report(message) wherever the two don't fit: where the patch would pass over
+    a subtree because the types differ, or where a value rule would change a value's type.
+    """
+    if not isinstance(target_node, type(source_node)):
+        report(f"'{_format_path(path) or 'top level'}' is {_json_type(source_node)} in the source but "
+               f"{_json_type(target_node)} in the {target_role}; the patch leaves it unchanged")
+        return
+    if isinstance(target_node, dict):
+        for key, target_value in target_node.items():
+            if key not in source_node or key in plan.array_paths: # Array rules: see _check_rule_paths
+                continue
+            source_value = source_node[key]
+            if key in plan.replace_keys:
+                if _json_type(target_value) != _json_type(source_value):
+                    report(f"'{_format_path(path + (key,))}' is {_json_type(source_value)} in the source but "
+                           f"{_json_type(target_value)} in the {target_role}")
+            elif isinstance(target_value, (dict, list)) or isinstance(source_value, (dict, list)):
+                _check_compatible(target_value, source_value, plan, path + (key,), target_role, report)
+    elif isinstance(target_node, list):
+        for start, end in plan.list_ranges(target_node, source_node, min(len(target_node), len(source_node))):
+            for i in range(start, end):
+                if isinstance(target_node[i], (dict, list)) or isinstance(source_node[i], (dict, list)):
+                    _check_compatible(target_node[i], source_node[i], plan, path + (i,), target_role, report)
+
+
+def _check_source(source_path, target_data, target_role, plan, files, check):
+    """The checks of a source file and of its fit with target_data, shared by both check functions."""
+    source_data = _check_document(files[source_path], source_path, "source", plan, check)
+    if source_data is not None and target_data is not None:
+        _check_compatible(target_data, source_data, plan, (), target_role,
+                          lambda message: check.add(CHECK_ERROR, source_path, message))
+
+
+def check_file_with_template(source_path, plan=None, files=None):
+    """
+    Pre-flight check of one source file of a One-style batch against the worker's template
+    (see _init_template_worker). files optionally maps the path to its bytes. Returns a FileCheck.
+    """
+    check = FileCheck()
+    try:
+        _check_source(source_path, _worker_template, "template", plan or DEFAULT_PATCH_PLAN,
+                      files or _read_files([source_path]), check)
+    except OSError as e:
+        check.add(CHECK_ERROR, source_path, f"Could not read the file: {e}")
+    return check
+
+
+def check_file_pair(source_path, target_path, plan=None, files=None):
+    """
+    Pre-flight check of a source file and its matched target file, see check_file_with_template.
+    Each file is loaded once, the way the patch loads it. Either path can be None for a file
+    left without a partner, which is only checked for being a JSON object.
+    """
+    plan = plan or DEFAULT_PATCH_PLAN
+    check = FileCheck()
+    paths = [path for path in (source_path, target_path) if path is not None]
+    try:
+        files = files or _read_files(paths)
+        if target_path is None or source_path is None:
+            _load_document(files[paths[0]], paths[0], "source" if target_path is None else "target", plan, check)
+            return check
+        target_data = _check_document(files[target_path], target_path, "target", plan, check)
+        _check_source(source_path, target_data, f"target ({os.path.basename(target_path)})", plan, files, check)
+    except OSError as e:
+        check.add(CHECK_ERROR, paths[0], f"Could not read the files: {e}")
+    return check
+
+
+def check_template(template_path, template_data, plan=None):
+    """
+    The pre-flight checks of a One-style template that need only the template, on the template
+    as already loaded for the batch. Returns a FileCheck.
+    """
+    check = FileCheck()
+    if not isinstance(template_data, dict):
+        check.add(CHECK_ERROR, template_path, f"The template is {_json_type(template_data)}, not an object")
+        return check
+    _check_rule_paths(template_data, template_path, "template", plan or DEFAULT_PATCH_PLAN, check)
+    return check
+
+
+class PreflightReport:
+    """The problems found by run_preflight_check. The batch stops before patching if there is an error."""
+    def __init__(self, file_count):
+        self.file_count = file_count
+        self.problems = []
+        self.elapsed = 0.0
+        self.cancelled = False
+
+    def add(self, check):
+        self.problems.extend(check.problems)
+
+    @property
+    def errors(self):
+        return [problem for problem in self.problems if problem.severity == CHECK_ERROR]
+
+    @property
+    def warnings(self):
+        return [problem for problem in self.problems if problem.severity == CHECK_WARNING]
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def format(self):
+        """The report as log text: every error, and each distinct warning once with the number of files it applies to."""
+        errors = self.errors
+        warnings = self.warnings
+        lines = [f"--- Pre-flight check of {self.file_count} input(s): {len(errors)} error(s), "
+                 f"{len(warnings)} warning(s), {self.elapsed:.2f} s ---\n"]
+        lines.extend(f"Error in {problem.path}: {problem.message}\n" for problem in errors)
+        paths_by_warning = {}
+        for problem in warnings:
+            paths_by_warning.setdefault(problem.message, []).append(problem.path)
+        for message, paths in paths_by_warning.items():
+            where = paths[0] if len(paths) == 1 else f"{len(paths)} files (e.g. {os.path.basename(paths[0])})"
+            lines.append(f"Warning in {where}: {message}\n")
+        if self.cancelled:
+            lines.append("The check was cancelled before every file was checked.\n")
+        return "".join(lines)
+
+    def to_dict(self):
+        return {
+            "files": self.file_count,
+            "errors": len(self.errors),
+            "warnings": len(self.warnings),
+            "elapsed": round(self.elapsed, 3),
+            "cancelled": self.cancelled,
+            "problems": [problem.to_dict() for problem in self.problems],
+        }
+
+
+def run_preflight_check(func, jobs, worker_count=DEFAULT_WORKER_COUNT, chunk_size=DEFAULT_CHUNK_SIZE,
+                        initializer=None, initargs=(), cancel_event=None, read_inputs=None, report=None):
+    """
+    Runs the check function func (check_file_with_template or check_file_pair) for every job
+    on a process pool, like run_batch_jobs, and collects the problems in a PreflightReport
+    (report, if one is given, e.g. with the template's problems already in it).
+    """
+    start_time = time.perf_counter()
+    jobs = list(jobs)
+    if report is None:
+        report = PreflightReport(len(jobs))
+    checks = run_batch_jobs(func, jobs, worker_count, chunk_size, initializer, initargs, cancel_event, read_inputs)
+    for job, check in zip(jobs, checks):
+        if isinstance(check, JobResult): # An archive member that could not be read
+            check = FileCheck([CheckProblem(CHECK_ERROR, job[0] if job[0] is not None else job[1], check.error)])
+        report.add(check)
+    report.elapsed = time.perf_counter() - start_time
+    report.cancelled = cancel_event is not None and cancel_event.is_set()
+    return report
+
+
+# --- Incremental Runs ---
+
+# Name of the manifest kept in an output folder. It has no .json extension, so it is
+# never picked up as an input if the output folder is used as a source folder later.
+MANIFEST_FILENAME = ".sdf_patch_manifest"
+MANIFEST_VERSION = 1
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    """Returns the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """
+    Remembers, for each file in an output folder, the content hashes of the source, the target
+    and the rule set it was built from, and the hash of the output itself. A re-run can skip a
+    file whose inputs hash the same and whose output is still the one that was written.
+    Hashes are cached by file size and modification time, so unchanged files are not read again.
+    Members of input archives are identified by JsonArchive.member_hash instead (see add_archive).
+    """
+    def __init__(self, output_folder):
+        self.path = os.path.join(output_folder, MANIFEST_FILENAME)
+        self.entries = {}
+        self._hash_cache = {}
+        self._used_hashes = {}
+        self._member_hashes = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.entries = data["files"]
+                self._hash_cache = data["hashes"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass # Missing or unreadable manifest: everything is rebuilt
+
+    def add_archive(self, archive):
+        """Lets the members of a JsonArchive be used as inputs, identified by JsonArchive.member_hash."""
+        for name in archive.names():
+            self._member_hashes[archive.member_path(name)] = archive.member_hash(name)
+
+    def file_hash(self, path):
+        """Returns the content hash of path, or None if it can't be read."""
+        if path in self._member_hashes:
+            return self._member_hashes[path]
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+            cached = self._used_hashes.get(path) or self._hash_cache.get(path)
+            if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+                digest = cached[2]
+            else:
+                digest = hash_file(path)
+        except OSError:
+            return None
+        self._used_hashes[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def input_key(self, source_path, target_path, rules):
+        """The hashes an output depends on. rules identifies the rule set and output options."""
+        return [self.file_hash(source_path), self.file_hash(target_path), rules]
+
+    def is_up_to_date(self, output_path, input_key):
+        entry = self.entries.get(os.path.basename(output_path))
+        if entry is None or None in input_key or entry["inputs"] != input_key:
+            return False
+        return os.path.exists(output_path) and self.file_hash(output_path) == entry["output"]
+
+    def record(self, output_path, input_key):
+        self.entries[os.path.basename(output_path)] = {"inputs": input_key, "output": self.file_hash(output_path)}
+
+    def forget(self, output_path):
+        self.entries.pop(os.path.basename(output_path), None)
+
+    def save(self):
+        # Only the hashes of files used in this run are kept, so the cache can't grow forever.
+        data = {"version": MANIFEST_VERSION, "files": self.entries, "hashes": self._used_hashes}
+        with atomic_write(self.path, encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+
+class NullManifest:
+    """Stands in for a BuildManifest when the output is an archive, which is always rebuilt whole."""
+    def add_archive(self, archive):
+        pass
+
+    def input_key(self, source_path, target_path, rules):
+        return []
+
+    def is_up_to_date(self, output_path, input_key):
+        return False
+
+    def record(self, output_path, input_key):
+        pass
+
+    def forget(self, output_path):
+        pass
+
+    def save(self):
+        pass
+
+
+def _manifest_rules(splice, plan=None, output_format=OUTPUT_PRETTY):
+    """The rules part of a manifest input key: the rule set and the output options."""
+    return ((plan or DEFAULT_PATCH_PLAN).fingerprint + (":splice" if splice else "")
+            + (f":{output_format}" if output_format != OUTPUT_PRETTY else ""))
+
+
+# --- Batch Modes ---
+# The three modes of the GUI, usable without it. They report through an optional event sink:
+# any object with a put(event) method, such as a queue.Queue. The events are ("log", text),
+# ("progress", done, total) and ("file", result), where result is a FileResult.
+
+class PatchError(Exception):
+    """
+    Raised when a mode cannot run at all (an input can't be read, the folders don't match, ...).
+    The message is meant for the user; title is a short heading for it, and warning tells
+    whether the problem is a mere warning (e.g. an empty folder) rather than an error.
+    """
+    def __init__(self, title, message, warning=False):
+        super().__init__(message)
+        self.title = title
+        self.warning = warning
+
+
+class PreflightError(PatchError):
+    """Raised by the batch modes when the pre-flight check finds an error; report is the PreflightReport."""
+    def __init__(self, report):
+        errors = report.errors
+        listed = "".join(f"\n{os.path.basename(problem.path)}: {problem.message}" for problem in errors[:PREFLIGHT_ERRORS_SHOWN])
+        more = f"\n... and {len(errors) - PREFLIGHT_ERRORS_SHOWN} more (see the log)" if len(errors) > PREFLIGHT_ERRORS_SHOWN else ""
+        super().__init__("Pre-flight Check Failed",
+                         f"{len(errors)} problem(s) were found before patching; no file was written.\n{listed}{more}")
+        self.report = report
+
+
+class NullEvents:
+    """An event sink that drops every event."""
+    def put(self, event):
+        pass
+
+
+class FileResult:
+    """The outcome for one output file, sent as a ("file", result) event."""
+    def __init__(self, source_path, target_path, output_path, success, error=None, skipped=False, unchanged=False):
+        self.source_path = source_path
+        self.target_path = target_path
+        self.output_path = output_path
+        self.success = success
+        self.error = error
+        self.skipped = skipped # Output was already up to date (see BuildManifest)
+        self.unchanged = unchanged # Patched, but the output already held the same bytes and was not rewritten
+
+    def to_dict(self):
+        return {
+            "source": self.source_path,
+            "target": self.target_path,
+            "output": self.output_path,
+            "success": self.success,
+            "error": self.error,
+            "skipped": self.skipped,
+            "unchanged": self.unchanged,
+        }
+
+
+class BatchResult:
+    """
+    Totals returned by run_batch_template and run_batch_map.
+    processed counts every file that is up to date at the end, including the skipped ones
+    and the unchanged ones (patched, but not rewritten because the output already held the result).
+    """
+    def __init__(self, total):
+        self.total = total
+        self.processed = 0
+        self.skipped = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.cancelled = False
+        self.elapsed = 0.0
+        self.fragments_reused = 0 # Large arrays taken from the encoded-fragment cache
+        self.fragments_encoded = 0
+        self.unmatched_sources = [] # Multi-style files left without a partner, by path
+        self.unmatched_targets = []
+        self.unreadable = {} # Multi-style files whose font style could not be read: {path: error message}
+        self.memory_budget = None # Bytes, if the run had a memory budget
+        self.peak_memory = None # Measured peak of the run's processes, with a memory budget
+        self.preflight = None # The PreflightReport, if the inputs were checked first
+
+    def add_fragments(self, fragments):
+        self.fragments_reused += fragments[0]
+        self.fragments_encoded += fragments[1]
+
+    def unchanged_summary(self):
+        if not self.unchanged:
+            return ""
+        return f" ({self.unchanged} identical to the existing output, not rewritten)"
+
+    def fragment_summary(self):
+        total = self.fragments_reused + self.fragments_encoded
+        if not total:
+            return ""
+        return (f"Encoded-fragment cache: reused {self.fragments_reused} of {total} large arrays "
+                f"({self.fragments_reused / total:.0%} hit rate)\n")
+
+    def to_dict(self):
+        return {
+            "total": self.total,
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "unchanged": self.unchanged,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "elapsed": round(self.elapsed, 3),
+            "fragments_reused": self.fragments_reused,
+            "fragments_encoded": self.fragments_encoded,
+            "unmatched_sources": self.unmatched_sources,
+            "unmatched_targets": self.unmatched_targets,
+            "unreadable": self.unreadable,
+            "memory_budget": self.memory_budget,
+            "peak_memory": self.peak_memory,
+            "preflight": self.preflight.to_dict() if self.preflight is not None else None,
+        }
+
+
+class PatchedFile:
+    """
+    A target file patched in memory by patch_single_file, waiting to be saved.
+    trace is the FileTrace of the run (NO_TRACE if it is not profiled); save() adds its write phase.
+    output_format is the JsonFormat it is saved in, plan the PatchPlan it was patched with.
+    """
+    def __init__(self, data, layout=None, changes=None, trace=NO_TRACE, output_format=PRETTY_FORMAT, plan=None):
+        self.data = data
+        self.layout = layout
+        self.changes = changes
+        self.trace = trace
+        self.output_format = output_format
+        self.plan = plan
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def save(self, output_path, log_area):
+        """Saves the file; returns False if output_path already held the same bytes and was left untouched."""
+        with self.trace.phase("write"):
+            changed = write_patched_file(output_path, self.data, log_area, self.layout, self.changes,
+                                         output_format=self.output_format, plan=self.plan)[2]
+        if changed:
+            self.trace.wrote(output_path)
+        return changed
+
+    def close(self):
+        if self.layout is not None:
+            self.layout.close()
+
+
+def patch_single_file(source_path, target_path, events=None, splice=False, profile=None, merge=False,
+                      output_format=OUTPUT_PRETTY, rule_profile=DEFAULT_RULE_PROFILE):
+    """
+    Patches one target file with one source file and returns the result as a PatchedFile.
+    With splice, saving it splices the changes into the original target bytes.
+    profile, if given, is a BatchProfile that receives the trace of the file.
+    With merge, arrays with keyed records (kerning pairs, ...) are merged record by record
+    instead of replaced whole (see merge_keyed_records).
+    output_format is one of OUTPUT_FORMATS; OUTPUT_PRESERVE keeps the format of the target file.
+    rule_profile is the rule profile to patch with: a name from list_rule_profiles or the path
+    of a profile file (see load_rule_profile).
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    if events is None:
+        events = NullEvents()
+    log = QueueLog(events)
+    plan = _load_plan(rule_profile, merge, log)
+    trace = _new_trace(os.path.basename(target_path), profile and profile.profile)
+    if profile is not None:
+        profile.add(trace)
+    layout = None
+    try:
+        with trace.phase("load source"):
+            source_data = load_source_data(source_path, plan)
+        trace.read(source_path)
+        log.insert(END, f"Loaded source file: {source_path}\n")
+        with trace.phase("load target"):
+            if splice:
+                layout = JsonLayout(target_path)
+                target_data = layout.load()
+                json_format = layout.format if output_format == OUTPUT_PRESERVE else output_format_for(output_format)
+            else:
+                with open(target_path, 'r', encoding='utf-8') as f: target_data = json.load(f)
+                json_format = output_format_for(output_format, read_format_head(target_path)
+                                                if output_format == OUTPUT_PRESERVE else None)
+        trace.read(target_path)
+        log.insert(END, f"Loaded target file: {target_path}\n")
+    except Exception as e:
+        if layout is not None:
+            layout.close()
+        log.insert(END, f"Error loading files: {e}\n")
+        raise PatchError("File Read Error", f"Could not read or parse one of the JSON files:\n{e}") from e
+
+    patched = PatchedFile(target_data, layout, [] if splice else None, trace, json_format, plan)
+    try:
+        log.insert(END, "\n--- Starting update process ---\n")
+        stats = PatchStats()
+        with trace.phase("patch"):
+            update_json_recursively(target_data, source_data, log, plan, stats, patched.changes)
+        log.insert(END, stats.summary())
+        trace.add_stats(stats)
+        log.insert(END, "--- Update process finished ---\n\n")
+    except BaseException:
+        patched.close()
+        raise
+    events.put(("progress", 1, 1))
+    return patched
+
+
+def _skip_up_to_date(manifest, outputs, rules, force, log, events, result):
+    """
+    Checks each (source_path, target_path, output_path) of outputs against the manifest,
+    for the rules given by _manifest_rules.
+    Up-to-date outputs are logged, reported and counted in result; returns the manifest input
+    keys of the others, in order (None for the up-to-date ones).
+    """
+    input_keys = []
+    for source_path, target_path, output_path in outputs:
+        input_key = manifest.input_key(source_path, target_path, rules)
+        if not force and manifest.is_up_to_date(output_path, input_key):
+            result.skipped += 1
+            result.processed += 1
+            log.insert(END, f"Up to date, skipped: {os.path.basename(output_path)}\n")
+            events.put(("file", FileResult(source_path, target_path, output_path, True, skipped=True)))
+            events.put(("progress", result.skipped, result.total))
+            input_key = None
+        input_keys.append(input_key)
+    return input_keys
+
+
+def _schedule_by_memory(budget, pending, job_costs, worker_count, chunk_size, log):
+    """
+    Orders the pending jobs of a batch largest first and fits the worker count to the budget,
+    so that every worker can hold the first chunk of chunk_size jobs, the largest.
+    Returns (pending, job_costs, worker_count).
+    """
+    order = sorted(range(len(pending)), key=lambda i: -job_costs[i])
+    pending = [pending[i] for i in order]
+    job_costs = [job_costs[i] for i in order]
+    largest = job_costs[0] if job_costs else 0
+    planned = budget.plan_workers(worker_count, _chunk_memory(job_costs[:max(1, chunk_size)]) if job_costs else 0)
+    megabyte = 1024 * 1024
+    log.insert(END, f"Memory budget {budget.limit / megabyte:.0f} MB: the largest file needs about "
+                    f"{largest / megabyte:.0f} MB; starting with the largest files, using {planned} worker process(es).\n")
+    if budget.estimated_peak > budget.limit:
+        log.insert(END, "Warning: the largest file alone is estimated to exceed the memory budget.\n")
+    return pending, job_costs, planned
+
+
+def _finish_memory_budget(budget, result, log):
+    if budget is None:
+        return
+    result.memory_budget = budget.limit
+    result.peak_memory = budget.peak_memory()
+    log.insert(END, budget.summary(result.peak_memory))
+
+
+def _preflight(func, jobs, worker_count, chunk_size, initializer, initargs, cancel_event, read_inputs, report, log):
+    """Runs the pre-flight check of a batch and logs its report. Raises PreflightError if it found an error."""
+    log.insert(END, "Checking every input before patching...\n")
+    report = run_preflight_check(func, jobs, worker_count, chunk_size, initializer, initargs, cancel_event,
+                                 read_inputs, report)
+    log.insert(END, report.format())
+    if not report.ok:
+        raise PreflightError(report)
+    return report
+
+
+def _open_input_folder(path, title):
+    """open_json_folder for a batch mode, turning a missing folder or bad archive into a PatchError."""
+    if not (os.path.isdir(path) or os.path.isfile(path) and is_archive_path(path)):
+        raise PatchError(title, f"Not a folder or archive: {path}")
+    try:
+        return open_json_folder(path)
+    except Exception as e:
+        raise PatchError(title, f"Could not open the archive:\n{e}") from e
+
+
+def _open_output(output_folder, log):
+    """Returns the manifest and, if output_folder is an archive, the ArchiveWriter for a batch."""
+    if not is_archive_path(output_folder):
+        if not os.path.isdir(output_folder):
+            raise PatchError("Output Error", f"Not a folder or archive: {output_folder}")
+        return BuildManifest(output_folder), None
+    log.insert(END, f"Writing into the archive {output_folder}; every file is rebuilt.\n")
+    try:
+        return NullManifest(), ArchiveWriter(output_folder)
+    except Exception as e:
+        raise PatchError("Output Error", f"Could not create the output archive:\n{e}") from e
+
+
+def _store_output(archive, output_path, job_result):
+    """Adds a result written to memory to the output archive. Returns the error message, if any."""
+    if archive is None or not job_result.success:
+        return job_result.error
+    try:
+        archive.add(os.path.basename(output_path), job_result.output_data)
+    except Exception as e:
+        job_result.success = False
+        return f"Could not add it to the output archive: {e}"
+    return None
+
+
+def _load_plan(rule_profile, merge, log):
+    """The PatchPlan of a run: the rule profile (see load_rule_profile), with merge."""
+    try:
+        plan = load_rule_profile(rule_profile)
+    except RuleProfileError as e:
+        log.insert(END, f"Error: {e}\n")
+        raise PatchError("Rule Profile Error", str(e)) from e
+    if plan is not DEFAULT_PATCH_PLAN:
+        log.insert(END, f"Using rule profile '{plan.name}'" + (f": {plan.description}" if plan.description else "") + "\n")
+    return plan.with_merge(merge)
+
+
+def _template_format(template_path, output_format):
+    """The JsonFormat of the outputs of a One-style batch (see output_format_for)."""
+    if output_format != OUTPUT_PRESERVE:
+        return output_format_for(output_format)
+    try:
+        return output_format_for(output_format, read_format_head(template_path))
+    except OSError as e:
+        raise PatchError("Target File Error", f"Could not read the target template file:\n{e}") from e
+
+
+def _load_template(template_path, log):
+    try:
+        with open(template_path, 'r', encoding='utf-8') as f:
+            template_data = json.load(f)
+    except Exception as e:
+        log.insert(END, f"Error loading target template: {e}\n")
+        raise PatchError("Target File Error", f"Could not read or parse the target template file:\n{e}") from e
+    log.insert(END, f"Loaded target template file: {template_path}\n\n")
+    return template_data
+
+
+def run_batch_template(source_folder, template_path, output_folder, events=None, worker_count=DEFAULT_WORKER_COUNT,
+                       chunk_size=DEFAULT_CHUNK_SIZE, splice=False, cancel_event=None, force=False, profile=None,
+                       memory_budget=None, merge=False, preflight=False, output_format=OUTPUT_PRETTY,
+                       rule_profile=DEFAULT_RULE_PROFILE):
+    """
+    One-style batch: patches a copy of the template file with every source file in source_folder
+    and saves each result in output_folder under the source file's name. Returns a BatchResult.
+    source_folder and output_folder can also be zip or tar archives (see JsonArchive, ArchiveWriter).
+    Files whose source, template and rules are unchanged since the last run into output_folder
+    are skipped (see BuildManifest), unless force is set. profile, if given, is a BatchProfile
+    that receives the trace of every file; its summary is added to the log.
+    memory_budget (bytes), if given, limits the workers and the files in flight to what is
+    estimated to fit in it and processes the largest files first (see MemoryBudget); the
+    measured peak is reported in the result. merge works as in patch_single_file.
+    With preflight, every source that is not up to date is checked against the template first
+    (see run_preflight_check), and the batch stops with a PreflightError before anything is
+    patched or written if a problem is found.
+    output_format is one of OUTPUT_FORMATS; OUTPUT_PRESERVE keeps the format of the template.
+    rule_profile works as in patch_single_file.
+    """
+    if events is None:
+        events = NullEvents()
+    log = QueueLog(events)
+    plan = _load_plan(rule_profile, merge, log)
+    with profile.phase("load template") if profile is not None else _NULL_PHASE:
+        template_data = _load_template(template_path, log)
+        json_format = _template_format(template_path, output_format)
+
+    log.insert(END, f"--- Starting batch process for folder: {source_folder} ---\n")
+    with contextlib.ExitStack() as stack:
+        sources = stack.enter_context(_open_input_folder(source_folder, "Source Folder Error"))
+        source_files = sources.names()
+
+        if not source_files:
+            log.insert(END, "No .json files found in the source folder.\n")
+            raise PatchError("Warning", "The source folder contains no .json files.", warning=True)
+
+        result = BatchResult(len(source_files))
+        manifest, archive = _open_output(output_folder, log)
+        if archive is not None:
+            stack.enter_context(archive)
+        events.put(("progress", 0, result.total))
+        start_time = time.perf_counter()
+
+        if sources.is_archive:
+            manifest.add_archive(sources)
+        outputs = [(sources.member_path(filename), template_path, os.path.join(output_folder, filename))
+                   for filename in source_files]
+        with profile.phase("check manifest") if profile is not None else _NULL_PHASE:
+            input_keys = _skip_up_to_date(manifest, outputs, _manifest_rules(splice, plan, output_format), force, log,
+                                          events, result)
+        pending = [(filename, output, input_key) for filename, output, input_key in zip(source_files, outputs, input_keys)
+                   if input_key is not None]
+        budget = job_costs = None
+        if memory_budget is not None:
+            template_size = os.path.getsize(template_path)
+            template_cost = template_size * (1 + PARSE_MEMORY_RATIO)
+            budget = MemoryBudget(memory_budget, WORKER_BASE_MEMORY + template_cost, WORKER_BASE_MEMORY + template_cost)
+            job_costs = [estimate_job_memory([sources.member_size(filename)], template_size) for filename, _, _ in pending]
+            pending, job_costs, worker_count = _schedule_by_memory(budget, pending, job_costs, worker_count,
+                                                                   chunk_size, log)
+        log.insert(END, f"Using {worker_count} worker process(es), chunk size {chunk_size}.\n")
+
+        read_inputs = (lambda job: {job[0]: sources.read(job[0])}) if sources.is_archive else None
+        if preflight and pending:
+            with profile.phase("pre-flight check") if profile is not None else _NULL_PHASE:
+                report = PreflightReport(len(pending) + 1)
+                report.add(check_template(template_path, template_data, plan))
+                result.preflight = _preflight(check_file_with_template, [(output[0], plan) for _, output, _ in pending],
+                                              worker_count, chunk_size, _init_template_worker, (template_data,),
+                                              cancel_event, read_inputs, report, log)
+
+        jobs = [(source_path, output_path, splice, profile and profile.profile, archive is not None, plan, json_format)
+                for _, (source_path, _, output_path), _ in pending]
+        results = run_batch_jobs(patch_file_with_template, jobs, worker_count, chunk_size, _init_template_worker,
+                                 (template_data, template_path if splice else None), cancel_event, read_inputs,
+                                 budget, job_costs)
+
+        try:
+            for done, ((filename, (source_path, _, output_path), input_key), job_result) in \
+                    enumerate(zip(pending, results), result.skipped + 1):
+                log.insert(END, f"\n--- Processing: {filename} ---\n{job_result.log_text}")
+                error = _store_output(archive, output_path, job_result)
+                if job_result.success:
+                    if job_result.unchanged:
+                        log.insert(END, f"Unchanged, not rewritten: {output_path}\n")
+                        result.unchanged += 1
+                    else:
+                        log.insert(END, f"Successfully saved to: {output_path}\n")
+                    result.processed += 1
+                    manifest.record(output_path, input_key)
+                else:
+                    log.insert(END, f"!!! FAILED to process {filename}: {error}\n")
+                    result.failed += 1
+                    manifest.forget(output_path)
+                result.add_fragments(job_result.fragments)
+                if profile is not None:
+                    profile.add(job_result.trace)
+                events.put(("file", FileResult(source_path, template_path, output_path, job_result.success, error,
+                                               unchanged=job_result.unchanged)))
+                events.put(("progress", done, result.total))
+        finally:
+            manifest.save()
+
+    result.elapsed = time.perf_counter() - start_time
+    result.cancelled = cancel_event is not None and cancel_event.is_set()
+    log.insert(END, f"\nElapsed time: {result.elapsed:.2f} s\n")
+    log.insert(END, f"Up to date (skipped): {result.skipped}, rebuilt: {result.processed - result.skipped}"
+                    f"{result.unchanged_summary()}\n")
+    log.insert(END, result.fragment_summary())
+    _finish_memory_budget(budget, result, log)
+    if profile is not None:
+        log.insert(END, profile.summary_table())
+    if result.cancelled:
+        log.insert(END, f"\n--- Batch process cancelled. Processed {result.processed} of {result.total} files. ---\n")
+    else:
+        log.insert(END, f"\n--- Batch process finished. Processed {result.processed} of {result.total} files. ---\n")
+    return result
+
+
+def _match_folders(sources, source_files, targets, target_files, match, log):
+    """
+    Returns the (source, target) file name pairs of a Multi-style batch, the unmatched files of
+    each side, and {path: error message} for the files whose font style could not be read.
+    """
+    if match == MATCH_BY_ORDER:
+        if len(source_files) != len(target_files):
+            log.insert(END, f"Error: File count mismatch. Source: {len(source_files)}, Target: {len(target_files)}.\n")
+            raise PatchError("File Count Mismatch",
+                f"The number of .json files does not match!\n\n"
+                f"Source Folder: {len(source_files)} files\n"
+                f"Target Folder: {len(target_files)} files\n\n"
+                "Please ensure both folders contain the same number of JSON files to be matched.")
+        return list(zip(source_files, target_files)), [], [], {}
+
+    log.insert(END, "Reading the font style of every file...\n")
+    source_headers, source_errors = index_font_headers(sources, source_files)
+    target_headers, target_errors = index_font_headers(targets, target_files)
+    unreadable = {}
+    for folder, errors in ((sources, source_errors), (targets, target_errors)):
+        for name, error in sorted(errors.items()):
+            unreadable[folder.member_path(name)] = error
+    for path, error in unreadable.items():
+        log.insert(END, f"Error: {path} is left out. {error}\n")
+    pairs, unmatched_sources, unmatched_targets = match_files_by_style(source_headers, target_headers)
+    if unmatched_sources:
+        log.insert(END, f"Warning: {len(unmatched_sources)} source file(s) have no target file of the same style "
+                        f"and are left out: {', '.join(unmatched_sources)}\n")
+    if unmatched_targets:
+        log.insert(END, f"Warning: {len(unmatched_targets)} target file(s) have no source file of the same style "
+                        f"and are left out: {', '.join(unmatched_targets)}\n")
+    if not pairs:
+        raise PatchError("No Matching Files",
+            "No source file has a target file of the same font style (m_FaceInfo.m_StyleName).\n\n"
+            f"Source Folder: {len(source_files)} files\n"
+            f"Target Folder: {len(target_files)} files"
+            + (f"\n\n{len(unreadable)} file(s) could not be read (see the log)." if unreadable else ""))
+    return pairs, unmatched_sources, unmatched_targets, unreadable
+
+
+def run_batch_map(source_folder, target_folder, output_folder, events=None, worker_count=DEFAULT_WORKER_COUNT,
+                  chunk_size=DEFAULT_CHUNK_SIZE, splice=False, cancel_event=None, force=False, profile=None,
+                  match=MATCH_BY_STYLE, memory_budget=None, merge=False, preflight=False, output_format=OUTPUT_PRETTY,
+                  rule_profile=DEFAULT_RULE_PROFILE):
+    """
+    Multi-style batch: pairs each source file with the target file of the same font style
+    (see match_files_by_style), patches the target with the source and saves it in
+    output_folder under the source file's name. Files left without a partner are logged and
+    listed in the result instead of stopping the batch. With match=MATCH_BY_ORDER the files
+    are paired by alphabetical order instead, and both folders must hold as many files.
+    Any of the three folders can also be a zip or tar archive, as in run_batch_template.
+    Returns a BatchResult. Pairs whose source, target and rules are unchanged since the last
+    run into output_folder are skipped (see BuildManifest), unless force is set.
+    profile, memory_budget, merge and preflight work as in run_batch_template; the pre-flight
+    check runs on each pair that is not up to date and on every file left out by the matching.
+    output_format is one of OUTPUT_FORMATS; OUTPUT_PRESERVE keeps the format of each target
+    file. rule_profile works as in patch_single_file.
+    """
+    json_format = output_format if output_format == OUTPUT_PRESERVE else output_format_for(output_format)
+    if events is None:
+        events = NullEvents()
+    log = QueueLog(events)
+    plan = _load_plan(rule_profile, merge, log)
+    log.insert(END, "Scanning for .json files in both folders...\n")
+    with contextlib.ExitStack() as stack:
+        sources = stack.enter_context(_open_input_folder(source_folder, "Source Folder Error"))
+        targets = stack.enter_context(_open_input_folder(target_folder, "Target Folder Error"))
+        source_files = sorted(sources.names())
+        target_files = sorted(targets.names())
+
+        if not source_files:
+            log.insert(END, "No files found in source folder.\n")
+            raise PatchError("Warning", "No .json files found in the source folder.", warning=True)
+
+        with profile.phase("match files") if profile is not None else _NULL_PHASE:
+            pairs, unmatched_sources, unmatched_targets, unreadable = _match_folders(
+                sources, source_files, targets, target_files, match, log)
+
+        log.insert(END, f"Found {len(pairs)} file pairs to process.\n\n--- Starting matched folder process ---\n")
+        result = BatchResult(len(pairs))
+        result.unmatched_sources = [sources.member_path(name) for name in unmatched_sources]
+        result.unmatched_targets = [targets.member_path(name) for name in unmatched_targets]
+        result.unreadable = unreadable
+
+        manifest, archive = _open_output(output_folder, log)
+        if archive is not None:
+            stack.enter_context(archive)
+        events.put(("progress", 0, result.total))
+        for path, error in unreadable.items():
+            events.put(("file", FileResult(path, None, None, False, error)))
+        start_time = time.perf_counter()
+
+        for folder in (sources, targets):
+            if folder.is_archive:
+                manifest.add_archive(folder)
+        outputs = [(sources.member_path(source_filename),
+                    targets.member_path(target_filename),
+                    os.path.join(output_folder, source_filename))
+                   for source_filename, target_filename in pairs]
+        with profile.phase("check manifest") if profile is not None else _NULL_PHASE:
+            input_keys = _skip_up_to_date(manifest, outputs, _manifest_rules(splice, plan, output_format), force, log,
+                                          events, result)
+        pending = [(source_filename, target_filename, output, input_key)
+                   for (source_filename, target_filename), output, input_key in zip(pairs, outputs, input_keys)
+                   if input_key is not None]
+        budget = job_costs = None
+        if memory_budget is not None:
+            budget = MemoryBudget(memory_budget)
+            job_costs = []
+            for source_filename, target_filename, _, _ in pending:
+                target_size = targets.member_size(target_filename)
+                job_costs.append(estimate_job_memory([sources.member_size(source_filename), target_size], target_size))
+            pending, job_costs, worker_count = _schedule_by_memory(budget, pending, job_costs, worker_count,
+                                                                   chunk_size, log)
+        log.insert(END, f"Using {worker_count} worker process(es), chunk size {chunk_size}.\n")
+
+        read_inputs = None
+        if sources.is_archive or targets.is_archive:
+            read_inputs = lambda job: {path: folder.read(path) for path, folder in zip(job[:2], (sources, targets))
+                                       if path is not None}
+        # The files left out by the matching are checked too, for being well-formed JSON objects.
+        check_jobs = [output[:2] + (plan,) for _, _, output, _ in pending]
+        check_jobs += [(path, None, plan) for path in result.unmatched_sources]
+        check_jobs += [(None, path, plan) for path in result.unmatched_targets]
+        if preflight and (check_jobs or unreadable):
+            report = PreflightReport(len(pending) + len(check_jobs) + len(unreadable))
+            report.add(FileCheck([CheckProblem(CHECK_ERROR, path, error) for path, error in unreadable.items()]))
+            with profile.phase("pre-flight check") if profile is not None else _NULL_PHASE:
+                result.preflight = _preflight(check_file_pair, check_jobs, worker_count, chunk_size, None, (),
+                                              cancel_event, read_inputs, report, log)
+
+        jobs = [(source_path, target_path, output_path, splice, profile and profile.profile, archive is not None, plan,
+                 json_format)
+                for _, _, (source_path, target_path, output_path), _ in pending]
+        results = run_batch_jobs(patch_file_pair, jobs, worker_count, chunk_size, cancel_event=cancel_event,
+                                 read_inputs=read_inputs, budget=budget, job_costs=job_costs)
+
+        try:
+            for done, ((source_filename, target_filename, (source_path, target_path, output_path), input_key), job_result) in \
+                    enumerate(zip(pending, results), result.skipped + 1):
+                log.insert(END, f"\n--- Matching '{source_filename}'  ->  '{target_filename}' ---\n{job_result.log_text}")
+                error = _store_output(archive, output_path, job_result)
+                if job_result.success:
+                    if job_result.unchanged:
+                        log.insert(END, f"Unchanged, not rewritten: {output_path}\n")
+                        result.unchanged += 1
+                    else:
+                        log.insert(END, f"Successfully saved to: {output_path}\n")
+                    result.processed += 1
+                    manifest.record(output_path, input_key)
+                else:
+                    log.insert(END, f"!!! FAILED to process pair ('{source_filename}', '{target_filename}'): {error}\n")
+                    result.failed += 1
+                    manifest.forget(output_path)
+                result.add_fragments(job_result.fragments)
+                if profile is not None:
+                    profile.add(job_result.trace)
+                events.put(("file", FileResult(source_path, target_path, output_path, job_result.success, error,
+                                               unchanged=job_result.unchanged)))
+                events.put(("progress", done, result.total))
+        finally:
+            manifest.save()
+
+    result.elapsed = time.perf_counter() - start_time
+    result.cancelled = cancel_event is not None and cancel_event.is_set()
+    log.insert(END, f"\nElapsed time: {result.elapsed:.2f} s\n")
+    log.insert(END, f"Up to date (skipped): {result.skipped}, rebuilt: {result.processed - result.skipped}"
+                    f"{result.unchanged_summary()}\n")
+    log.insert(END, result.fragment_summary())
+    _finish_memory_budget(budget, result, log)
+    if result.unmatched_sources or result.unmatched_targets:
+        log.insert(END, f"Unmatched (left out): {len(result.unmatched_sources)} source file(s), "
+                        f"{len(result.unmatched_targets)} target file(s)\n")
+    if result.unreadable:
+        log.insert(END, f"Unreadable (left out): {len(result.unreadable)} file(s)\n")
+    if profile is not None:
+        log.insert(END, profile.summary_table())
+    if result.cancelled:
+        log.insert(END, f"\n--- Process cancelled. Processed {result.processed} of {result.total} file pairs. ---\n")
+    else:
+        log.insert(END, f"\n--- Process finished. Processed {result.processed} of {result.total} file pairs. ---\n")
+    return result
+
+
+# --- Watch Mode ---
+# A One-style batch that keeps running: the template stays parsed in memory (with its fragment
+# cache and fingerprints) and each source file is re-patched as soon as it changes on disk.
+# Changes are found by polling file sizes and modification times, which needs nothing beyond
+# the standard library and also works on network shares.
+
+# Seconds between two looks at the source folder.
+WATCH_POLL_INTERVAL = 0.25
+# Seconds a changed file must stay unchanged before it is patched, so that a file still being
+# written (or saved in several steps by an exporter) is patched once, after the last write.
+WATCH_DEBOUNCE = 0.3
+
+
+class FolderWatcher:
+    """
+    Finds the .json files of a folder (and any extra files, such as the template) that were
+    added or modified since the last poll, by size and modification time. A change is reported
+    once the file has kept the same size and time for debounce seconds.
+    """
+    def __init__(self, folder, extra_paths=(), debounce=WATCH_DEBOUNCE):
+        self.folder = folder
+        self.extra_paths = list(extra_paths)
+        self.debounce = debounce
+        self._known = self._scan() # Path -> (size, mtime) the files were last reported with
+        self._settling = {} # Path -> ((size, mtime), time the file was first seen that way)
+
+    def paths(self):
+        """The watched .json files of the folder, as last reported."""
+        return sorted(path for path in self._known if path not in self.extra_paths)
+
+    def _scan(self):
+        states = {}
+        try:
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    if entry.name.lower().endswith('.json') and entry.is_file():
+                        stat = entry.stat()
+                        states[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            pass # The folder is being replaced; the next poll sees it again
+        for path in self.extra_paths:
+            try:
+                stat = os.stat(path)
+                states[path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                pass
+        return states
+
+    def poll(self):
+        """Returns (changed, removed): the paths whose change has settled and those that are gone."""
+        now = time.monotonic()
+        states = self._scan()
+        changed = []
+        for path, state in states.items():
+            if self._known.get(path) == state:
+                self._settling.pop(path, None)
+                continue
+            settling = self._settling.get(path)
+            if settling is None or settling[0] != state:
+                self._settling[path] = (state, now)
+            elif now - settling[1] >= self.debounce:
+                del self._settling[path]
+                self._known[path] = state
+                changed.append(path)
+        removed = [path for path in self._known if path not in states]
+        for path in removed:
+            del self._known[path]
+        for path in [path for path in self._settling if path not in states]:
+            del self._settling[path]
+        return sorted(changed), sorted(removed)
+
+
+def watch_batch_template(source_folder, template_path, output_folder, events=None, splice=False, stop_event=None,
+                         force=False, poll_interval=WATCH_POLL_INTERVAL, debounce=WATCH_DEBOUNCE, merge=False,
+                         output_format=OUTPUT_PRETTY, rule_profile=DEFAULT_RULE_PROFILE):
+    """
+    Watch mode of the One-style batch. Parses the template once, brings output_folder up to
+    date like run_batch_template (in this process), then re-patches every source file that is
+    added or modified, until stop_event is set. If the template itself changes, it is parsed
+    again and every file is re-patched. Unchanged content (e.g. a file that was only touched)
+    is skipped through the manifest. Both folders must be real folders, not archives.
+    merge, output_format and rule_profile work as in run_batch_template. Returns a BatchResult
+    with the totals of the whole session.
+    """
+    if events is None:
+        events = NullEvents()
+    if stop_event is None:
+        stop_event = threading.Event()
+    log = QueueLog(events)
+    for path in (source_folder, output_folder):
+        if not os.path.isdir(path):
+            raise PatchError("Error", f"Watch mode needs a folder, not an archive or file: {path}")
+    if os.path.samefile(source_folder, output_folder):
+        raise PatchError("Error", "The output folder must not be the watched source folder.")
+
+    plan = _load_plan(rule_profile, merge, log)
+    _init_template_worker(_load_template(template_path, log), template_path if splice else None)
+    json_format = _template_format(template_path, output_format)
+    manifest = BuildManifest(output_folder)
+    rules = _manifest_rules(splice, plan, output_format)
+    result = BatchResult(0)
+    start_time = time.perf_counter()
+
+    def patch_sources(source_paths, force):
+        round_result = BatchResult(len(source_paths))
+        outputs = [(path, template_path, os.path.join(output_folder, os.path.basename(path))) for path in source_paths]
+        input_keys = _skip_up_to_date(manifest, outputs, rules, force, log, events, round_result)
+        pending = [(output, input_key) for output, input_key in zip(outputs, input_keys) if input_key is not None]
+        jobs = [(source_path, output_path, splice, None, False, plan, json_format)
+                for (source_path, _, output_path), _ in pending]
+        try:
+            for done, (((source_path, _, output_path), input_key), job_result) in \
+                    enumerate(zip(pending, run_pipeline(patch_file_with_template, jobs)), round_result.skipped + 1):
+                log.insert(END, f"\n--- Processing: {os.path.basename(source_path)} ---\n{job_result.log_text}")
+                if job_result.success:
+                    if job_result.unchanged:
+                        log.insert(END, f"Unchanged, not rewritten: {output_path}\n")
+                        round_result.unchanged += 1
+                    else:
+                        log.insert(END, f"Successfully saved to: {output_path}\n")
+                    round_result.processed += 1
+                    manifest.record(output_path, input_key)
+                else:
+                    log.insert(END, f"!!! FAILED to process {os.path.basename(source_path)}: {job_result.error}\n")
+                    round_result.failed += 1
+                    manifest.forget(output_path)
+                result.add_fragments(job_result.fragments)
+                events.put(("file", FileResult(source_path, template_path, output_path, job_result.success,
+                                               job_result.error, unchanged=job_result.unchanged)))
+                events.put(("progress", done, round_result.total))
+        finally:
+            manifest.save()
+        result.total += round_result.total
+        result.processed += round_result.processed
+        result.skipped += round_result.skipped
+        result.unchanged += round_result.unchanged
+        result.failed += round_result.failed
+
+    watcher = FolderWatcher(source_folder, [template_path], debounce)
+    log.insert(END, f"--- Bringing {output_folder} up to date ---\n")
+    patch_sources(watcher.paths(), force)
+    log.insert(END, f"\n--- Watching {source_folder} for changes (stop to end) ---\n")
+    while not stop_event.wait(poll_interval):
+        changed, removed = watcher.poll()
+        for path in removed:
+            log.insert(END, f"Removed: {os.path.basename(path)} (its output is kept)\n")
+        if template_path in changed:
+            changed.remove(template_path)
+            try:
+                _init_template_worker(_load_template(template_path, log), template_path if splice else None)
+                json_format = _template_format(template_path, output_format)
+                changed = watcher.paths()
+            except PatchError:
+                log.insert(END, "Keeping the previously loaded template.\n")
+        if changed:
+            round_start = time.perf_counter()
+            patch_sources(changed, False)
+            log.insert(END, f"Patched {len(changed)} changed file(s) in {time.perf_counter() - round_start:.2f} s\n")
+
+    _release_worker_state()
+    result.elapsed = time.perf_counter() - start_time
+    result.cancelled = True
+    log.insert(END, f"\n--- Watch stopped. Patched {result.processed - result.skipped} file(s), "
+                    f"{result.failed} failed, {result.skipped} already up to date. ---\n")
+    return result
+
+
+# --- Command Line Interface ---
+
+# Exit codes of main().
+EXIT_OK = 0
+EXIT_FILES_FAILED = 1
+EXIT_USAGE_ERROR = 2
+EXIT_CHECK_FAILED = 3 # The pre-flight check found a problem; nothing was written
+
+
+class CommandLineEvents:
+    """
+    Event sink for the command line: every ("file", result) event is written to out as one
+    JSON object per line, and the log text goes to log_stream if one is given.
+    """
+    def __init__(self, out, log_stream=None):
+        self.out = out
+        self.log_stream = log_stream
+
+    def put(self, event):
+        kind = event[0]
+        if kind == "log":
+            if self.log_stream is not None:
+                self.log_stream.write(event[1])
+        elif kind == "file":
+            self.write_line(dict(event="file", **event[1].to_dict()))
+
+    def write_line(self, record):
+        self.out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.out.flush()
+
+
+def _build_argument_parser():
+    import argparse # Only needed by the command line
+    parser = argparse.ArgumentParser(
+        prog="sdf_patch",
+        description="Patch SDF font asset JSON files without the GUI. "
+                    "Writes one JSON object per output file to stdout.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(subparser, output_help):
+        subparser.add_argument("-o", "--output", required=True, help=output_help)
+        subparser.add_argument("--splice", action="store_true",
+                               help="keep the target file formatting and only rewrite the changed values")
+        add_merge_option(subparser)
+        add_format_option(subparser)
+        add_rules_option(subparser)
+        subparser.add_argument("-v", "--verbose", action="store_true", help="write the patch log to stderr")
+        subparser.add_argument("--profile", action="store_true", help="write per-phase timings to stderr at the end")
+        subparser.add_argument("--trace", metavar="FILE", help="profile and save a Chrome trace / Perfetto JSON file")
+        subparser.add_argument("--trace-memory", action="store_true", help="profile and also record tracemalloc peaks (slower)")
+
+    def add_pool_options(subparser):
+        subparser.add_argument("--workers", type=int, default=DEFAULT_WORKER_COUNT, help="number of worker processes")
+        subparser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="files handed to a worker at once")
+
+    def add_batch_options(subparser):
+        add_pool_options(subparser)
+        add_force_option(subparser)
+        subparser.add_argument("--memory-budget", type=int, metavar="MB",
+                               help="limit the workers and files in flight to an estimated memory use, largest files first")
+        subparser.add_argument("--preflight", action="store_true",
+                               help="check every input first and stop without writing anything if a problem is found")
+
+    def add_merge_option(subparser):
+        subparser.add_argument("--merge", action="store_true",
+                               help="merge kerning records (and other keyed arrays) by key instead of replacing the whole array")
+
+    def add_format_option(subparser):
+        subparser.add_argument("--format", dest="output_format", choices=OUTPUT_FORMATS, default=OUTPUT_PRETTY,
+                               help="write the outputs indented (default), compact, or in the format of the target file")
+
+    def add_rules_option(subparser):
+        subparser.add_argument("--rules", dest="rule_profile", metavar="PROFILE", default=DEFAULT_RULE_PROFILE,
+                               help=f"rule profile to patch with: {', '.join(list_rule_profiles())}, "
+                                    "or the path of a profile .json file")
+
+    def add_force_option(subparser):
+        subparser.add_argument("--force", action="store_true",
+                               help="rebuild every file, even if its inputs have not changed since the last run")
+
+    single = subparsers.add_parser("single", help="patch one target file with one source file")
+    single.add_argument("source", help="source file (original)")
+    single.add_argument("target", help="target file (to patch)")
+    add_common(single, "file to save the patched target to")
+
+    batch_template = subparsers.add_parser("batch-template", help="patch one template file with every file of a folder (One-style)")
+    batch_template.add_argument("source_folder", help="folder (or zip/tar archive) of source files")
+    batch_template.add_argument("template", help="target single file used as the template")
+    add_common(batch_template, "folder (or .zip/.tar/.tar.gz/... archive to create) to save the patched files to")
+    add_batch_options(batch_template)
+
+    batch_map = subparsers.add_parser("batch-map", help="patch the files of a folder with the matching files of another (Multi-style)")
+    batch_map.add_argument("source_folder", help="folder (or zip/tar archive) of source files")
+    batch_map.add_argument("target_folder", help="folder (or zip/tar archive) of target files")
+    add_common(batch_map, "folder (or .zip/.tar/.tar.gz/... archive to create) to save the patched files to")
+    add_batch_options(batch_map)
+    batch_map.add_argument("--match", choices=(MATCH_BY_STYLE, MATCH_BY_ORDER), default=MATCH_BY_STYLE,
+                           help="pair the files by font style (default) or by alphabetical order")
+
+    watch = subparsers.add_parser("watch", help="keep the template loaded and re-patch source files as they change (One-style), until Ctrl+C")
+    watch.add_argument("source_folder", help="folder of source files to watch")
+    watch.add_argument("template", help="target single file used as the template")
+    watch.add_argument("-o", "--output", required=True, help="folder to save the patched files to")
+    watch.add_argument("--splice", action="store_true",
+                       help="keep the target file formatting and only rewrite the changed values")
+    add_merge_option(watch)
+    add_format_option(watch)
+    add_rules_option(watch)
+    watch.add_argument("-v", "--verbose", action="store_true", help="write the patch log to stderr")
+    add_force_option(watch)
+    watch.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE,
+                       help="seconds a changed file must stay unchanged before it is patched")
+
+    benchmark = subparsers.add_parser("benchmark", help="time a One-style batch serially and in parallel")
+    benchmark.add_argument("source_folder")
+    benchmark.add_argument("template")
+    add_pool_options(benchmark)
+    return parser
+
+
+def _report_profile(profile, args, events):
+    """Writes the profile of a command line run: the table to stderr (unless the log already had it) and the trace file."""
+    if profile is None:
+        return
+    if events is None or not args.verbose:
+        sys.stderr.write(profile.summary_table())
+    if args.trace:
+        profile.write_chrome_trace(args.trace)
+
+
+def _watch_from_command_line(args, events):
+    import signal # Only needed by the command line
+    stop_event = threading.Event()
+    previous_handler = signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    try:
+        result = watch_batch_template(args.source_folder, args.template, args.output, events, args.splice,
+                                      stop_event, args.force, debounce=max(0.0, args.debounce), merge=args.merge,
+                                      output_format=args.output_format, rule_profile=args.rule_profile)
+    except PatchError as e:
+        events.write_line({"event": "error", "title": e.title, "error": str(e)})
+        return EXIT_USAGE_ERROR
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+    events.write_line(dict(event="summary", **result.to_dict()))
+    return EXIT_FILES_FAILED if result.failed else EXIT_OK
+
+
+def main(argv=None):
+    """Command line entry point. Returns EXIT_OK, EXIT_FILES_FAILED, EXIT_USAGE_ERROR or EXIT_CHECK_FAILED."""
+    args = _build_argument_parser().parse_args(argv)
+
+    if args.command == "benchmark":
+        file_count, timings = benchmark_batch_template(args.source_folder, args.template, max(1, args.workers), max(1, args.chunk_size))
+        print(f"Files: {file_count}")
+        print(f"Serial:   {timings['serial']:.2f} s")
+        print(f"Parallel: {timings['parallel']:.2f} s ({args.workers} workers, chunk size {args.chunk_size})")
+        if timings['parallel'] > 0:
+            print(f"Speedup:  {timings['serial'] / timings['parallel']:.2f}x")
+        return EXIT_OK
+
+    events = CommandLineEvents(sys.stdout, sys.stderr if args.verbose else None)
+    if args.command == "watch":
+        return _watch_from_command_line(args, events)
+    profile = None
+    if args.profile or args.trace or args.trace_memory:
+        profile = BatchProfile(PROFILE_MEMORY if args.trace_memory else PROFILE_TIME)
+    try:
+        if args.command == "single":
+            with patch_single_file(args.source, args.target, events, args.splice, profile, args.merge,
+                                   args.output_format, args.rule_profile) as patched:
+                try:
+                    changed = patched.save(args.output, QueueLog(events))
+                    file_result = FileResult(args.source, args.target, args.output, True, unchanged=not changed)
+                except Exception as e:
+                    file_result = FileResult(args.source, args.target, args.output, False, str(e))
+            events.put(("file", file_result))
+            _report_profile(profile, args, None)
+            return EXIT_OK if file_result.success else EXIT_FILES_FAILED
+
+        for folder in (args.source_folder,) + ((args.target_folder,) if args.command == "batch-map" else ()):
+            if not (os.path.isdir(folder) or os.path.isfile(folder) and is_archive_path(folder)):
+                raise PatchError("Error", f"Not a folder or archive: {folder}")
+        if not (os.path.isdir(args.output) or is_archive_path(args.output)):
+            raise PatchError("Error", f"Not a folder or archive: {args.output}")
+        memory_budget = max(1, args.memory_budget) * 1024 * 1024 if args.memory_budget else None
+        if args.command == "batch-template":
+            result = run_batch_template(args.source_folder, args.template, args.output, events,
+                                        max(1, args.workers), max(1, args.chunk_size), args.splice, force=args.force, profile=profile,
+                                        memory_budget=memory_budget, merge=args.merge, preflight=args.preflight,
+                                        output_format=args.output_format, rule_profile=args.rule_profile)
+        else:
+            result = run_batch_map(args.source_folder, args.target_folder, args.output, events,
+                                   max(1, args.workers), max(1, args.chunk_size), args.splice, force=args.force, profile=profile,
+                                   match=args.match, memory_budget=memory_budget, merge=args.merge, preflight=args.preflight,
+                                   output_format=args.output_format, rule_profile=args.rule_profile)
+    except PreflightError as e:
+        events.write_line(dict(event="preflight", **e.report.to_dict()))
+        events.write_line({"event": "error", "title": e.title, "error": str(e)})
+        return EXIT_CHECK_FAILED
+    except PatchError as e:
+        events.write_line({"event": "error", "title": e.title, "error": str(e)})
+        return EXIT_USAGE_ERROR
+
+    events.write_line(dict(event="summary", **result.to_dict()))
+    _report_profile(profile, args, events)
+    return EXIT_FILES_FAILED if result.failed or result.unmatched_sources or result.unreadable else EXIT_OK
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    # Required for the process pool when running as a frozen executable.
+    multiprocessing.freeze_support()
+    sys.exit(main())
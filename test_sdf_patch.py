@@ -0,0 +1,551 @@
+"""Tests of the headless core (sdf_patch). Run with: python -m pytest"""
+import copy
+import io
+import json
+import os
+import queue
+import tarfile
+import zipfile
+
+import pytest
+
+import sdf_patch
+
+
+def write_json(path, data, **options):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        json.dump(data, f, **options)
+    return str(path)
+
+
+def patched(target, source, plan=None):
+    """The target patched with the source, on a copy."""
+    target = copy.deepcopy(target)
+    sdf_patch.update_json_recursively(target, source, sdf_patch.BufferedLog(), plan)
+    return target
+
+
+# --- Source Subset Loading ---
+
+def assert_loads_like_json_load(path, target, plan=None):
+    """Patching with the subset loaded by load_source_data must equal patching with the full document."""
+    with open(path, 'r', encoding='utf-8') as f:
+        full = json.load(f)
+    subset = sdf_patch.load_source_data(path, plan)
+    assert patched(target, subset, plan) == patched(target, full, plan)
+    return subset
+
+
+def test_source_key_spelled_with_escape(tmp_path):
+    path = tmp_path / "source.json"
+    path.write_bytes(b'{"x": {"m_ClassDefinitio\\u006eType": 5}, "m_GlyphTable": {"Array": [1, 2, 3]}}')
+    subset = assert_loads_like_json_load(path, {"x": {}})
+    assert subset == {"x": {"m_ClassDefinitionType": 5}}
+
+
+def test_non_ascii_rule_key(tmp_path):
+    plan = sdf_patch.PatchPlan(["Glé"], {}, ["Añadido"])
+    target = {"a": {"Glé": 1}, "b": {}}
+    source = {"a": {"Glé": 2}, "b": {"Añadido": "ü"}, "c": list(range(100))}
+    for ensure_ascii in (False, True): # As this tool writes it, and as json.dump does by default
+        path = write_json(tmp_path / f"source-{ensure_ascii}.json", source, ensure_ascii=ensure_ascii, indent=2)
+        subset = assert_loads_like_json_load(path, target, plan)
+        assert subset == {"a": {"Glé": 2}, "b": {"Añadido": "ü"}}
+
+
+def test_source_subset_skips_unneeded_subtrees(tmp_path):
+    source = {"m_Name": "A", "m_GlyphTable": {"Array": [{"m_Index": i} for i in range(200)]},
+              "m_FaceInfo": {"m_FamilyName": "A", "m_PointSize": 90}}
+    path = write_json(tmp_path / "source.json", source, indent=2, ensure_ascii=False)
+    subset = assert_loads_like_json_load(path, {"m_Name": "B", "m_FaceInfo": {"m_FamilyName": "B"}})
+    assert subset == {"m_Name": "A", "m_FaceInfo": {"m_FamilyName": "A"}}
+
+
+@pytest.mark.parametrize("content", [
+    b'{"m_Name": "A"} {"m_Name": "B"}', # A second root value
+    b'{"m_Name": "A", "m_GlyphTable": {"Array": [1, 2}]}}', # Brackets that don't pair up
+    b'{"m_Name": "A", "m_GlyphTable": {"Array": ["\\x"]}}', # Invalid escape
+    b'{"m_Name": "A", "m_GlyphTable": {"Array": ["a\tb"]}}', # Control character in a string
+    b'{"m_Name": "A", "m_GlyphTable": {"Array": [1 # 2]}}', # Stray character
+    b'{"m_Name": "A", "m_GlyphTable": [[[[[[[[[1}]]]]]]]]}', # Nested deeper than the container regex
+])
+def test_source_subset_rejects_malformed_skipped_parts(tmp_path, content):
+    path = tmp_path / "source.json"
+    path.write_bytes(content)
+    with pytest.raises(ValueError):
+        json.loads(content)
+    with pytest.raises(ValueError):
+        sdf_patch.load_source_data(str(path))
+
+
+def test_source_subset_falls_back_to_json_load(tmp_path):
+    path = tmp_path / "source.json"
+    path.write_bytes(b'{"m_Name": "A", "m_GlyphTable": {"Array": [NaN, -Infinity, 1E+2]}}')
+    assert_loads_like_json_load(path, {"m_Name": "B"})
+
+
+# --- Multi-style Matching ---
+
+def font(style, glyphs=3):
+    return {"m_Name": f"Test-{style} SDF", "m_FaceInfo": {"m_FamilyName": "Test", "m_StyleName": style},
+            "m_GlyphTable": {"Array": [{"m_Index": i} for i in range(glyphs)]}}
+
+
+@pytest.fixture
+def style_folders(tmp_path):
+    sources = tmp_path / "sources"
+    targets = tmp_path / "targets"
+    out = tmp_path / "out"
+    for folder in (sources, targets, out):
+        folder.mkdir()
+    for style in ("Regular", "Bold"):
+        write_json(sources / f"{style}.json", font(style, 5), indent=2)
+        write_json(targets / f"{style}.json", font(style), indent=2)
+    return sources, targets, out
+
+
+def test_unreadable_file_is_not_unmatched(style_folders):
+    sources, targets, out = style_folders
+    (sources / "Broken.json").write_bytes(b'{"m_Name": "Test-Italic SDF", "m_FaceInfo": {"m_Sty')
+    events = queue.Queue()
+    result = sdf_patch.run_batch_map(str(sources), str(targets), str(out), events, worker_count=1)
+    broken = str(sources / "Broken.json")
+    assert result.processed == 2
+    assert result.unmatched_sources == []
+    assert list(result.unreadable) == [broken]
+    assert "not valid JSON" in result.unreadable[broken]
+    failed = [event[1] for event in events.queue if event[0] == "file" and not event[1].success]
+    assert [file_result.source_path for file_result in failed] == [broken]
+
+
+def test_unreadable_file_fails_preflight(style_folders):
+    sources, targets, out = style_folders
+    (targets / "Broken.json").write_bytes(b'{"m_Name": "Test-Italic SDF", "m_FaceInfo": {"m_Sty')
+    with pytest.raises(sdf_patch.PreflightError) as error:
+        sdf_patch.run_batch_map(str(sources), str(targets), str(out), worker_count=1, preflight=True)
+    assert [problem.path for problem in error.value.report.errors] == [str(targets / "Broken.json")]
+    assert not any(out.iterdir())
+
+
+# --- Pre-flight Check ---
+
+def check_pair(tmp_path, source, target, plan=None):
+    source_path = write_json(tmp_path / "source.json", source, indent=2)
+    target_path = write_json(tmp_path / "target.json", target, indent=2)
+    check = sdf_patch.check_file_pair(source_path, target_path, plan)
+    return [(problem.severity, problem.message) for problem in check.problems]
+
+
+def test_preflight_finds_escaped_and_non_ascii_keys(tmp_path):
+    plan = sdf_patch.PatchPlan(["m_Name", "Glé"], {}, [])
+    source_path = tmp_path / "source.json"
+    source_path.write_bytes(b'{"m_N\\u0061me": "A", "Gl\\u00e9": 1}')
+    target_path = write_json(tmp_path / "target.json", {"m_Name": "B", "Glé": 2}, ensure_ascii=False)
+    assert sdf_patch.check_file_pair(str(source_path), target_path, plan).problems == []
+
+
+def test_preflight_reports_type_mismatch_outside_rule_keys(tmp_path):
+    plan = sdf_patch.PatchPlan([], {}, ["m_Added"])
+    source = {"m_FaceInfo": {"m_Added": 1}, "m_GlyphTable": {"Array": [{"m_Index": i} for i in range(50)]}}
+    target = {"m_FaceInfo": 5, "m_GlyphTable": {"Array": [{"m_Index": i} for i in range(50)]}}
+    problems = check_pair(tmp_path, source, target, plan)
+    assert [severity for severity, _ in problems] == [sdf_patch.CHECK_ERROR]
+    assert "'m_FaceInfo' is an object in the source but a number" in problems[0][1]
+
+
+def test_preflight_checks_files_left_out_by_matching(tmp_path):
+    sources, targets, out = (tmp_path / name for name in ("sources", "targets", "out"))
+    for folder in (sources, targets, out):
+        folder.mkdir()
+    write_json(sources / "Regular.json", font("Regular"), indent=2)
+    write_json(targets / "Regular.json", font("Regular"), indent=2)
+    # Its header is readable, so it is only unmatched; the damage is past the part read for the style.
+    broken = json.dumps(font("Bold", 5000), indent=2)[:-10]
+    (sources / "Bold.json").write_text(broken, encoding='utf-8')
+    with pytest.raises(sdf_patch.PreflightError) as error:
+        sdf_patch.run_batch_map(str(sources), str(targets), str(out), worker_count=1, preflight=True)
+    assert [problem.path for problem in error.value.report.errors] == [str(sources / "Bold.json")]
+
+
+def test_check_template_uses_loaded_template(tmp_path):
+    plan = sdf_patch.PatchPlan(["m_Name", "m_Missing"], {}, [])
+    template = {"m_Name": "A"}
+    check = sdf_patch.check_template(str(tmp_path / "not-on-disk.json"), template, plan)
+    assert [problem.message for problem in check.problems] == ["No 'm_Missing' in the template; its rule does nothing for it"]
+
+
+# --- Output Encoding ---
+# Every way of writing an output must give the document json.dump would; the pretty and
+# compact formats must also give its exact bytes.
+
+def asset(name, glyphs=100, pairs=3):
+    """A font asset with the parts the encoders treat specially."""
+    return {
+        "m_Name": name,
+        "we\"ird \\ key\n": "tab\t, quote \", backslash \\ and \u001f",
+        "Añadido 日本": ["é", " ", "\U0001f600"],
+        "m_FaceInfo": {"m_FamilyName": name, "m_StyleName": "Regular", "m_PointSize": 90.5, "m_Empty": {}},
+        "m_Empty": {},
+        "m_EmptyList": [],
+        "m_Nested": [[1, [2, [3, []]]], [{}], [[{"a": [None, True, False]}]]],
+        "m_GlyphTable": {"Array": [{"m_Index": i, "m_Metrics": {"m_Width": i / 3}} for i in range(glyphs)]},
+        "m_FontFeatureTable": {"m_GlyphPairAdjustmentRecords": {"Array": [
+            {"m_FirstAdjustmentRecord": {"m_GlyphIndex": i}, "m_SecondAdjustmentRecord": {"m_GlyphIndex": i + 1},
+             "m_XAdvance": -i} for i in range(pairs)]}},
+        "m_FallbackFontAssetTable": {"Array": []},
+    }
+
+
+def source_asset(name="Source Ñame \"x\"", glyphs=100, pairs=80):
+    source = asset(name, glyphs, pairs)
+    source["m_FaceInfo"]["m_UnitsPerEM"] = 1000
+    source["m_Empty"] = {"m_ClassDefinitionType": 2}
+    return source
+
+
+def expected_text(data, output_format=sdf_patch.OUTPUT_PRETTY, indent=2, newline=os.linesep):
+    if output_format == sdf_patch.OUTPUT_COMPACT:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return json.dumps(data, ensure_ascii=False, indent=indent).replace('\n', newline)
+
+
+def save_single(tmp_path, source, target_path, **options):
+    source_path = write_json(tmp_path / "source.json", source, ensure_ascii=False)
+    output = tmp_path / "output.json"
+    with sdf_patch.patch_single_file(source_path, str(target_path), **options) as patched_file:
+        patched_file.save(str(output), sdf_patch.BufferedLog())
+    return output.read_bytes()
+
+
+@pytest.mark.parametrize("output_format", [sdf_patch.OUTPUT_PRETTY, sdf_patch.OUTPUT_COMPACT])
+def test_output_is_what_json_dump_writes(tmp_path, output_format):
+    target = asset("Target")
+    target_path = write_json(tmp_path / "target.json", target, indent=2)
+    output = save_single(tmp_path, source_asset(), target_path, output_format=output_format)
+    assert output.decode('utf-8') == expected_text(patched(target, source_asset()), output_format)
+
+
+def test_preserve_keeps_indent_and_crlf(tmp_path):
+    target = asset("Target")
+    target_path = tmp_path / "target.json"
+    target_path.write_bytes(json.dumps(target, indent=4).replace('\n', '\r\n').encode('ascii'))
+    output = save_single(tmp_path, source_asset(), target_path, output_format=sdf_patch.OUTPUT_PRESERVE)
+    assert output.decode('utf-8') == expected_text(patched(target, source_asset()), indent=4, newline='\r\n')
+
+
+@pytest.mark.parametrize("newline", ['\n', '\r\n'])
+@pytest.mark.parametrize("ensure_ascii", [False, True])
+def test_splice_gives_the_patched_document(tmp_path, newline, ensure_ascii):
+    target = asset("Target")
+    original = json.dumps(target, indent=3, ensure_ascii=ensure_ascii).replace('\n', newline).encode('utf-8')
+    target_path = tmp_path / "target.json"
+    target_path.write_bytes(original)
+    output = save_single(tmp_path, source_asset(), target_path, splice=True)
+    assert json.loads(output) == patched(target, source_asset())
+    # The rest of the target is copied through: its escapes, indent and line endings stay as they were.
+    assert output.count(b'\n') == output.count(newline.encode('ascii'))
+    unchanged = json.dumps(target["m_Nested"], indent=3, ensure_ascii=ensure_ascii).replace('\n', newline)
+    assert unchanged.replace(newline, newline + " " * 3).encode('utf-8') in output
+    assert (b'\\u00f1' if ensure_ascii else 'ñ'.encode('utf-8')) in output
+
+
+def test_splice_without_changes_keeps_the_bytes(tmp_path):
+    target = asset("Target")
+    original = json.dumps(target, indent=1, ensure_ascii=True).replace('\n', '\r\n').encode('ascii')
+    target_path = tmp_path / "target.json"
+    target_path.write_bytes(original)
+    assert save_single(tmp_path, target, target_path, splice=True) == original
+
+
+def test_batch_outputs_are_what_json_dump_writes(tmp_path):
+    sources, out = tmp_path / "sources", tmp_path / "out"
+    sources.mkdir()
+    out.mkdir()
+    template = asset("Template", glyphs=300)
+    template_path = write_json(tmp_path / "template.json", template, indent=2)
+    # Shared template arrays and repeated source arrays are encoded once and reused from the fragment cache.
+    for i in range(4):
+        write_json(sources / f"{i}.json", source_asset(f"Source {i}", pairs=80 + i % 2), ensure_ascii=False)
+    for output_format in (sdf_patch.OUTPUT_PRETTY, sdf_patch.OUTPUT_COMPACT):
+        result = sdf_patch.run_batch_template(str(sources), template_path, str(out), worker_count=1,
+                                              output_format=output_format)
+        assert result.processed == 4 and result.failed == 0
+        for i in range(4):
+            expected = expected_text(patched(template, source_asset(f"Source {i}", pairs=80 + i % 2)), output_format)
+            assert (out / f"{i}.json").read_bytes().decode('utf-8') == expected
+
+
+def test_fragment_cache_stores_replaced_arrays_seen_twice_within_its_bytes():
+    cache = sdf_patch.FragmentCache(max_bytes=10 ** 6)
+    records = [{"m_GlyphIndex": i} for i in range(100)]
+    document = {"m_FallbackFontAssetTable": {"Array": records}}
+    assert cache.encode(document)[1:] == (0, 1)
+    assert cache.encode(copy.deepcopy(document))[1:] == (0, 1) # Seen once before: stored now
+    assert cache.encode(copy.deepcopy(document))[1:] == (1, 0)
+    assert "".join(cache.encode(document)[0]) == expected_text(document)
+
+    small = sdf_patch.FragmentCache(max_bytes=1000)
+    for _ in range(3):
+        assert small.encode(copy.deepcopy(document))[1:] == (0, 1) # Larger than the cache: never stored
+
+
+def test_batch_reuses_fragments_of_profile_array_rules(tmp_path):
+    sources, out = tmp_path / "sources", tmp_path / "out"
+    sources.mkdir()
+    out.mkdir()
+    template_path = write_json(tmp_path / "template.json", asset("Template", glyphs=50), indent=2)
+    for i in range(4): # The same glyph table in every source, replacing the template's
+        write_json(sources / f"{i}.json", source_asset(f"Source {i}", glyphs=200, pairs=3), ensure_ascii=False)
+    result = sdf_patch.run_batch_template(str(sources), template_path, str(out), worker_count=1,
+                                          rule_profile="glyph-tables")
+    assert result.processed == 4
+    assert result.fragments_reused >= 2
+    plan = sdf_patch.load_rule_profile("glyph-tables")
+    expected = patched(asset("Template", glyphs=50), source_asset("Source 3", glyphs=200, pairs=3), plan)
+    assert (out / "3.json").read_bytes().decode('utf-8') == expected_text(expected)
+
+
+@pytest.mark.parametrize("window_bytes", [0, 10 ** 9])
+def test_pipeline_keeps_order_within_its_byte_window(tmp_path, window_bytes):
+    jobs = []
+    for i in range(5):
+        source = write_json(tmp_path / f"source{i}.json", source_asset(f"Source {i}"), ensure_ascii=False)
+        target = write_json(tmp_path / f"target{i}.json", asset(f"Target {i}"), indent=2)
+        jobs.append((source, target, str(tmp_path / f"out{i}.json")))
+    results = list(sdf_patch.run_pipeline(sdf_patch.patch_file_pair, jobs, window_bytes=window_bytes))
+    assert [result.success for result in results] == [True] * 5
+    for i in range(5):
+        expected = patched(asset(f"Target {i}"), source_asset(f"Source {i}"))
+        assert (tmp_path / f"out{i}.json").read_bytes().decode('utf-8') == expected_text(expected)
+
+
+# --- Keyed Record Merging ---
+
+KERNING_KEYS = sdf_patch.ARRAY_RECORD_KEYS["m_GlyphPairAdjustmentRecords"]
+
+
+def pair(first, second, advance):
+    return {"m_FirstAdjustmentRecord": {"m_GlyphIndex": first}, "m_SecondAdjustmentRecord": {"m_GlyphIndex": second},
+            "m_XAdvance": advance}
+
+
+def test_merge_keyed_records():
+    target = [pair(1, 2, -5), pair(2, 3, -1), pair(3, 4, 0)]
+    source = [pair(9, 9, 7), pair(2, 3, -2), pair(3, 4, 0), pair(1, 9, 4)]
+    updated, added, kept = sdf_patch.merge_keyed_records(target, source, KERNING_KEYS)
+    assert updated == {1: pair(2, 3, -2)}
+    assert added == [pair(9, 9, 7), pair(1, 9, 4)]
+    assert kept == 2
+    assert target == [pair(1, 2, -5), pair(2, 3, -1), pair(3, 4, 0)] # Neither list is modified
+
+
+@pytest.mark.parametrize("target, source", [
+    ([pair(1, 2, 0), pair(1, 2, 1)], [pair(5, 5, 0)]), # Duplicate key in the target
+    ([pair(1, 2, 0)], [pair(5, 5, 0), pair(5, 5, 1)]), # Duplicate key in the source
+    ([pair(1, 2, 0)], [{"m_FirstAdjustmentRecord": {"m_GlyphIndex": 1}}]), # Missing key field
+    ([pair(1, 2, 0)], [pair([1], 2, 0)]), # Unhashable key
+])
+def test_merge_keyed_records_refuses(target, source):
+    assert sdf_patch.merge_keyed_records(target, source, KERNING_KEYS) is None
+
+
+def test_merge_option_merges_kerning_records():
+    target = asset("Target", pairs=0)
+    target["m_FontFeatureTable"]["m_GlyphPairAdjustmentRecords"]["Array"] = [pair(1, 2, -5), pair(2, 3, -1)]
+    source = {"m_FontFeatureTable": {"m_GlyphPairAdjustmentRecords": {"Array": [pair(2, 3, -2), pair(7, 8, 3)]}}}
+    merged = patched(target, source, sdf_patch.DEFAULT_PATCH_PLAN.with_merge())
+    assert merged["m_FontFeatureTable"]["m_GlyphPairAdjustmentRecords"]["Array"] == \
+        [pair(1, 2, -5), pair(2, 3, -2), pair(7, 8, 3)]
+    replaced = patched(target, source)
+    assert replaced["m_FontFeatureTable"]["m_GlyphPairAdjustmentRecords"]["Array"] == [pair(2, 3, -2), pair(7, 8, 3)]
+
+
+def test_merge_falls_back_to_replace():
+    target = asset("Target", pairs=0)
+    target["m_FontFeatureTable"]["m_GlyphPairAdjustmentRecords"]["Array"] = [pair(1, 2, -5), pair(1, 2, -1)]
+    source = {"m_FontFeatureTable": {"m_GlyphPairAdjustmentRecords": {"Array": [pair(7, 8, 3)]}}}
+    merged = patched(target, source, sdf_patch.DEFAULT_PATCH_PLAN.with_merge())
+    assert merged["m_FontFeatureTable"]["m_GlyphPairAdjustmentRecords"]["Array"] == [pair(7, 8, 3)]
+
+
+# --- Incremental Runs ---
+
+@pytest.fixture
+def template_batch(tmp_path):
+    sources, out = tmp_path / "sources", tmp_path / "out"
+    sources.mkdir()
+    out.mkdir()
+    for i in range(3):
+        write_json(sources / f"{i}.json", source_asset(f"Source {i}"), ensure_ascii=False)
+    template_path = write_json(tmp_path / "template.json", asset("Template"), indent=2)
+
+    def run(**options):
+        return sdf_patch.run_batch_template(str(sources), template_path, str(out), worker_count=1, **options)
+    return run, sources, out, template_path
+
+
+def test_manifest_skips_up_to_date_outputs(template_batch):
+    run, sources, out, _ = template_batch
+    assert run().processed == 3
+    assert (out / sdf_patch.MANIFEST_FILENAME).exists()
+    result = run()
+    assert (result.skipped, result.failed) == (3, 0)
+    assert run(force=True).skipped == 0
+
+
+def test_manifest_rebuilds_changed_inputs(template_batch):
+    run, sources, out, template_path = template_batch
+    run()
+    write_json(sources / "1.json", source_asset("Changed"), ensure_ascii=False)
+    result = run()
+    assert result.skipped == 2
+    assert json.loads((out / "1.json").read_bytes())["m_Name"] == "Changed"
+
+    with open(template_path, 'a', encoding='utf-8') as f:
+        f.write("\n")
+    assert run().skipped == 0
+
+
+def test_manifest_rebuilds_on_other_rules_or_output(template_batch):
+    run, sources, out, _ = template_batch
+    run()
+    assert run(merge=True).skipped == 0
+    assert run(merge=True, output_format=sdf_patch.OUTPUT_COMPACT).skipped == 0
+    assert run(merge=True, output_format=sdf_patch.OUTPUT_COMPACT, splice=True).skipped == 0
+    assert run(merge=True, output_format=sdf_patch.OUTPUT_COMPACT, splice=True).skipped == 3
+
+    (out / "0.json").write_text("{}", encoding='utf-8') # An output edited by hand
+    (out / "2.json").unlink()
+    result = run(merge=True, output_format=sdf_patch.OUTPUT_COMPACT, splice=True)
+    assert result.skipped == 1
+    assert (out / "2.json").exists()
+    assert json.loads((out / "0.json").read_bytes())["m_Name"] == "Source 0"
+
+
+def test_unreadable_manifest_rebuilds_everything(template_batch):
+    run, sources, out, _ = template_batch
+    run()
+    (out / sdf_patch.MANIFEST_FILENAME).write_text("not json", encoding='utf-8')
+    assert run().skipped == 0
+    assert run().skipped == 3
+
+
+def test_missing_folders_are_patch_errors(template_batch, tmp_path):
+    _, sources, _, template_path = template_batch
+    missing = str(tmp_path / "missing")
+    with pytest.raises(sdf_patch.PatchError, match="Not a folder"):
+        sdf_patch.run_batch_template(str(sources), template_path, missing, worker_count=1)
+    with pytest.raises(sdf_patch.PatchError, match="Not a folder"):
+        sdf_patch.run_batch_map(str(sources), str(sources), missing, worker_count=1)
+    with pytest.raises(sdf_patch.PatchError, match="Not a folder"):
+        sdf_patch.run_batch_template(missing, template_path, str(tmp_path), worker_count=1)
+    assert not os.path.exists(missing)
+
+# --- Memory Budget ---
+
+def test_memory_budget_counts_the_caches_of_every_worker():
+    megabyte = 1024 * 1024
+    budget = sdf_patch.MemoryBudget(1000 * megabyte, worker_cost=100 * megabyte, reserved=100 * megabyte,
+                                    cache_cost=100 * megabyte)
+    # 100 reserved + 3 workers * (100 + 100 caches + 100 job) fit, a fourth worker doesn't
+    assert budget.plan_workers(4, 100 * megabyte) == 3
+    assert budget.estimated_peak == 800 * megabyte
+    serial = sdf_patch.MemoryBudget(1000 * megabyte, reserved=100 * megabyte, cache_cost=100 * megabyte)
+    assert serial.plan_workers(1, 300 * megabyte) == 1
+    assert serial.estimated_peak == 500 * megabyte # The caches are held by this process then
+
+
+def test_fingerprint_cache_is_emptied_after_every_patch():
+    target, source = asset("Target", pairs=100), source_asset("Source", pairs=100)
+    source["m_FontFeatureTable"]["m_GlyphPairAdjustmentRecords"]["Array"][-1] = pair(0, 0, 1) # Same length, differs
+    sdf_patch.patch_copy_on_write(target, source, sdf_patch.BufferedLog())
+    assert not sdf_patch.ARRAY_FINGERPRINTS._fingerprints and not sdf_patch.ARRAY_FINGERPRINTS._verdicts
+
+
+# --- Archives ---
+
+def archive_members(path):
+    if str(path).endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            return {name: archive.read(name) for name in archive.namelist()}
+    with tarfile.open(path) as archive:
+        return {member.name: archive.extractfile(member).read() for member in archive.getmembers()}
+
+
+def pack(folder, path):
+    if str(path).endswith(".zip"):
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for file in sorted(folder.iterdir()):
+                archive.write(file, file.name)
+    else:
+        with tarfile.open(path, 'w:' + sdf_patch._tar_compression(str(path))) as archive:
+            for file in sorted(folder.iterdir()):
+                archive.add(file, file.name)
+    return str(path)
+
+
+def folder_files(folder):
+    return {file.name: file.read_bytes() for file in folder.iterdir() if file.name != sdf_patch.MANIFEST_FILENAME}
+
+
+@pytest.mark.parametrize("source_archive, output_archive", [
+    ("sources.zip", "out.tar.gz"),
+    ("sources.tar", "out.zip"),
+    ("sources.tar.bz2", "out.tar.xz"),
+])
+def test_template_batch_archive_round_trip(template_batch, tmp_path, source_archive, output_archive):
+    run, sources, out, template_path = template_batch
+    run()
+    result = sdf_patch.run_batch_template(pack(sources, tmp_path / source_archive), template_path,
+                                          str(tmp_path / output_archive), worker_count=1)
+    assert (result.processed, result.failed) == (3, 0)
+    assert archive_members(tmp_path / output_archive) == folder_files(out)
+
+
+def test_map_batch_archive_round_trip(style_folders, tmp_path):
+    sources, targets, out = style_folders
+    sdf_patch.run_batch_map(str(sources), str(targets), str(out), worker_count=1)
+    output_archive = tmp_path / "out.zip"
+    result = sdf_patch.run_batch_map(pack(sources, tmp_path / "sources.tar.gz"), pack(targets, tmp_path / "targets.zip"),
+                                     str(output_archive), worker_count=1)
+    assert (result.processed, result.failed) == (2, 0)
+    assert archive_members(output_archive) == folder_files(out)
+
+
+def test_archive_members_are_manifest_inputs(template_batch, tmp_path):
+    run, sources, out, template_path = template_batch
+    archive = pack(sources, tmp_path / "sources.zip")
+    run_archive = lambda: sdf_patch.run_batch_template(archive, template_path, str(out), worker_count=1)
+    assert run_archive().processed == 3
+    assert run_archive().skipped == 3
+    write_json(sources / "1.json", source_asset("Changed"), ensure_ascii=False)
+    archive = pack(sources, tmp_path / "sources.zip")
+    assert run_archive().skipped == 2
+
+
+def test_compressed_tar_is_read_once(template_batch, tmp_path, monkeypatch):
+    _, sources, _, _ = template_batch
+    (sources / "notes.txt").write_text("not an asset")
+    path = pack(sources, tmp_path / "sources.tgz")
+    archive = sdf_patch.JsonArchive(path)
+    monkeypatch.setattr(tarfile.TarFile, "extractfile", None) # Decompressed when opened, never again
+    assert sorted(archive.names()) == ["0.json", "1.json", "2.json"]
+    for name in ("2.json", "0.json", "1.json"): # Out of archive order
+        assert archive.read(archive.member_path(name)) == (sources / name).read_bytes()
+    assert archive.read(archive.member_path("1.json"), 5) == (sources / "1.json").read_bytes()[:5]
+    spool = archive._spool.name
+    archive.close()
+    assert not os.path.exists(spool)
+
+
+def test_tar_members_are_hashed_by_content(tmp_path):
+    hashes = []
+    for content in (b'{"a": 1}', b'{"a": 2}'): # Same size and time, as after an edit within the second
+        path = tmp_path / f"sources{len(hashes)}.tar"
+        with tarfile.open(path, 'w') as archive:
+            info = tarfile.TarInfo("0.json")
+            info.size, info.mtime = len(content), 1000
+            archive.addfile(info, io.BytesIO(content))
+        with sdf_patch.JsonArchive(str(path)) as archive:
+            hashes.append(archive.member_hash("0.json"))
+    assert hashes[0] != hashes[1]